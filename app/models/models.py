@@ -1,11 +1,24 @@
 from pydantic import BaseModel
 import json
-from typing import Any, Optional
+from typing import Any, List, Literal, Optional
 
 class TextInput(BaseModel):
     session_id: str
     text: str
     chunk_size: int = 100
+    chunk_strategy: Literal["words", "tokens"] = "words"
+    chunk_overlap: int = 0
+    mode: Literal["sync", "async"] = "sync"
+
+class DocumentInput(BaseModel):
+    text: str
+    chunk_size: int = 100
+    chunk_strategy: Literal["words", "tokens"] = "words"
+    chunk_overlap: int = 0
+
+class IngestInput(BaseModel):
+    session_id: str
+    chunk_size: int = 100
 
 class SearchQuery(BaseModel):
     session_id: str
@@ -13,6 +26,21 @@ class SearchQuery(BaseModel):
     limit: int = 10
     base_similarity: float = 0.5
 
+class MultiSessionSearchQuery(BaseModel):
+    session_ids: List[str]
+    query: str
+    limit: int = 10
+    base_similarity: float = 0.5
+
+class BatchQuery(BaseModel):
+    query: str
+    limit: int = 10
+    base_similarity: float = 0.5
+
+class BatchSearchQuery(BaseModel):
+    session_id: str
+    queries: List[BatchQuery]
+
 class Response:
     def __init__(self, status: str, message: str, data: Optional[Any] = None, error: Optional[str] = None):
         self.status = status
@@ -0,0 +1,308 @@
+from app.services.similarity import normalize_rows, top_k
+from app.services.file_lock import file_lock
+import hashlib
+import io
+import os
+import logging
+import tempfile
+import threading
+import time
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+logger = logging.getLogger(__name__)
+
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 256
+
+
+def _text_hash(chunk: str):
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+
+class IVFIndex:
+    """Inverted-file approximate nearest-neighbour index over unit-length embeddings, in pure NumPy.
+
+    Vectors are clustered around `n_lists` centroids with spherical k-means; a query only scores the
+    vectors of its `nprobe` closest clusters, so nprobe trades recall for latency.
+    """
+
+    def __init__(self, centroids, nprobe: int = 8):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.nprobe = nprobe
+        self.vectors = np.empty((0, self.centroids.shape[1]), dtype=np.float32)
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.chunks = []
+        # Chunk count of the session in storage when the index last matched it; None when unknown
+        self.watermark = None
+        # Copies of each text in the session; a text indexed once stays searchable until its last copy is removed
+        self._counts = {}
+        self._lists = [np.empty(0, dtype=np.int64) for _ in range(len(self.centroids))]
+
+    @classmethod
+    def train(cls, vectors, n_lists: int = None, nprobe: int = 8, seed: int = 0):
+        """Clusters the (normalized) vectors into n_lists centroids, defaulting to sqrt(len(vectors))."""
+        vectors = normalize_rows(vectors)
+        n_lists = n_lists or int(np.sqrt(len(vectors)))
+        n_lists = max(1, min(n_lists, len(vectors)))
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(len(vectors), n_lists * KMEANS_SAMPLE_PER_LIST)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+        for _ in range(KMEANS_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=n_lists) == 0
+            # Re-seed empty clusters from random sample points so every list stays useful
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = normalize_rows(sums)
+
+        return cls(centroids, nprobe)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def add(self, chunks: list, embeddings):
+        """Adds chunks not already indexed (by content) and returns how many were added."""
+        embeddings = normalize_rows(embeddings)
+        keep = []
+        for i, chunk in enumerate(chunks):
+            chunk_hash = _text_hash(chunk)
+            if chunk_hash not in self._counts:
+                keep.append(i)
+            self._counts[chunk_hash] = self._counts.get(chunk_hash, 0) + 1
+        if not keep:
+            return 0
+
+        new_vectors = embeddings[keep]
+        new_assignments = np.argmax(new_vectors @ self.centroids.T, axis=1).astype(np.int32)
+        start = len(self.chunks)
+
+        self.vectors = np.concatenate([self.vectors, new_vectors])
+        self.assignments = np.concatenate([self.assignments, new_assignments])
+        self.chunks.extend(chunks[i] for i in keep)
+        for list_id in np.unique(new_assignments):
+            ids = start + np.flatnonzero(new_assignments == list_id)
+            self._lists[list_id] = np.concatenate([self._lists[list_id], ids])
+        return len(keep)
+
+    def search(self, query_embedding, limit: int, base_similarity: float = 0.0, nprobe: int = None):
+        """Returns (chunk, score) pairs for the best matches within the nprobe closest clusters."""
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        query = normalize_rows(query_embedding)[0]
+
+        probed = top_k(self.centroids @ query, nprobe, -np.inf)
+        candidates = np.concatenate([self._lists[list_id] for list_id, _ in probed])
+        if len(candidates) == 0:
+            return []
+
+        scores = self.vectors[candidates] @ query
+        return [(self.chunks[candidates[i]], score) for i, score in top_k(scores, limit, base_similarity)]
+
+    def remove(self, chunks: list):
+        """Forgets one copy of each chunk text and drops vectors whose last copy is gone; returns how many were dropped."""
+        dropped = set()
+        for chunk in chunks:
+            chunk_hash = _text_hash(chunk)
+            if chunk_hash not in self._counts:
+                continue
+            self._counts[chunk_hash] -= 1
+            if self._counts[chunk_hash] == 0:
+                del self._counts[chunk_hash]
+                dropped.add(chunk_hash)
+        if not dropped:
+            return 0
+
+        keep = np.array([_text_hash(chunk) not in dropped for chunk in self.chunks], dtype=bool)
+        self.vectors = self.vectors[keep]
+        self.assignments = self.assignments[keep]
+        self.chunks = [chunk for chunk, kept in zip(self.chunks, keep) if kept]
+        self._rebuild_lists()
+        return len(dropped)
+
+    def _rebuild_lists(self):
+        order = np.argsort(self.assignments, kind="stable")
+        bounds = np.searchsorted(self.assignments[order], np.arange(self.n_lists + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(self.n_lists)]
+
+    def to_bytes(self):
+        """Serializes the index into a self-contained .npz payload (no pickling)."""
+        encoded = [chunk.encode("utf-8") for chunk in self.chunks]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(chunk) for chunk in encoded])
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            centroids=self.centroids,
+            vectors=self.vectors,
+            assignments=self.assignments,
+            chunk_bytes=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            chunk_offsets=offsets,
+            chunk_counts=np.array([self._counts[_text_hash(chunk)] for chunk in self.chunks], dtype=np.int64),
+            nprobe=np.array(self.nprobe),
+            watermark=np.array(-1 if self.watermark is None else self.watermark, dtype=np.int64),
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, payload: bytes):
+        data = np.load(io.BytesIO(payload), allow_pickle=False)
+        index = cls(data["centroids"], int(data["nprobe"]))
+        chunk_bytes = data["chunk_bytes"].tobytes()
+        offsets = data["chunk_offsets"]
+        index.chunks = [chunk_bytes[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+        # Indexes saved before copies were counted hold one copy per text
+        counts = data["chunk_counts"] if "chunk_counts" in data else np.ones(len(index.chunks), dtype=np.int64)
+        index._counts = {_text_hash(chunk): int(count) for chunk, count in zip(index.chunks, counts)}
+        index.vectors = data["vectors"]
+        index.assignments = data["assignments"]
+        # Indexes saved before watermarks were recorded never match storage, so they get rebuilt
+        watermark = int(data["watermark"]) if "watermark" in data else -1
+        index.watermark = None if watermark < 0 else watermark
+        index._rebuild_lists()
+        return index
+
+
+class ANNIndexStore:
+    """Per-worker registry of session IVF indexes, persisted to a local directory and loaded lazily.
+
+    The directory is the source of truth: each get() compares the file's stat signature with the copy in
+    memory and reloads it when another worker has saved, or drops it when another worker has deleted it.
+    Writes from hosts that do not share the directory are caught by the watermark: callers compare it with
+    the session's chunk count in storage whenever needs_check() says the last comparison is too old.
+    """
+
+    def __init__(self, directory: str, min_chunks: int, nprobe: int, check_seconds: float = 60):
+        self.directory = directory
+        self.min_chunks = min_chunks
+        self.nprobe = nprobe
+        self.check_seconds = check_seconds
+        # session_id -> (index, stat signature of the file it was loaded from or saved to)
+        self._indexes = {}
+        # session_id -> monotonic time the index's watermark was last confirmed against storage
+        self._checked = {}
+        self._lock = threading.Lock()
+
+    def _path(self, session_id: str):
+        return os.path.join(self.directory, hashlib.sha256(session_id.encode("utf-8")).hexdigest() + ".ivf.npz")
+
+    def _file_lock(self, session_id: str):
+        # Serializes load, change and save of one index across every process sharing the directory
+        name = hashlib.sha256(session_id.encode("utf-8")).hexdigest() + ".lock"
+        return file_lock(os.path.join(self.directory, ".locks", name))
+
+    @staticmethod
+    def _signature(path: str):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        # os.replace gives every save a new inode, so this changes even when mtime granularity is coarse
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _save(self, session_id: str, index: IVFIndex):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(session_id)
+        # Write then rename so a concurrent reader never sees a partial file
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(index.to_bytes())
+        os.replace(temp_path, path)
+        self._indexes[session_id] = (index, self._signature(path))
+        self._checked[session_id] = time.monotonic()
+
+    def _get_locked(self, session_id: str):
+        path = self._path(session_id)
+        signature = self._signature(path)
+        entry = self._indexes.get(session_id)
+        if signature is None:
+            self._indexes.pop(session_id, None)
+            self._checked.pop(session_id, None)
+            return None
+        if entry is not None and entry[1] == signature:
+            return entry[0]
+        self._checked.pop(session_id, None)
+        try:
+            with open(path, "rb") as f:
+                index = IVFIndex.from_bytes(f.read())
+        except Exception as e:
+            logger.error(f"Error loading index for session {session_id}: {e}")
+            return None
+        self._indexes[session_id] = (index, signature)
+        return index
+
+    def get(self, session_id: str):
+        """Returns the session's current index, reloading it from disk if it changed, or None when it has none."""
+        with self._lock:
+            return self._get_locked(session_id)
+
+    def needs_check(self, session_id: str):
+        """Whether the session's watermark has gone unconfirmed against storage for longer than check_seconds."""
+        with self._lock:
+            checked_at = self._checked.get(session_id)
+            return checked_at is None or time.monotonic() - checked_at >= self.check_seconds
+
+    def mark_checked(self, session_id: str):
+        with self._lock:
+            self._checked[session_id] = time.monotonic()
+
+    def build(self, session_id: str, chunks: list, matrix):
+        """Trains and stores an index for a complete session freshly read from storage, or returns None when it
+        is too small to need one. The session's chunk count becomes the index's watermark."""
+        if len(chunks) < self.min_chunks:
+            return None
+        logger.info(f"Building ANN index for session {session_id} over {len(chunks)} chunks")
+        index = IVFIndex.train(matrix, nprobe=self.nprobe)
+        index.add(chunks, matrix)
+        index.watermark = len(chunks)
+        with self._lock, self._file_lock(session_id):
+            self._save(session_id, index)
+        return index
+
+    def add(self, session_id: str, chunks: list, embeddings, watermark: int = None):
+        """Adds newly stored chunks to the session's index if it already has one, recording the session's
+        chunk count after the write as its watermark."""
+        with self._lock, self._file_lock(session_id):
+            index = self._get_locked(session_id)
+            if index is not None and self._changed(index, index.add(chunks, embeddings), watermark):
+                self._save(session_id, index)
+
+    def remove(self, session_id: str, chunks: list, watermark: int = None):
+        """Removes deleted chunks from the session's index if it has one, recording the session's chunk count
+        after the delete as its watermark."""
+        with self._lock, self._file_lock(session_id):
+            index = self._get_locked(session_id)
+            if index is not None and self._changed(index, index.remove(chunks), watermark):
+                self._save(session_id, index)
+
+    @staticmethod
+    def _changed(index: IVFIndex, updated: int, watermark: int):
+        if watermark is None or watermark == index.watermark:
+            return bool(updated)
+        index.watermark = watermark
+        return True
+
+    def drop(self, session_id: str):
+        with self._lock, self._file_lock(session_id):
+            self._indexes.pop(session_id, None)
+            self._checked.pop(session_id, None)
+            path = self._path(session_id)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+ann_enabled = os.environ.get("ANN_ENABLED", "false").lower() == "true"
+
+ann_store = ANNIndexStore(
+    directory=os.environ.get("ANN_INDEX_DIR", os.path.join(tempfile.gettempdir(), "semantic_search_indexes")),
+    min_chunks=int(os.environ.get("ANN_MIN_CHUNKS", 10000)),
+    nprobe=int(os.environ.get("ANN_NPROBE", 8)),
+    check_seconds=float(os.environ.get("ANN_CHECK_SECONDS", 60)),
+)
@@ -0,0 +1,341 @@
+from azure.cosmos import PartitionKey
+from azure.cosmos.aio import CosmosClient
+from azure.cosmos.exceptions import (CosmosHttpResponseError, CosmosResourceNotFoundError, CosmosResourceExistsError,
+                                     CosmosAccessConditionFailedError, CosmosBatchOperationError)
+from azure.core import MatchConditions
+from azure.core.pipeline.transport import AioHttpTransport
+from app.services.db_utils import (DBUtils, CosmosClientProvider, CHUNK_FIELDS, DOCUMENT_FIELDS, PARTITION_KEY_PATH,
+                                   RECORD_TYPE_FIELD, THROTTLED_STATUS_CODE, document_record_id, is_connection_failure)
+from app.services.embedding_codec import decode_embedding
+import aiohttp
+import asyncio
+import os
+import logging
+import time
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+logger = logging.getLogger(__name__)
+
+# How long a discarded client stays open so requests already holding it can finish; longer than a read timeout
+CLIENT_CLOSE_GRACE_SECONDS = float(os.environ.get("COSMOS_CLIENT_CLOSE_GRACE_SECONDS", 60))
+
+
+class AsyncCosmosClientProvider:
+    """Shares one async CosmosClient per event loop, since its aiohttp session cannot be used from another loop."""
+
+    def __init__(self, close_grace_seconds: float = CLIENT_CLOSE_GRACE_SECONDS):
+        # (config, loop, (client, database, container))
+        self._state = None
+        self._lock = None
+        self._lock_loop = None
+        self.close_grace_seconds = close_grace_seconds
+        # (retired_at, loop, client) for discarded clients that other coroutines may still be using
+        self._retired = []
+
+    @staticmethod
+    def _build_transport():
+        pool_size = int(os.environ.get("COSMOS_POOL_SIZE", 10))
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=pool_size))
+        return AioHttpTransport(session=session, session_owner=True)
+
+    async def _connect(self, config):
+        cosmos_uri, cosmos_key, cosmos_database, cosmos_container, bootstrap_container = config
+
+        if not all([cosmos_uri, cosmos_key, cosmos_database, cosmos_container]):
+            missing_vars = [var for var in ["COSMOS_URI", "COSMOS_KEY", "COSMOS_DATABASE", "COSMOS_CONTAINER"] if not os.environ.get(var)]
+            raise ValueError(f"Missing Cosmos DB environment variables: {', '.join(missing_vars)}")
+
+        logger.info("Creating async Cosmos DB client")
+        client = CosmosClient(
+            cosmos_uri,
+            cosmos_key,
+            transport=self._build_transport(),
+            connection_timeout=int(os.environ.get("COSMOS_CONNECTION_TIMEOUT", 10)),
+            read_timeout=int(os.environ.get("COSMOS_READ_TIMEOUT", 30)),
+        )
+        database = client.get_database_client(cosmos_database)
+        if bootstrap_container:
+            container = await database.create_container_if_not_exists(
+                id=cosmos_container, partition_key=PartitionKey(path=PARTITION_KEY_PATH))
+        else:
+            container = database.get_container_client(cosmos_container)
+        return client, database, container
+
+    async def get(self):
+        """Returns (client, database, container) for the running loop, connecting on first use or after the settings change."""
+        config = CosmosClientProvider._read_config()
+        loop = asyncio.get_running_loop()
+        if self._retired:
+            await self._close_retired(loop)
+        state = self._state
+        if state is not None and state[0] == config and state[1] is loop:
+            return state[2]
+
+        if self._lock_loop is not loop:
+            self._lock, self._lock_loop = asyncio.Lock(), loop
+        async with self._lock:
+            if self._state is None or self._state[0] != config or self._state[1] is not loop:
+                self._retire_state(loop)
+                self._state = (config, loop, await self._connect(config))
+            return self._state[2]
+
+    async def invalidate(self):
+        """Drops the cached client so the next call to get() reconnects.
+
+        Other coroutines may still be awaiting requests on it, so it is only closed by a later get() once
+        close_grace_seconds have passed, in the same way the sync provider leaves its old client to the collector.
+        """
+        if self._state is not None:
+            logger.warning("Discarding async Cosmos DB client")
+        self._retire_state(asyncio.get_running_loop())
+
+    def _retire_state(self, loop):
+        state, self._state = self._state, None
+        # A client created on a loop that has since closed cannot be awaited any more; it is simply dropped
+        if state is not None and state[1] is loop:
+            self._retired.append((time.monotonic(), loop, state[2][0]))
+
+    async def _close_retired(self, loop):
+        now = time.monotonic()
+        due, kept = [], []
+        for entry in self._retired:
+            retired_at, retired_loop, _ = entry
+            if retired_loop is loop and now - retired_at >= self.close_grace_seconds:
+                due.append(entry)
+            elif not retired_loop.is_closed():
+                kept.append(entry)
+        self._retired = kept
+        for _, _, client in due:
+            try:
+                await client.close()
+            except Exception as e:
+                logger.warning(f"Error closing async Cosmos DB client: {e}")
+
+
+async_cosmos_provider = AsyncCosmosClientProvider()
+
+
+class AsyncDBUtils(DBUtils):
+    """Coroutine version of DBUtils on the azure.cosmos.aio client, with the same settings and item layout.
+
+    Call `await connect()` (or use `AsyncDBUtils.create()`) before the other methods.
+    """
+
+    def __init__(self):
+        self.write_concurrency = int(os.environ.get("COSMOS_ASYNC_CONCURRENCY", 16))
+        super().__init__()
+
+    def _setup_connection(self):
+        # Connecting needs the running event loop, so it happens in connect()
+        pass
+
+    async def connect(self):
+        try:
+            self.client, self.database, self.container = await async_cosmos_provider.get()
+        except Exception as e:
+            self.connection_error = str(e)
+            logger.error(f"Error setting up Cosmos DB connection: {e}")
+        return self
+
+    @classmethod
+    async def create(cls):
+        return await cls().connect()
+
+    async def _handle_error(self, error: Exception):
+        if is_connection_failure(error):
+            await async_cosmos_provider.invalidate()
+
+    async def db_health_check(self):
+        if self.connection_error:
+            return False, self.connection_error
+
+        try:
+            async for _ in self.container.read_all_items(max_item_count=1):
+                break
+            return True, "Connected successfully"
+        except Exception as e:
+            await self._handle_error(e)
+            return False, str(e)
+
+    async def _with_retry(self, operation, *args, **kwargs):
+        """Awaits a Cosmos DB call, backing off and retrying while the request is throttled."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await operation(*args, **kwargs)
+            except CosmosHttpResponseError as e:
+                if e.status_code != THROTTLED_STATUS_CODE or attempt == self.max_retries:
+                    raise
+                headers = getattr(e, 'headers', None) or {}
+                retry_after_ms = headers.get('x-ms-retry-after-ms')
+                delay = float(retry_after_ms) / 1000 if retry_after_ms else self.retry_backoff * (2 ** attempt)
+                logger.warning(f"Request throttled, retrying in {delay:.2f}s ({attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(delay)
+
+    async def _store_batch(self, session_id: str, items: list):
+        operations = [("upsert", (item,)) for item in items]
+        await self._with_retry(self.container.execute_item_batch, batch_operations=operations, partition_key=session_id)
+        logger.debug(f"Stored batch of {len(items)} chunks")
+
+    async def _gather_bounded(self, limit: int, calls: list):
+        semaphore = asyncio.Semaphore(max(1, limit))
+
+        async def bounded(call, args):
+            async with semaphore:
+                await call(*args)
+
+        await asyncio.gather(*(bounded(call, args) for call, args in calls))
+
+    async def store_chunk(self, session_id: str, chunks: list, embeddings: list, bulk: bool = None, start_index: int = 0,
+                          ids: list = None, document_id: str = None, document_version: int = None):
+        """Writes the chunks concurrently: at most bulk_concurrency batches, or write_concurrency upserts, in flight."""
+        logger.debug("Storing chunks")
+        bulk = self.bulk_writes if bulk is None else bulk
+        try:
+            items = self._build_items(session_id, chunks, embeddings, start_index, ids, document_id, document_version)
+
+            if bulk:
+                await self._gather_bounded(self.bulk_concurrency, [
+                    (self._store_batch, (session_id, items[i:i + self.bulk_batch_size]))
+                    for i in range(0, len(items), self.bulk_batch_size)])
+            else:
+                await self._gather_bounded(self.write_concurrency, [
+                    (self._with_retry, (self.container.upsert_item, item)) for item in items])
+            return True
+
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            await self._handle_error(e)
+            raise e
+
+    async def query_session_pages(self, session_id: str, fields: list = CHUNK_FIELDS, continuation_token: str = None,
+                                  document_id: str = None, chunks_only: bool = True):
+        """Yields pages of projected items for one session, querying only its partition."""
+        query, parameters = self._session_query(session_id, fields, document_id, chunks_only)
+        results = self.container.query_items(
+            query=query,
+            parameters=parameters,
+            partition_key=session_id,
+            max_item_count=self.page_size
+        )
+        async for page in results.by_page(continuation_token):
+            yield [item async for item in page]
+
+    async def iter_chunks(self, session_id: str):
+        """Streams (chunk, embedding) pairs as each page arrives, without holding the whole session."""
+        async for page in self.query_session_pages(session_id):
+            for result in page:
+                yield result['chunk'], decode_embedding(result)
+
+    async def get_chunks(self, session_id: str):
+        """Returns the session's chunks and a float32 matrix with one embedding per row."""
+        logger.debug("Retrieving chunks")
+        try:
+            chunks = []
+            embeddings = []
+            async for chunk, embedding in self.iter_chunks(session_id):
+                chunks.append(chunk)
+                embeddings.append(embedding)
+
+            if not embeddings:
+                return chunks, np.empty((0, 0), dtype=np.float32)
+            return chunks, np.asarray(embeddings, dtype=np.float32)
+
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            await self._handle_error(e)
+            raise e
+
+    async def count_chunks(self, session_id: str):
+        """Returns how many chunks the session holds, counted by the service without reading them."""
+        try:
+            query, parameters = self._session_query(session_id, [], projection="VALUE COUNT(1)")
+            async for count in self.container.query_items(query=query, parameters=parameters, partition_key=session_id):
+                return count
+            return 0
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            await self._handle_error(e)
+            raise e
+
+    async def get_document_chunks(self, session_id: str, document_id: str):
+        """Returns the id, content_hash, chunk and document_version of every stored chunk of one document."""
+        try:
+            return [item async for page in self.query_session_pages(session_id, DOCUMENT_FIELDS, document_id=document_id)
+                    for item in page]
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            await self._handle_error(e)
+            raise e
+
+    async def _read_document_record(self, session_id: str, document_id: str):
+        try:
+            return await self._with_retry(self.container.read_item, item=document_record_id(session_id, document_id),
+                                          partition_key=session_id)
+        except CosmosResourceNotFoundError:
+            return None
+
+    async def get_document_version(self, session_id: str, document_id: str):
+        """Returns the document's current version, or 0 for a document that has never been written."""
+        try:
+            record = await self._read_document_record(session_id, document_id)
+            return record['version'] if record else 0
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            await self._handle_error(e)
+            raise e
+
+    async def bump_document_version(self, session_id: str, document_id: str):
+        """Increments the document's version record with the same etag check as DBUtils; returns the new version."""
+        try:
+            for attempt in range(self.max_retries + 1):
+                record = await self._read_document_record(session_id, document_id)
+                version = (record['version'] if record else 0) + 1
+                body = self._document_record(session_id, document_id, version)
+                try:
+                    if record is None:
+                        await self._with_retry(self.container.create_item, body)
+                    else:
+                        await self._with_retry(self.container.replace_item, record['id'], body, etag=record['_etag'],
+                                               match_condition=MatchConditions.IfNotModified)
+                    return version
+                except (CosmosResourceExistsError, CosmosAccessConditionFailedError):
+                    logger.debug(f"Version of document {document_id} changed concurrently ({attempt + 1}/{self.max_retries})")
+            raise Exception(f"Could not update the version of document {document_id}")
+
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            await self._handle_error(e)
+            raise e
+
+    async def _delete_batch(self, session_id: str, ids: list):
+        while ids:
+            operations = [("delete", (item_id,)) for item_id in ids]
+            try:
+                await self._with_retry(self.container.execute_item_batch, batch_operations=operations,
+                                       partition_key=session_id)
+                return
+            except CosmosBatchOperationError as e:
+                ids = self._without_missing_item(ids, e)
+                if ids is None:
+                    raise
+
+    async def delete_chunks(self, session_id: str, ids: list):
+        """Deletes chunks by id as transactional batches, at most bulk_concurrency in flight; returns how many."""
+        logger.debug("Deleting chunks")
+        try:
+            await self._gather_bounded(self.bulk_concurrency, [
+                (self._delete_batch, (session_id, ids[i:i + self.bulk_batch_size]))
+                for i in range(0, len(ids), self.bulk_batch_size)])
+            return len(ids)
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            await self._handle_error(e)
+            raise e
+
+    async def delete_session(self, session_id: str):
+        """Deletes every item of the session, version records included; returns how many chunks were deleted."""
+        items = [item async for page in self.query_session_pages(session_id, ['id', RECORD_TYPE_FIELD], chunks_only=False)
+                 for item in page]
+        await self.delete_chunks(session_id, [item['id'] for item in items])
+        return sum(1 for item in items if RECORD_TYPE_FIELD not in item)
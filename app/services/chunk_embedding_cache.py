@@ -0,0 +1,120 @@
+from collections import OrderedDict
+import hashlib
+import os
+import logging
+import sqlite3
+import threading
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+logger = logging.getLogger(__name__)
+
+SQLITE_MAX_PARAMETERS = 500
+
+
+def cache_key(model_name: str, text: str):
+    """Hash of the model name and the whitespace-normalized text, so reflowed chunks still hit."""
+    normalized = " ".join(text.split())
+    return hashlib.sha256(f"{model_name}\x1f{normalized}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-level cache of chunk embeddings: an in-process LRU in front of an optional SQLite file."""
+
+    def __init__(self, max_entries: int, sqlite_path: str = None):
+        self.max_entries = max_entries
+        self.sqlite_path = sqlite_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        self.hits = 0
+        self.misses = 0
+        if sqlite_path:
+            self._connection = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._connection.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._connection.commit()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 or self._connection is not None
+
+    def _remember(self, key: str, vector):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_many(self, model_name: str, texts: list):
+        """Returns {position: embedding} for the texts already cached."""
+        keys = [cache_key(model_name, text) for text in texts]
+        found = {}
+        with self._lock:
+            missing = []
+            for i, key in enumerate(keys):
+                vector = self._entries.get(key)
+                if vector is None:
+                    missing.append(i)
+                else:
+                    self._entries.move_to_end(key)
+                    found[i] = vector
+
+            if missing and self._connection is not None:
+                wanted = {}
+                for i in missing:
+                    wanted.setdefault(keys[i], []).append(i)
+                wanted_keys = list(wanted)
+                # Stay under SQLite's limit on bound parameters per statement
+                for start in range(0, len(wanted_keys), SQLITE_MAX_PARAMETERS):
+                    batch = wanted_keys[start:start + SQLITE_MAX_PARAMETERS]
+                    stored = self._connection.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({', '.join('?' * len(batch))})", batch).fetchall()
+                    for key, blob in stored:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        self._remember(key, vector)
+                        for i in wanted[key]:
+                            found[i] = vector
+
+            self.hits += len(found)
+            self.misses += len(texts) - len(found)
+        return found
+
+    def put_many(self, model_name: str, texts: list, embeddings):
+        with self._lock:
+            rows = []
+            for text, embedding in zip(texts, embeddings):
+                key = cache_key(model_name, text)
+                vector = np.array(embedding, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, vector.tobytes()))
+            if self._connection is not None and rows:
+                self._connection.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+                self._connection.commit()
+
+    def lookups(self):
+        return self.hits + self.misses
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            if self._connection is not None:
+                self._connection.execute("DELETE FROM embeddings")
+                self._connection.commit()
+
+
+def _create_default_cache():
+    sqlite_path = os.environ.get("EMBEDDING_CACHE_PATH") or None
+    try:
+        return EmbeddingCache(int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", 10000)), sqlite_path)
+    except Exception as e:
+        logger.error(f"Error opening embedding cache at {sqlite_path}: {e}")
+        return EmbeddingCache(int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", 10000)))
+
+
+embedding_cache = _create_default_cache()
+
+# Query embeddings are shared across sessions within a worker; repeated queries skip the forward pass
+query_embedding_cache = EmbeddingCache(int(os.environ.get("QUERY_CACHE_MAX_ENTRIES", 1024)))
@@ -1,12 +1,141 @@
 from azure.cosmos import CosmosClient, PartitionKey
+from azure.cosmos.exceptions import (CosmosHttpResponseError, CosmosResourceNotFoundError, CosmosResourceExistsError,
+                                     CosmosAccessConditionFailedError, CosmosBatchOperationError)
+from azure.core import MatchConditions
+from azure.core.exceptions import ServiceRequestError, ServiceResponseError
+from azure.core.pipeline.transport import RequestsTransport
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from app.services.embedding_codec import encode_embedding, decode_embedding, SUPPORTED_ENCODINGS
 import os
 import logging
-import uuid
+import hashlib
+import threading
+import time
+import requests
 import numpy as np 
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 logger = logging.getLogger(__name__)
 
+# Cosmos DB rejects transactional batches with more than 100 operations
+MAX_BATCH_OPERATIONS = 100
+THROTTLED_STATUS_CODE = 429
+NOT_FOUND_STATUS_CODE = 404
+PARTITION_KEY_PATH = "/session_id"
+
+# Only the fields search needs; the legacy 'embedding' list and the binary encoding fields are both projected
+CHUNK_FIELDS = ['chunk', 'chunk_index', 'embedding', 'embedding_encoding', 'embedding_b64', 'embedding_dim', 'embedding_scale', 'embedding_offset']
+# What diffing a document needs: no embeddings
+DOCUMENT_FIELDS = ['id', 'content_hash', 'chunk', 'document_version']
+# Items that are not chunks (a document's version record) carry this field, so chunk queries can skip them
+RECORD_TYPE_FIELD = 'record_type'
+DOCUMENT_VERSION_RECORD = 'document_version'
+
+
+def content_hash(chunk: str):
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+
+def chunk_id(session_id: str, index: int, chunk: str):
+    """Deterministic document id so re-ingesting the same chunk overwrites it instead of duplicating it."""
+    key = f"{session_id}\x1f{index}\x1f{content_hash(chunk)}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def document_chunk_id(session_id: str, document_id: str, chunk: str, occurrence: int = 0):
+    """Id of a document's chunk, keyed on its content rather than its position, so edits elsewhere in the
+    document leave it unchanged; occurrence tells repeated copies of the same text apart."""
+    key = f"{session_id}\x1f{document_id}\x1f{content_hash(chunk)}\x1f{occurrence}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def document_record_id(session_id: str, document_id: str):
+    """Id of the item holding a document's version counter, stored in the session's partition."""
+    key = f"{session_id}\x1f{document_id}\x1fversion"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def is_connection_failure(error: Exception):
+    """Whether an error means the cached client is unusable (bad credentials or a broken connection)."""
+    if isinstance(error, CosmosHttpResponseError) and error.status_code in (401, 403):
+        return True
+    return isinstance(error, (ServiceRequestError, ServiceResponseError))
+
+
+class CosmosClientProvider:
+    """Lazily creates one CosmosClient per worker and shares its connection pool across invocations."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (config, (client, database, container)) swapped as one reference so readers never see a mix
+        self._state = None
+
+    @staticmethod
+    def _read_config():
+        return (
+            os.environ.get("COSMOS_URI"),
+            os.environ.get("COSMOS_KEY"),
+            os.environ.get("COSMOS_DATABASE"),
+            os.environ.get("COSMOS_CONTAINER"),
+            os.environ.get("COSMOS_BOOTSTRAP_CONTAINER", "false").lower() == "true",
+        )
+
+    @staticmethod
+    def _build_transport():
+        pool_size = int(os.environ.get("COSMOS_POOL_SIZE", 10))
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return RequestsTransport(session=session, session_owner=False)
+
+    def _connect(self, config):
+        cosmos_uri, cosmos_key, cosmos_database, cosmos_container, bootstrap_container = config
+
+        if not all([cosmos_uri, cosmos_key, cosmos_database, cosmos_container]):
+            missing_vars = [var for var in ["COSMOS_URI", "COSMOS_KEY", "COSMOS_DATABASE", "COSMOS_CONTAINER"] if not os.environ.get(var)]
+            raise ValueError(f"Missing Cosmos DB environment variables: {', '.join(missing_vars)}")
+
+        logger.info("Creating Cosmos DB client")
+        client = CosmosClient(
+            cosmos_uri,
+            cosmos_key,
+            transport=self._build_transport(),
+            connection_timeout=int(os.environ.get("COSMOS_CONNECTION_TIMEOUT", 10)),
+            read_timeout=int(os.environ.get("COSMOS_READ_TIMEOUT", 30)),
+        )
+        database = client.get_database_client(cosmos_database)
+        if bootstrap_container:
+            container = database.create_container_if_not_exists(
+                id=cosmos_container, partition_key=PartitionKey(path=PARTITION_KEY_PATH))
+        else:
+            container = database.get_container_client(cosmos_container)
+        return client, database, container
+
+    def get(self):
+        """Returns (client, database, container), creating them on first use or after the settings change."""
+        config = self._read_config()
+        state = self._state
+        if state is not None and state[0] == config:
+            return state[1]
+
+        with self._lock:
+            if self._state is None or self._state[0] != config:
+                self._state = (config, self._connect(config))
+            return self._state[1]
+
+    def invalidate(self):
+        """Drops the cached client so the next call to get() reconnects."""
+        with self._lock:
+            if self._state is not None:
+                logger.warning("Discarding Cosmos DB client")
+            self._state = None
+
+
+cosmos_provider = CosmosClientProvider()
+
+
 class DBUtils:
     def __init__(self):
         logger.debug("Setting up Cosmos DB")
@@ -14,26 +143,29 @@ class DBUtils:
         self.database = None
         self.container = None
         self.connection_error = None
+        self.bulk_writes = os.environ.get("COSMOS_BULK_WRITES", "false").lower() == "true"
+        self.bulk_batch_size = min(int(os.environ.get("COSMOS_BULK_BATCH_SIZE", MAX_BATCH_OPERATIONS)), MAX_BATCH_OPERATIONS)
+        self.bulk_concurrency = int(os.environ.get("COSMOS_BULK_CONCURRENCY", 4))
+        self.max_retries = int(os.environ.get("COSMOS_MAX_RETRIES", 5))
+        self.retry_backoff = float(os.environ.get("COSMOS_RETRY_BACKOFF", 0.5))
+        self.page_size = int(os.environ.get("COSMOS_QUERY_PAGE_SIZE", 1000))
+        self.embedding_encoding = os.environ.get("EMBEDDING_STORAGE_ENCODING", "json").lower()
+        if self.embedding_encoding not in SUPPORTED_ENCODINGS:
+            logger.error(f"Unsupported EMBEDDING_STORAGE_ENCODING {self.embedding_encoding}, storing embeddings as json")
+            self.embedding_encoding = "json"
         self._setup_connection()
 
     def _setup_connection(self):
         try:
-            cosmos_uri = os.environ.get("COSMOS_URI")
-            cosmos_key = os.environ.get("COSMOS_KEY")
-            cosmos_database = os.environ.get("COSMOS_DATABASE")
-            cosmos_container = os.environ.get("COSMOS_CONTAINER")
-
-            if not all([cosmos_uri, cosmos_key, cosmos_database, cosmos_container]):
-                missing_vars = [var for var in ["COSMOS_URI", "COSMOS_KEY", "COSMOS_DATABASE", "COSMOS_CONTAINER"] if not os.environ.get(var)]
-                raise ValueError(f"Missing Cosmos DB environment variables: {', '.join(missing_vars)}")
-
-            self.client = CosmosClient(cosmos_uri, cosmos_key)
-            self.database = self.client.get_database_client(cosmos_database)
-            self.container = self.database.get_container_client(cosmos_container)
+            self.client, self.database, self.container = cosmos_provider.get()
         except Exception as e:
             self.connection_error = str(e)
             logger.error(f"Error setting up Cosmos DB connection: {e}")
 
+    def _handle_error(self, error: Exception):
+        if is_connection_failure(error):
+            cosmos_provider.invalidate()
+
     def db_health_check(self):
         if self.connection_error:
             return False, self.connection_error
@@ -42,43 +174,246 @@ class DBUtils:
             list(self.container.read_all_items(max_item_count=1))
             return True, "Connected successfully"
         except Exception as e:
+            self._handle_error(e)
             return False, str(e)
     
 
-    def store_chunk(self, session_id: str, chunks: list, embeddings: list):
+    def _build_item(self, session_id: str, index: int, chunk: str, embedding, item_id: str = None,
+                    document_id: str = None, document_version: int = None):
+        item = {
+            'id': item_id or chunk_id(session_id, index, chunk),
+            'session_id': session_id,
+            'chunk_index': index,
+            'content_hash': content_hash(chunk),
+            'chunk': chunk,
+        }
+        if document_id is not None:
+            item['document_id'] = document_id
+            item['document_version'] = document_version
+        item.update(encode_embedding(embedding, self.embedding_encoding))
+        return item
+
+    def _build_items(self, session_id: str, chunks: list, embeddings, start_index: int = 0, ids: list = None,
+                     document_id: str = None, document_version: int = None):
+        return [self._build_item(session_id, start_index + i, chunk, embeddings[i], ids[i] if ids else None,
+                                 document_id, document_version) for i, chunk in enumerate(chunks)]
+
+    def _with_retry(self, operation, *args, **kwargs):
+        """Runs a Cosmos DB call, backing off and retrying while the request is throttled."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return operation(*args, **kwargs)
+            except CosmosHttpResponseError as e:
+                if e.status_code != THROTTLED_STATUS_CODE or attempt == self.max_retries:
+                    raise
+                headers = getattr(e, 'headers', None) or {}
+                retry_after_ms = headers.get('x-ms-retry-after-ms')
+                delay = float(retry_after_ms) / 1000 if retry_after_ms else self.retry_backoff * (2 ** attempt)
+                logger.warning(f"Request throttled, retrying in {delay:.2f}s ({attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+
+    def _store_batch(self, session_id: str, items: list):
+        operations = [("upsert", (item,)) for item in items]
+        self._with_retry(self.container.execute_item_batch, batch_operations=operations, partition_key=session_id)
+        logger.debug(f"Stored batch of {len(items)} chunks")
+
+    def store_chunk(self, session_id: str, chunks: list, embeddings: list, bulk: bool = None, start_index: int = 0,
+                    ids: list = None, document_id: str = None, document_version: int = None):
+        """Upserts the chunks; ids default to chunk_id() and document_id/document_version tag a document's chunks."""
         logger.debug("Storing chunks")
+        bulk = self.bulk_writes if bulk is None else bulk
         try:
-            for i, chunk in enumerate(chunks):
-                embedding = embeddings[i].tolist() if isinstance(embeddings[i], np.ndarray) else embeddings[i]
+            items = self._build_items(session_id, chunks, embeddings, start_index, ids, document_id, document_version)
 
-                item = {
-                    'id': str(uuid.uuid4()),
-                    'session_id': session_id,
-                    'chunk': chunk,
-                    'embedding': embedding
-                }
+            if bulk:
+                # Every chunk of a session shares its partition, so each slice is one transactional batch
+                batches = [items[i:i + self.bulk_batch_size] for i in range(0, len(items), self.bulk_batch_size)]
+                with ThreadPoolExecutor(max_workers=max(1, self.bulk_concurrency)) as executor:
+                    list(executor.map(lambda batch: self._store_batch(session_id, batch), batches))
+                return True
 
-                self.container.upsert_item(item)
+            for i, item in enumerate(items):
+                self._with_retry(self.container.upsert_item, item)
                 logger.debug(f"Storing chunk {i+1}/{len(chunks)}")  
             return True
 
         except Exception as e:
             logger.error(f"error occured:: {e}")
+            self._handle_error(e)
             raise e
 
 
+    @staticmethod
+    def _session_query(session_id: str, fields: list, document_id: str = None, chunks_only: bool = True,
+                       projection: str = None):
+        """Builds the parameterized single-partition query, optionally narrowed to one document.
+
+        Unless chunks_only is False, version records are left out so every result is a chunk.
+        """
+        projection = projection or ", ".join(f"c.{field}" for field in fields)
+        query = f"SELECT {projection} FROM c WHERE c.session_id = @session_id"
+        if chunks_only:
+            query += f" AND NOT IS_DEFINED(c.{RECORD_TYPE_FIELD})"
+        parameters = [{"name": "@session_id", "value": session_id}]
+        if document_id is not None:
+            query += " AND c.document_id = @document_id"
+            parameters.append({"name": "@document_id", "value": document_id})
+        return query, parameters
+
+    def query_session_pages(self, session_id: str, fields: list = CHUNK_FIELDS, continuation_token: str = None,
+                            document_id: str = None, chunks_only: bool = True):
+        """Yields pages of projected items for one session, querying only its partition."""
+        query, parameters = self._session_query(session_id, fields, document_id, chunks_only)
+        results = self.container.query_items(
+            query=query,
+            parameters=parameters,
+            partition_key=session_id,
+            max_item_count=self.page_size
+        )
+        for page in results.by_page(continuation_token):
+            yield list(page)
+
+    def count_chunks(self, session_id: str):
+        """Returns how many chunks the session holds, counted by the service without reading them."""
+        try:
+            query, parameters = self._session_query(session_id, [], projection="VALUE COUNT(1)")
+            return next(iter(self.container.query_items(query=query, parameters=parameters, partition_key=session_id)), 0)
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            self._handle_error(e)
+            raise e
+
+    def get_document_chunks(self, session_id: str, document_id: str):
+        """Returns the id, content_hash, chunk and document_version of every stored chunk of one document."""
+        try:
+            return [item for page in self.query_session_pages(session_id, DOCUMENT_FIELDS, document_id=document_id)
+                    for item in page]
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            self._handle_error(e)
+            raise e
+
+    @staticmethod
+    def _document_record(session_id: str, document_id: str, version: int):
+        return {
+            'id': document_record_id(session_id, document_id),
+            'session_id': session_id,
+            'document_id': document_id,
+            RECORD_TYPE_FIELD: DOCUMENT_VERSION_RECORD,
+            'version': version,
+        }
+
+    def _read_document_record(self, session_id: str, document_id: str):
+        try:
+            return self._with_retry(self.container.read_item, item=document_record_id(session_id, document_id),
+                                    partition_key=session_id)
+        except CosmosResourceNotFoundError:
+            return None
+
+    def get_document_version(self, session_id: str, document_id: str):
+        """Returns the document's current version, or 0 for a document that has never been written."""
+        try:
+            record = self._read_document_record(session_id, document_id)
+            return record['version'] if record else 0
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            self._handle_error(e)
+            raise e
+
+    def bump_document_version(self, session_id: str, document_id: str):
+        """Increments the document's version record and returns the new version.
+
+        The record is created, or replaced only if its etag is unchanged, so concurrent edits from other
+        workers each get their own version; losing that race just rereads and tries again.
+        """
+        try:
+            for attempt in range(self.max_retries + 1):
+                record = self._read_document_record(session_id, document_id)
+                version = (record['version'] if record else 0) + 1
+                body = self._document_record(session_id, document_id, version)
+                try:
+                    if record is None:
+                        self._with_retry(self.container.create_item, body)
+                    else:
+                        self._with_retry(self.container.replace_item, record['id'], body, etag=record['_etag'],
+                                         match_condition=MatchConditions.IfNotModified)
+                    return version
+                except (CosmosResourceExistsError, CosmosAccessConditionFailedError):
+                    logger.debug(f"Version of document {document_id} changed concurrently ({attempt + 1}/{self.max_retries})")
+            raise Exception(f"Could not update the version of document {document_id}")
+
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            self._handle_error(e)
+            raise e
+
+    @staticmethod
+    def _without_missing_item(ids: list, error: CosmosBatchOperationError):
+        """Returns the ids left to delete when a batch failed only because one item was already gone, else None.
+
+        A transactional batch applies nothing once an operation fails, so the rest is sent again without that id.
+        """
+        if error.status_code != NOT_FOUND_STATUS_CODE:
+            return None
+        logger.info(f"Item {ids[error.error_index]} was already deleted")
+        return ids[:error.error_index] + ids[error.error_index + 1:]
+
+    def _delete_batch(self, session_id: str, ids: list):
+        while ids:
+            operations = [("delete", (item_id,)) for item_id in ids]
+            try:
+                self._with_retry(self.container.execute_item_batch, batch_operations=operations, partition_key=session_id)
+                return
+            except CosmosBatchOperationError as e:
+                ids = self._without_missing_item(ids, e)
+                if ids is None:
+                    raise
+
+    def delete_chunks(self, session_id: str, ids: list):
+        """Deletes chunks by id as transactional batches within the session's partition; returns how many."""
+        logger.debug("Deleting chunks")
+        try:
+            batches = [ids[i:i + self.bulk_batch_size] for i in range(0, len(ids), self.bulk_batch_size)]
+            with ThreadPoolExecutor(max_workers=max(1, self.bulk_concurrency)) as executor:
+                list(executor.map(lambda batch: self._delete_batch(session_id, batch), batches))
+            return len(ids)
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            self._handle_error(e)
+            raise e
+
+    def delete_session(self, session_id: str):
+        """Deletes every item of the session, version records included; returns how many chunks were deleted."""
+        items = [item for page in self.query_session_pages(session_id, ['id', RECORD_TYPE_FIELD], chunks_only=False)
+                 for item in page]
+        self.delete_chunks(session_id, [item['id'] for item in items])
+        return sum(1 for item in items if RECORD_TYPE_FIELD not in item)
+
     def get_chunks(self, session_id: str):
+        """Returns the session's chunks and a float32 matrix with one embedding per row."""
         logger.debug("Retrieving chunks")
         try:
-            query = f'SELECT * FROM c WHERE c.session_id = "{session_id}"'
-            results = self.container.query_items(query=query, enable_cross_partition_query=True)
             chunks = []
-            embeddings = []
-            for result in results:
-                chunks.append(result['chunk'])
-                embeddings.append(result['embedding'])
-            return chunks, embeddings
+            embeddings = None
+
+            for page in self.query_session_pages(session_id):
+                for result in page:
+                    embedding = decode_embedding(result)
+                    if embeddings is None:
+                        embeddings = np.empty((max(self.page_size, len(page)), len(embedding)), dtype=np.float32)
+                    elif len(chunks) == embeddings.shape[0]:
+                        # Grow geometrically so paging stays amortized O(n)
+                        grown = np.empty((embeddings.shape[0] * 2, embeddings.shape[1]), dtype=np.float32)
+                        grown[:len(chunks)] = embeddings
+                        embeddings = grown
+                    embeddings[len(chunks)] = embedding
+                    chunks.append(result['chunk'])
+
+            if embeddings is None:
+                return chunks, np.empty((0, 0), dtype=np.float32)
+            return chunks, embeddings[:len(chunks)]
         
         except Exception as e:
             logger.error(f"error occured:: {e}")
+            self._handle_error(e)
             raise e
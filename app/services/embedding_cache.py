@@ -0,0 +1,138 @@
+from collections import Counter, OrderedDict
+import numpy as np
+import os
+import logging
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class SessionCache:
+    """Per-worker LRU cache of session chunks and their normalized embedding matrix, bounded by memory and TTL."""
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        # Bumped by every write to a session, so a load that started before the write cannot cache what it read
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _entry_size(chunks: list, matrix):
+        return matrix.nbytes + sum(len(chunk) for chunk in chunks)
+
+    def _evict(self, session_id: str):
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self.current_bytes -= entry["size"]
+
+    def get(self, session_id: str):
+        """Returns (chunks, matrix) for a cached, unexpired session or None."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            if self.ttl_seconds and time.monotonic() > entry["expires_at"]:
+                self._evict(session_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry["chunks"], entry["matrix"]
+
+    def generation(self, session_id: str):
+        """Returns the session's write generation; read it before fetching the session and pass it to put()."""
+        with self._lock:
+            return self._generations.get(session_id, 0)
+
+    def _bump(self, session_id: str):
+        self._generations[session_id] = self._generations.get(session_id, 0) + 1
+
+    def put(self, session_id: str, chunks: list, matrix, generation: int = None):
+        """Caches a session, unless it was written to since `generation` was read (the rows may predate the write)."""
+        size = self._entry_size(chunks, matrix)
+        if size > self.max_bytes:
+            logger.debug(f"Session {session_id} too large to cache ({size} bytes)")
+            return
+
+        with self._lock:
+            if generation is not None and generation != self._generations.get(session_id, 0):
+                logger.debug(f"Session {session_id} changed while loading, not caching it")
+                return
+            self._evict(session_id)
+            while self._entries and self.current_bytes + size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted["size"]
+            self._entries[session_id] = {
+                "chunks": chunks,
+                "matrix": matrix,
+                "size": size,
+                "expires_at": time.monotonic() + self.ttl_seconds,
+            }
+            self.current_bytes += size
+
+    def update(self, session_id: str, add_chunks: list, add_matrix, remove_chunks: list = ()):
+        """Applies stored and deleted chunks to a cached session in place of refetching it.
+
+        One cached row is dropped per removed chunk text (identical texts have identical embeddings, so any
+        copy will do) and the new normalized rows are appended. Sessions not in the cache are left alone.
+        """
+        with self._lock:
+            self._bump(session_id)
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return
+            chunks, matrix = entry["chunks"], entry["matrix"]
+
+            keep = np.ones(len(chunks), dtype=bool)
+            pending = Counter(remove_chunks)
+            for i, chunk in enumerate(chunks):
+                if pending.get(chunk):
+                    pending[chunk] -= 1
+                    keep[i] = False
+
+            chunks = [chunk for chunk, kept in zip(chunks, keep) if kept] + list(add_chunks)
+            if len(add_chunks):
+                matrix = np.concatenate([matrix[keep], np.asarray(add_matrix, dtype=np.float32)]) if len(matrix) else add_matrix
+            else:
+                matrix = matrix[keep]
+
+            self._evict(session_id)
+            size = self._entry_size(chunks, matrix)
+            if not chunks or size > self.max_bytes:
+                return
+            while self._entries and self.current_bytes + size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted["size"]
+            # The entry keeps its original expiry: writes from other workers are still only picked up by the TTL
+            self._entries[session_id] = dict(entry, chunks=chunks, matrix=matrix, size=size)
+            self.current_bytes += size
+
+    def invalidate(self, session_id: str):
+        with self._lock:
+            self._bump(session_id)
+            self._evict(session_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __contains__(self, session_id: str):
+        return session_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+session_cache = SessionCache(
+    max_bytes=int(float(os.environ.get("SESSION_CACHE_MAX_MB", 256)) * 1024 * 1024),
+    ttl_seconds=float(os.environ.get("SESSION_CACHE_TTL_SECONDS", 300)),
+)
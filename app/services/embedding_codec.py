@@ -0,0 +1,57 @@
+import base64
+import numpy as np
+
+JSON_ENCODING = "json"
+FLOAT32_ENCODING = "float32"
+FLOAT16_ENCODING = "float16"
+INT8_ENCODING = "int8"
+
+_DTYPES = {
+    FLOAT32_ENCODING: np.dtype("<f4"),
+    FLOAT16_ENCODING: np.dtype("<f2"),
+    INT8_ENCODING: np.dtype("i1"),
+}
+SUPPORTED_ENCODINGS = (JSON_ENCODING,) + tuple(_DTYPES)
+
+
+def encode_embedding(embedding, encoding: str = JSON_ENCODING):
+    """Returns the document fields that store an embedding in the given encoding."""
+    if encoding not in SUPPORTED_ENCODINGS:
+        raise ValueError(f"Unsupported embedding encoding: {encoding}")
+
+    if encoding == JSON_ENCODING:
+        return {'embedding': embedding.tolist() if isinstance(embedding, np.ndarray) else embedding}
+
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    fields = {'embedding_encoding': encoding, 'embedding_dim': int(vector.shape[0])}
+
+    if encoding == INT8_ENCODING:
+        # Per-vector scalar quantization of [min, max] onto the 256 int8 levels
+        offset = float(vector.min()) if vector.size else 0.0
+        span = float(vector.max()) - offset if vector.size else 0.0
+        scale = span / 255 if span > 0 else 1.0
+        quantized = np.rint((vector - offset) / scale) - 128
+        payload = np.clip(quantized, -128, 127).astype(_DTYPES[INT8_ENCODING])
+        fields['embedding_scale'] = scale
+        fields['embedding_offset'] = offset
+    else:
+        payload = vector.astype(_DTYPES[encoding])
+
+    fields['embedding_b64'] = base64.b64encode(payload.tobytes()).decode("ascii")
+    return fields
+
+
+def decode_embedding(item: dict):
+    """Decodes the embedding stored on a document, detecting its encoding from the fields present."""
+    encoding = item.get('embedding_encoding')
+    if encoding is None:
+        return item['embedding']
+    if encoding not in _DTYPES:
+        raise ValueError(f"Unsupported embedding encoding: {encoding}")
+
+    buffer = np.frombuffer(base64.b64decode(item['embedding_b64']), dtype=_DTYPES[encoding])
+    if encoding == FLOAT32_ENCODING:
+        return buffer
+    if encoding == FLOAT16_ENCODING:
+        return buffer.astype(np.float32)
+    return (buffer.astype(np.float32) + 128) * np.float32(item['embedding_scale']) + np.float32(item['embedding_offset'])
@@ -0,0 +1,40 @@
+from contextlib import contextmanager
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Without flock (Windows) these locks only exclude threads, so one process must own each locked directory
+    fcntl = None
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(path: str):
+    with _thread_locks_guard:
+        if path not in _thread_locks:
+            _thread_locks[path] = threading.Lock()
+        return _thread_locks[path]
+
+
+@contextmanager
+def file_lock(lock_path: str, shared: bool = False):
+    """Holds a lock file against other threads and other worker processes sharing its directory.
+
+    flock locks belong to the open file, so every acquisition opens its own descriptor and threads of one
+    process exclude each other just as separate processes do. Readers may share the lock; writers hold it alone.
+    """
+    if fcntl is None:
+        with _thread_lock(lock_path):
+            yield
+        return
+
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
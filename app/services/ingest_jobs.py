@@ -0,0 +1,206 @@
+from app.services.semantic_search import SemanticSearch
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+DEFAULT_QUEUE_PATH = os.environ.get("INGEST_QUEUE_PATH") or os.path.join(tempfile.gettempdir(), "semantic_search_ingest_jobs.sqlite")
+DEFAULT_INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", 2))
+DEFAULT_CLAIM_BATCH = int(os.environ.get("INGEST_CLAIM_BATCH", 4))
+DEFAULT_CHUNK_BATCH = int(os.environ.get("INGEST_CHUNK_BATCH", 256))
+DEFAULT_POLL_SECONDS = float(os.environ.get("INGEST_POLL_SECONDS", 1.0))
+DEFAULT_LEASE_SECONDS = float(os.environ.get("INGEST_LEASE_SECONDS", 600))
+DEFAULT_MAX_ATTEMPTS = int(os.environ.get("INGEST_MAX_ATTEMPTS", 3))
+
+STATUS_FIELDS = ["id", "session_id", "status", "chunks_total", "chunks_embedded", "chunks_stored", "error",
+                 "attempts", "created_at", "updated_at"]
+JOB_FIELDS = ["id", "session_id", "text", "chunk_size", "chunk_strategy", "chunk_overlap"]
+LEASE_COLUMNS = {"claimed_at": "REAL", "attempts": "INTEGER NOT NULL DEFAULT 0"}
+
+
+class IngestJobQueue:
+    """Text ingest jobs in a SQLite table, so every worker process using the same file shares one queue and job status.
+
+    A claimed job holds a lease that its worker renews with every progress update. Once the lease is older than
+    lease_seconds the worker is presumed gone (thread died, host recycled) and claim() hands the job out again;
+    after max_attempts claims it is failed instead. Re-running a job is safe because chunk ids are deterministic.
+    """
+
+    def __init__(self, sqlite_path: str = ":memory:", lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.sqlite_path = sqlite_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # Autocommit mode, so claim() can take the write lock itself with BEGIN IMMEDIATE
+        self._connection = sqlite3.connect(sqlite_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS ingest_jobs ("
+            "id TEXT PRIMARY KEY, session_id TEXT NOT NULL, text TEXT NOT NULL, chunk_size INTEGER NOT NULL, "
+            "chunk_strategy TEXT NOT NULL, chunk_overlap INTEGER NOT NULL, status TEXT NOT NULL, "
+            "chunks_total INTEGER, chunks_embedded INTEGER NOT NULL DEFAULT 0, chunks_stored INTEGER NOT NULL DEFAULT 0, "
+            "error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)")
+        # Queue files created before leases existed gain the columns in place; their running jobs are leased from updated_at
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(ingest_jobs)")}
+        for name, definition in LEASE_COLUMNS.items():
+            if name not in columns:
+                self._connection.execute(f"ALTER TABLE ingest_jobs ADD COLUMN {name} {definition}")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS ingest_jobs_status ON ingest_jobs (status, created_at)")
+
+    def enqueue(self, session_id: str, text: str, chunk_size: int, chunk_strategy: str = "words", chunk_overlap: int = 0):
+        """Adds a queued job and returns its id."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO ingest_jobs (id, session_id, text, chunk_size, chunk_strategy, chunk_overlap, status, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, session_id, text, chunk_size, chunk_strategy, chunk_overlap, QUEUED, now, now))
+        return job_id
+
+    def claim(self, limit: int):
+        """Leases up to `limit` of the oldest queued jobs, or running jobs whose lease expired, and returns them
+        with their text."""
+        now = time.time()
+        expired = now - self.lease_seconds
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                abandoned = self._connection.execute(
+                    "UPDATE ingest_jobs SET status = ?, error = ?, text = '', updated_at = ? "
+                    "WHERE status = ? AND COALESCE(claimed_at, updated_at) < ? AND attempts >= ?",
+                    (FAILED, "Ingest worker stopped before finishing the job", now, RUNNING, expired, self.max_attempts))
+                if abandoned.rowcount:
+                    logger.warning(f"Failed {abandoned.rowcount} ingest jobs after {self.max_attempts} attempts")
+
+                rows = self._connection.execute(
+                    f"SELECT {', '.join(JOB_FIELDS)} FROM ingest_jobs "
+                    "WHERE status = ? OR (status = ? AND COALESCE(claimed_at, updated_at) < ?) ORDER BY created_at LIMIT ?",
+                    (QUEUED, RUNNING, expired, limit)).fetchall()
+                self._connection.executemany(
+                    "UPDATE ingest_jobs SET status = ?, claimed_at = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    [(RUNNING, now, now, row[0]) for row in rows])
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+        return [dict(zip(JOB_FIELDS, row)) for row in rows]
+
+    def update(self, job_id: str, **fields):
+        """Sets status, progress or error fields of a job and renews its lease; a finished job's text is cleared."""
+        fields["updated_at"] = fields["claimed_at"] = time.time()
+        if fields.get("status") in (COMPLETED, FAILED):
+            fields["text"] = ""
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._connection.execute(f"UPDATE ingest_jobs SET {assignments} WHERE id = ?", [*fields.values(), job_id])
+
+    def get(self, job_id: str):
+        """Returns the job's status and progress (without its text), or None for an unknown id."""
+        with self._lock:
+            row = self._connection.execute(f"SELECT {', '.join(STATUS_FIELDS)} FROM ingest_jobs WHERE id = ?",
+                                           (job_id,)).fetchone()
+        return dict(zip(STATUS_FIELDS, row)) if row else None
+
+
+def run_ingest_job(queue: IngestJobQueue, job: dict, batch_chunks: int = DEFAULT_CHUNK_BATCH):
+    """Chunks, embeds and stores one claimed job, recording progress after every batch."""
+    def on_progress(total, embedded, stored):
+        queue.update(job["id"], chunks_total=total, chunks_embedded=embedded, chunks_stored=stored)
+
+    try:
+        success, _ = SemanticSearch().store_text_in_batches(
+            job["text"], job["session_id"], job["chunk_size"], job["chunk_strategy"], job["chunk_overlap"],
+            batch_chunks, on_progress)
+        if success:
+            queue.update(job["id"], status=COMPLETED)
+        else:
+            queue.update(job["id"], status=FAILED, error="Error storing text")
+
+    except Exception as e:
+        logger.error(f"Ingest job {job['id']} failed: {e}")
+        queue.update(job["id"], status=FAILED, error=str(e))
+
+
+class IngestWorkerPool:
+    """Background threads that claim queued jobs a batch at a time and run them."""
+
+    def __init__(self, queue: IngestJobQueue, workers: int = DEFAULT_INGEST_WORKERS, claim_batch: int = DEFAULT_CLAIM_BATCH,
+                 batch_chunks: int = DEFAULT_CHUNK_BATCH, poll_seconds: float = DEFAULT_POLL_SECONDS):
+        self.queue = queue
+        self.workers = workers
+        self.claim_batch = claim_batch
+        self.batch_chunks = batch_chunks
+        self.poll_seconds = poll_seconds
+        self._threads = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def submit(self, session_id: str, text: str, chunk_size: int, chunk_strategy: str = "words", chunk_overlap: int = 0):
+        """Queues a job, making sure the workers are running, and returns the job id."""
+        job_id = self.queue.enqueue(session_id, text, chunk_size, chunk_strategy, chunk_overlap)
+        self.start()
+        self._wake.set()
+        return job_id
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for i in range(max(1, self.workers)):
+                thread = threading.Thread(target=self._run, name=f"ingest-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = None):
+        """Stops the workers once their current jobs finish."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        self._stopping.set()
+        self._wake.set()
+        for thread in threads:
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                jobs = self.queue.claim(self.claim_batch)
+            except Exception as e:
+                logger.error(f"Error claiming ingest jobs: {e}")
+                jobs = []
+
+            if not jobs:
+                # Sleep until a job is submitted in this process, or poll for jobs queued by other processes
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+
+            for job in jobs:
+                run_ingest_job(self.queue, job, self.batch_chunks)
+
+
+def _create_default_queue():
+    if not os.environ.get("INGEST_QUEUE_PATH"):
+        logger.warning("INGEST_QUEUE_PATH is not set; ingest jobs and their status are only visible on this instance")
+    try:
+        return IngestJobQueue(DEFAULT_QUEUE_PATH)
+    except Exception as e:
+        logger.error(f"Error opening ingest queue at {DEFAULT_QUEUE_PATH}: {e}")
+        return IngestJobQueue()
+
+
+ingest_queue = _create_default_queue()
+ingest_workers = IngestWorkerPool(ingest_queue)
@@ -0,0 +1,127 @@
+import logging
+import queue
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+QUEUE_POLL_SECONDS = 0.1
+
+
+class PipelineAborted(Exception):
+    pass
+
+
+class IngestPipeline:
+    """Runs PDF extraction, chunking, embedding and storage as concurrent stages joined by bounded queues.
+
+    Each stage runs on its own thread, so the first chunks are embedded and stored while later pages are
+    still being parsed. Timings report the time each stage spent working, excluding time spent waiting
+    on its neighbours, plus the total wall time.
+    """
+
+    def __init__(self, pdf_utils, vectorizer, db, queue_size: int = 4, on_stored=None):
+        self.pdf_utils = pdf_utils
+        self.vectorizer = vectorizer
+        self.db = db
+        self.on_stored = on_stored
+        self.queue_size = queue_size
+        self._stop = threading.Event()
+        self._error = None
+        self._wait_time = {}
+
+    def _put(self, stage: str, outbox, item):
+        """Hands item downstream, recording time spent blocked on a full queue."""
+        started = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                try:
+                    outbox.put(item, timeout=QUEUE_POLL_SECONDS)
+                    return
+                except queue.Full:
+                    continue
+            raise PipelineAborted()
+        finally:
+            self._wait_time[stage] += time.perf_counter() - started
+
+    def _consume(self, stage: str, inbox):
+        """Yields items from inbox until the upstream stage finishes, recording time spent waiting."""
+        while True:
+            started = time.perf_counter()
+            try:
+                item = inbox.get(timeout=QUEUE_POLL_SECONDS)
+            except queue.Empty:
+                self._wait_time[stage] += time.perf_counter() - started
+                if self._stop.is_set():
+                    raise PipelineAborted()
+                continue
+            self._wait_time[stage] += time.perf_counter() - started
+            if item is _DONE:
+                return
+            yield item
+
+    def _run_stage(self, stage: str, work, timings: dict):
+        self._wait_time[stage] = 0.0
+        started = time.perf_counter()
+        try:
+            work()
+        except PipelineAborted:
+            pass
+        except Exception as e:
+            logger.error(f"error occured in {stage} stage:: {e}")
+            if self._error is None:
+                self._error = e
+            self._stop.set()
+        finally:
+            timings[stage] = round(time.perf_counter() - started - self._wait_time[stage], 4)
+
+    def run(self, source, session_id: str, chunk_size: int):
+        """Ingests a PDF (path, bytes or buffer) into the session and returns (chunks_stored, timings)."""
+        pieces, batches, embedded = (queue.Queue(maxsize=self.queue_size) for _ in range(3))
+        batch_size = self.vectorizer.batch_size
+        stored = [0]
+        timings = {}
+
+        def extract():
+            for piece in self.pdf_utils.iter_text(source):
+                self._put("extract", pieces, piece)
+            self._put("extract", pieces, _DONE)
+
+        def chunk():
+            batch = []
+            for chunk_text in self.vectorizer.chunk_stream(self._consume("chunk", pieces), chunk_size):
+                batch.append(chunk_text)
+                if len(batch) == batch_size:
+                    self._put("chunk", batches, batch)
+                    batch = []
+            if batch:
+                self._put("chunk", batches, batch)
+            self._put("chunk", batches, _DONE)
+
+        def embed():
+            for batch in self._consume("embed", batches):
+                self._put("embed", embedded, (batch, self.vectorizer.encode_batch(batch)))
+            self._put("embed", embedded, _DONE)
+
+        def store():
+            for batch, embeddings in self._consume("store", embedded):
+                self.db.store_chunk(session_id, batch, embeddings, start_index=stored[0])
+                stored[0] += len(batch)
+                if self.on_stored is not None:
+                    self.on_stored(batch, embeddings)
+
+        started = time.perf_counter()
+        stages = {"extract": extract, "chunk": chunk, "embed": embed, "store": store}
+        threads = [threading.Thread(target=self._run_stage, args=(name, work, timings), name=f"ingest-{name}")
+                   for name, work in stages.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        timings["total"] = round(time.perf_counter() - started, 4)
+
+        if self._error is not None:
+            raise self._error
+        return stored[0], timings
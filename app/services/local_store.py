@@ -0,0 +1,314 @@
+from app.services.db_utils import chunk_id, content_hash
+from app.services.similarity import normalize_rows
+from app.services.file_lock import file_lock
+import hashlib
+import json
+import os
+import logging
+import shutil
+import tempfile
+import threading
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_FILE = "embeddings.f32"
+CHUNKS_FILE = "chunks.bin"
+OFFSETS_FILE = "offsets.i64"
+IDS_FILE = "ids.bin"
+META_FILE = "meta.json"
+DOCUMENTS_FILE = "documents.json"
+VERSIONS_FILE = "document_versions.json"
+ID_DTYPE = np.dtype("S64")
+LOCKS_DIR = ".locks"
+
+
+def use_local_store():
+    """Whether STORAGE_BACKEND selects these local shards instead of Cosmos DB."""
+    return os.environ.get("STORAGE_BACKEND", "cosmos").lower() == "local"
+
+
+class ChunkTexts:
+    """Read-only sequence of chunk texts decoded on access from an offset-indexed byte file."""
+
+    def __init__(self, data, offsets):
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunk index out of range")
+        return bytes(self._data[self._offsets[index]:self._offsets[index + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class LocalStore:
+    """Storage backend that keeps each session as memory-mapped shards on local disk instead of Cosmos DB.
+
+    Every session directory holds a contiguous float32 shard of unit-length embeddings, the chunk texts
+    as one UTF-8 file indexed by an int64 offsets file, and the chunk ids used to make writes idempotent;
+    documents.json maps each versioned document to its chunk ids and document_versions.json holds each
+    document's version counter, which outlives its chunks.
+    """
+
+    def __init__(self, root: str = None):
+        self.root = root or os.environ.get("LOCAL_STORE_DIR", os.path.join(tempfile.gettempdir(), "semantic_search_store"))
+
+    def _session_dir(self, session_id: str):
+        return os.path.join(self.root, hashlib.sha256(session_id.encode("utf-8")).hexdigest())
+
+    def _lock(self, session_id: str, shared: bool = False):
+        # Lock files live outside the session directory, so deleting a session cannot remove a held lock
+        name = hashlib.sha256(session_id.encode("utf-8")).hexdigest() + ".lock"
+        return file_lock(os.path.join(self.root, LOCKS_DIR, name), shared)
+
+    def _read_meta(self, session_dir: str):
+        path = os.path.join(session_dir, META_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _write_json(self, session_dir: str, name: str, data: dict):
+        path = os.path.join(session_dir, name)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+    def _write_meta(self, session_dir: str, meta: dict):
+        # Written last under the exclusive session lock; readers take the shared lock, so they never see a meta
+        # and shards from different writes. Shards they have mapped stay valid after the lock is released,
+        # since appends only grow the files and compaction swaps in new ones.
+        self._write_json(session_dir, META_FILE, meta)
+
+    def _read_json(self, session_dir: str, name: str):
+        path = os.path.join(session_dir, name)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _read_documents(self, session_dir: str):
+        """Returns {document_id: {chunk id: document version}} for the session's versioned documents."""
+        return self._read_json(session_dir, DOCUMENTS_FILE)
+
+    def db_health_check(self):
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            if not os.access(self.root, os.W_OK):
+                return False, f"Local store directory {self.root} is not writable"
+            return True, "Connected successfully"
+        except Exception as e:
+            return False, str(e)
+
+    def store_chunk(self, session_id: str, chunks: list, embeddings: list, bulk: bool = None, start_index: int = 0,
+                    ids: list = None, document_id: str = None, document_version: int = None):
+        logger.debug("Storing chunks locally")
+        if len(chunks) == 0:
+            return True
+        try:
+            matrix = normalize_rows(embeddings)
+            ids = np.array(ids or [chunk_id(session_id, start_index + i, chunk) for i, chunk in enumerate(chunks)], dtype=ID_DTYPE)
+            session_dir = self._session_dir(session_id)
+
+            with self._lock(session_id):
+                os.makedirs(session_dir, exist_ok=True)
+                meta = self._read_meta(session_dir) or {"session_id": session_id, "dim": matrix.shape[1], "count": 0}
+                if meta["dim"] != matrix.shape[1]:
+                    raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match stored dimension {meta['dim']}")
+                count = meta["count"]
+
+                existing = {}
+                if count:
+                    stored_ids = np.fromfile(os.path.join(session_dir, IDS_FILE), dtype=ID_DTYPE, count=count)
+                    existing = {stored_id: row for row, stored_id in enumerate(stored_ids)}
+
+                rows = np.array([existing.get(item_id, -1) for item_id in ids])
+                overwrite = np.flatnonzero(rows >= 0)
+                append, seen = [], set()
+                for i in np.flatnonzero(rows < 0):
+                    if ids[i] not in seen:
+                        seen.add(ids[i])
+                        append.append(i)
+
+                if len(overwrite):
+                    # Same id means same text, so only the embedding row can differ
+                    shard = np.memmap(os.path.join(session_dir, EMBEDDINGS_FILE), dtype=np.float32, mode="r+", shape=(count, meta["dim"]))
+                    shard[rows[overwrite]] = matrix[overwrite]
+                    shard.flush()
+
+                if append:
+                    encoded = [chunks[i].encode("utf-8") for i in append]
+                    last_offset = 0
+                    offsets_path = os.path.join(session_dir, OFFSETS_FILE)
+                    if count:
+                        last_offset = int(np.memmap(offsets_path, dtype=np.int64, mode="r", shape=(count + 1,))[count])
+                    offsets = last_offset + np.cumsum([len(chunk) for chunk in encoded], dtype=np.int64)
+                    if not count:
+                        offsets = np.concatenate([np.zeros(1, dtype=np.int64), offsets])
+
+                    self._append(session_dir, EMBEDDINGS_FILE, matrix[append].tobytes(), count * meta["dim"] * 4)
+                    self._append(session_dir, CHUNKS_FILE, b"".join(encoded), last_offset)
+                    self._append(session_dir, OFFSETS_FILE, offsets.tobytes(), (count + 1) * 8 if count else 0)
+                    self._append(session_dir, IDS_FILE, ids[append].tobytes(), count * ID_DTYPE.itemsize)
+                    meta["count"] = count + len(append)
+
+                if document_id is not None:
+                    documents = self._read_documents(session_dir)
+                    document = documents.setdefault(document_id, {})
+                    document.update({item_id.decode("ascii"): document_version for item_id in ids})
+                    self._write_json(session_dir, DOCUMENTS_FILE, documents)
+
+                self._write_meta(session_dir, meta)
+            return True
+
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            raise e
+
+    @staticmethod
+    def _append(session_dir: str, name: str, payload: bytes, committed_size: int):
+        """Appends after the committed length, dropping bytes left behind by an interrupted write."""
+        path = os.path.join(session_dir, name)
+        with open(path, "ab") as f:
+            f.truncate(committed_size)
+            f.write(payload)
+
+    def _map_session(self, session_dir: str, meta: dict):
+        """Maps the shards described by meta; the caller holds the session lock."""
+        if meta is None or meta["count"] == 0:
+            return [], np.empty((0, 0), dtype=np.float32)
+
+        count, dim = meta["count"], meta["dim"]
+        embeddings = np.memmap(os.path.join(session_dir, EMBEDDINGS_FILE), dtype=np.float32, mode="r", shape=(count, dim))
+        offsets = np.memmap(os.path.join(session_dir, OFFSETS_FILE), dtype=np.int64, mode="r", shape=(count + 1,))
+        text_size = int(offsets[count])
+        # np.memmap cannot map an empty file, which happens when every chunk is empty text
+        data = np.memmap(os.path.join(session_dir, CHUNKS_FILE), dtype=np.uint8, mode="r", shape=(text_size,)) if text_size else b""
+        return ChunkTexts(data, offsets), embeddings
+
+    def get_chunks(self, session_id: str):
+        """Returns lazily decoded chunk texts and a read-only memory map of their unit-length embeddings."""
+        logger.debug("Retrieving chunks locally")
+        try:
+            session_dir = self._session_dir(session_id)
+            with self._lock(session_id, shared=True):
+                return self._map_session(session_dir, self._read_meta(session_dir))
+
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            raise e
+
+    def count_chunks(self, session_id: str):
+        """Returns how many chunks the session holds, from its meta file."""
+        session_dir = self._session_dir(session_id)
+        with self._lock(session_id, shared=True):
+            meta = self._read_meta(session_dir)
+            return meta["count"] if meta else 0
+
+    def get_document_chunks(self, session_id: str, document_id: str):
+        """Returns the id, content_hash, chunk and document_version of every stored chunk of one document."""
+        session_dir = self._session_dir(session_id)
+        with self._lock(session_id, shared=True):
+            meta = self._read_meta(session_dir)
+            document = self._read_documents(session_dir).get(document_id)
+            if meta is None or not document:
+                return []
+            chunks, _ = self._map_session(session_dir, meta)
+            stored_ids = np.fromfile(os.path.join(session_dir, IDS_FILE), dtype=ID_DTYPE, count=meta["count"])
+            items = []
+            for row, stored_id in enumerate(stored_ids):
+                item_id = stored_id.decode("ascii")
+                if item_id in document:
+                    chunk = chunks[row]
+                    items.append({"id": item_id, "content_hash": content_hash(chunk), "chunk": chunk,
+                                  "document_version": document[item_id]})
+            return items
+
+    def get_document_version(self, session_id: str, document_id: str):
+        """Returns the document's current version, or 0 for a document that has never been written."""
+        session_dir = self._session_dir(session_id)
+        with self._lock(session_id, shared=True):
+            return self._read_json(session_dir, VERSIONS_FILE).get(document_id, 0)
+
+    def bump_document_version(self, session_id: str, document_id: str):
+        """Increments the document's version counter and returns the new version."""
+        session_dir = self._session_dir(session_id)
+        with self._lock(session_id):
+            os.makedirs(session_dir, exist_ok=True)
+            versions = self._read_json(session_dir, VERSIONS_FILE)
+            versions[document_id] = versions.get(document_id, 0) + 1
+            self._write_json(session_dir, VERSIONS_FILE, versions)
+            return versions[document_id]
+
+    def delete_chunks(self, session_id: str, ids: list):
+        """Removes chunks by id by compacting the session's shards; returns how many were removed."""
+        logger.debug("Deleting chunks locally")
+        try:
+            session_dir = self._session_dir(session_id)
+            with self._lock(session_id):
+                meta = self._read_meta(session_dir)
+                if meta is None or meta["count"] == 0 or not ids:
+                    return 0
+                count, dim = meta["count"], meta["dim"]
+                stored_ids = np.fromfile(os.path.join(session_dir, IDS_FILE), dtype=ID_DTYPE, count=count)
+                keep = ~np.isin(stored_ids, np.array(ids, dtype=ID_DTYPE))
+                removed = int(count - keep.sum())
+                if removed == 0:
+                    return 0
+
+                embeddings = np.fromfile(os.path.join(session_dir, EMBEDDINGS_FILE), dtype=np.float32, count=count * dim)
+                offsets = np.fromfile(os.path.join(session_dir, OFFSETS_FILE), dtype=np.int64, count=count + 1)
+                with open(os.path.join(session_dir, CHUNKS_FILE), "rb") as f:
+                    data = f.read(int(offsets[count]))
+                rows = np.flatnonzero(keep)
+                kept_text = [data[offsets[row]:offsets[row + 1]] for row in rows]
+                new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+                new_offsets[1:] = np.cumsum([len(text) for text in kept_text])
+
+                # Rewrite each shard beside the old one and swap it in; meta goes last with the new row count.
+                # Readers are held off by the lock, and the old files stay alive for any maps they already hold.
+                for name, payload in [(EMBEDDINGS_FILE, embeddings.reshape(count, dim)[rows].tobytes()),
+                                      (CHUNKS_FILE, b"".join(kept_text)),
+                                      (OFFSETS_FILE, new_offsets.tobytes()),
+                                      (IDS_FILE, stored_ids[rows].tobytes())]:
+                    path = os.path.join(session_dir, name)
+                    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                    with open(temp_path, "wb") as f:
+                        f.write(payload)
+                    os.replace(temp_path, path)
+
+                documents = self._read_documents(session_dir)
+                if documents:
+                    deleted = {item_id if isinstance(item_id, str) else item_id.decode("ascii") for item_id in ids}
+                    documents = {document_id: {item_id: version for item_id, version in document.items() if item_id not in deleted}
+                                 for document_id, document in documents.items()}
+                    self._write_json(session_dir, DOCUMENTS_FILE, {k: v for k, v in documents.items() if v})
+
+                meta["count"] = len(rows)
+                self._write_meta(session_dir, meta)
+            return removed
+
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            raise e
+
+    def delete_session(self, session_id: str):
+        """Removes the session's directory; returns how many chunks it held."""
+        session_dir = self._session_dir(session_id)
+        with self._lock(session_id):
+            meta = self._read_meta(session_dir)
+            if os.path.isdir(session_dir):
+                shutil.rmtree(session_dir)
+            return meta["count"] if meta else 0
+
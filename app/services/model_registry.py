@@ -0,0 +1,111 @@
+import os
+import logging
+import threading
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+DEFAULT_DEVICE = "cpu"
+
+TORCH_BACKEND = "torch"
+ONNX_BACKEND = "onnx"
+ONNX_INT8_BACKEND = "onnx-int8"
+BACKENDS = (TORCH_BACKEND, ONNX_BACKEND, ONNX_INT8_BACKEND)
+DEFAULT_BACKEND = os.environ.get("EMBEDDING_BACKEND", TORCH_BACKEND).lower()
+# Dynamically quantized export shipped in the model repository; the avx2 build runs on any x86-64 host
+ONNX_INT8_FILE = os.environ.get("ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+
+
+def load_model(model_name: str, device: str, backend: str = TORCH_BACKEND):
+    """Loads a SentenceTransformer on the given inference backend.
+
+    The ONNX backends (which need `optimum[onnxruntime]`) swap only the transformer forward pass for an
+    onnxruntime session, so tokenization, pooling and normalization are the same modules as with torch.
+    """
+    # Imported here so only workers that actually embed text pay for loading torch
+    from sentence_transformers import SentenceTransformer
+
+    if backend == TORCH_BACKEND:
+        return SentenceTransformer(model_name, device=device)
+    if backend == ONNX_BACKEND:
+        return SentenceTransformer(model_name, device=device, backend="onnx")
+    if backend == ONNX_INT8_BACKEND:
+        return SentenceTransformer(model_name, device=device, backend="onnx", model_kwargs={"file_name": ONNX_INT8_FILE})
+    raise ValueError(f"Unsupported embedding backend {backend}, expected one of: {', '.join(BACKENDS)}")
+
+
+def quantize_onnx_model(model_name: str, output_dir: str, quantization_config: str = "avx2"):
+    """Exports a dynamically int8-quantized ONNX graph of model_name into output_dir.
+
+    Use this for models whose repository does not ship a quantized export, then load output_dir with
+    ONNX_INT8_FILE pointing at the written file.
+    """
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    model = SentenceTransformer(model_name, device=DEFAULT_DEVICE, backend="onnx")
+    model.save_pretrained(output_dir)
+    export_dynamic_quantized_onnx_model(model, quantization_config, output_dir)
+
+
+class ModelRegistry:
+    """Process-wide cache of loaded SentenceTransformer models keyed by (model_name, device, backend)."""
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _key_lock(self, key):
+        with self._lock:
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+            return self._key_locks[key]
+
+    def get(self, model_name: str = DEFAULT_MODEL_NAME, device: str = DEFAULT_DEVICE, backend: str = TORCH_BACKEND):
+        """Returns the shared model for (model_name, device, backend), loading it on first use."""
+        key = (model_name, device, backend)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        # One lock per key so loading one model never blocks lookups of another
+        with self._key_lock(key):
+            model = self._models.get(key)
+            if model is None:
+                logger.info(f"Loading model {model_name} on {device} with the {backend} backend")
+                model = load_model(model_name, device, backend)
+                self._models[key] = model
+            return model
+
+    def warm_up(self, model_names, device: str = DEFAULT_DEVICE, backend: str = TORCH_BACKEND):
+        """Loads the given models ahead of the first request."""
+        for model_name in model_names:
+            self.get(model_name, device, backend)
+
+    def loaded_models(self):
+        return list(self._models.keys())
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self._key_locks.clear()
+
+
+model_registry = ModelRegistry()
+
+
+def warm_up_from_env():
+    """Preloads the comma separated model names listed in PRELOAD_MODELS, if any."""
+    preload = os.environ.get("PRELOAD_MODELS", "")
+    model_names = [name.strip() for name in preload.split(",") if name.strip()]
+    if not model_names:
+        return
+    device = os.environ.get("MODEL_DEVICE", DEFAULT_DEVICE)
+    try:
+        model_registry.warm_up(model_names, device, DEFAULT_BACKEND)
+    except Exception as e:
+        logger.error(f"Error preloading models: {e}")
+
+
+warm_up_from_env()
@@ -1,41 +1,175 @@
+from concurrent.futures import ProcessPoolExecutor
+import codecs
 import fitz
-import re
+import os
+import shutil
+import tempfile
+
+DEFAULT_PARALLEL_PAGE_THRESHOLD = int(os.environ.get("PDF_PARALLEL_PAGE_THRESHOLD", 200))
+# Process-pool extraction forks inside the Functions host, so it is opt-in: set PDF_WORKERS above 1 to enable it
+DEFAULT_PDF_WORKERS = int(os.environ.get("PDF_WORKERS", 1))
+# Uploads up to this size are parsed straight from memory; larger ones are spooled to a temporary file
+MAX_IN_MEMORY_BYTES = int(os.environ.get("PDF_MAX_IN_MEMORY_BYTES", 50 * 1024 * 1024))
+DEFAULT_PRESERVE_UNICODE = os.environ.get("PDF_PRESERVE_UNICODE", "false").lower() == "true"
+
+# Common bullet characters (e.g., •, -, *, →) are removed outright
+BULLET_CHARACTERS = "•-*→"
+NON_ASCII_ERROR_HANDLER = "pdf_utils_space"
+
+# Encoding to ASCII with this handler turns every run of non-ASCII characters into one space in C code
+codecs.register_error(NON_ASCII_ERROR_HANDLER, lambda error: (" ", error.end))
+
+
+def open_pdf(source):
+    """Opens a PDF from a file path, raw bytes or a readable binary buffer; bytes are parsed in memory."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=bytes(source), filetype="pdf")
+    if hasattr(source, "read"):
+        return fitz.open(stream=source.read(), filetype="pdf")
+    return fitz.open(source)
+
+
+def read_upload(uploaded_file, max_in_memory_bytes: int):
+    """Reads an uploaded PDF into memory, or spools it to a uniquely named temporary file when it is larger
+    than max_in_memory_bytes. Returns (source, temp_path); temp_path is None unless a file was written."""
+    pdf_source = uploaded_file.read(max_in_memory_bytes + 1)
+    if len(pdf_source) <= max_in_memory_bytes:
+        return pdf_source, None
+
+    # Use a temporary directory (recommended for Azure Functions)
+    temp_dir = '/tmp' if os.name != 'nt' else os.getcwd()
+    with tempfile.NamedTemporaryFile(dir=temp_dir, suffix='.pdf', delete=False) as f:
+        f.write(pdf_source)
+        shutil.copyfileobj(uploaded_file, f)
+    return f.name, f.name
+
+
+def _extract_page_range(source, start: int, stop: int, preserve_unicode: bool = False):
+    """Process pool worker: opens its own copy of the document and returns the normalized text of pages [start, stop)."""
+    pdf_utils = PDFUtils(preserve_unicode=preserve_unicode)
+    pdf_document = open_pdf(source)
+    try:
+        return [pdf_utils._normalize(pdf_document.load_page(page_num).get_text()) for page_num in range(start, stop)]
+    finally:
+        pdf_document.close()
+
 
 class PDFUtils:
-    def __init__(self):
-        pass
+    def __init__(self, parallel_threshold: int = DEFAULT_PARALLEL_PAGE_THRESHOLD, max_workers: int = DEFAULT_PDF_WORKERS,
+                 preserve_unicode: bool = DEFAULT_PRESERVE_UNICODE):
+        self.parallel_threshold = parallel_threshold
+        self.max_workers = max_workers
+        self.preserve_unicode = preserve_unicode
+
+    def _normalize(self, text):
+        """Removes bullets and, unless preserving Unicode, turns non-ASCII characters into spaces.
+        Whitespace (newlines included) is left for _collapse_whitespace."""
+        for bullet in BULLET_CHARACTERS:
+            text = text.replace(bullet, "")
+
+        if not self.preserve_unicode and not text.isascii():
+            text = text.encode("ascii", NON_ASCII_ERROR_HANDLER).decode("ascii")
+
+        return text
+
+    def _collapse_whitespace(self, text):
+        # str.split() and the regex \s agree on what whitespace is, so this equals re.sub(r"\s+", " ", text).strip()
+        return " ".join(text.split())
 
     def clean_text(self, text):
-        """Cleans up extracted PDF text by replacing newlines, removing bullets and irregular characters."""
-        # Replace newlines with spaces
-        cleaned_text = text.replace("\n", " ")
+        """Cleans up extracted PDF text by replacing newlines, removing bullets and irregular characters.
 
-        # Remove common bullet characters (e.g., •, -, *, →, etc.)
-        cleaned_text = re.sub(r"[•\-\*\→]", "", cleaned_text)
+        Every replacement runs in C (str.replace, an ASCII codec error handler and str.split) rather than
+        as separate regex passes; with preserve_unicode, accented and other non-ASCII text is kept.
+        """
+        return self._collapse_whitespace(self._normalize(text))
 
-        # Remove any other unwanted irregular characters (non-ASCII)
-        cleaned_text = re.sub(r"[^\x00-\x7F]+", " ", cleaned_text)
+    def iter_pages(self, pdf_path):
+        """Yields (page_number, cleaned_text) for each page, starting at 1, without holding the whole document.
 
-        # Replace multiple spaces with a single space
-        cleaned_text = re.sub(r"\s+", " ", cleaned_text).strip()
+        Like the other extraction methods, it accepts a file path, the PDF bytes or a readable binary buffer.
+        """
+        for page_number, _, cleaned_text in self._iter_normalized_pages(pdf_path):
+            yield page_number, cleaned_text
 
-        return cleaned_text
+    def _use_process_pool(self, source, page_count: int):
+        # Workers reopen the document themselves, so they need a path or bytes rather than an open buffer
+        return (self.max_workers > 1 and page_count >= self.parallel_threshold
+                and isinstance(source, (str, os.PathLike, bytes)))
 
-    def extract_text_from_pdf(self, pdf_path):
-        """Extracts and cleans text from a PDF file."""
+    def _iter_parallel_pages(self, pdf_path, page_count: int):
+        """Splits the pages into contiguous ranges across a process pool and yields them back in page order."""
+        workers = min(self.max_workers, page_count)
+        # Several ranges per worker keep the pool busy when some pages are much slower than others
+        range_size = max(1, -(-page_count // (workers * 4)))
+        starts = list(range(0, page_count, range_size))
+        stops = [min(start + range_size, page_count) for start in starts]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for start, pages in zip(starts, executor.map(_extract_page_range, [pdf_path] * len(starts), starts, stops,
+                                                          [self.preserve_unicode] * len(starts))):
+                for offset, normalized in enumerate(pages):
+                    yield start + offset + 1, normalized, self._collapse_whitespace(normalized)
+
+    def _iter_normalized_pages(self, pdf_path):
+        if hasattr(pdf_path, "read"):
+            pdf_path = pdf_path.read()
         try:
-            pdf_document = fitz.open(pdf_path)
-            extracted_text = ""
+            pdf_document = open_pdf(pdf_path)
+            page_count = pdf_document.page_count
+        except Exception as e:
+            raise Exception("Error extracting text from PDF")
 
-            for page_num in range(pdf_document.page_count):
-                page = pdf_document.load_page(page_num)
-                extracted_text += page.get_text()
+        if self._use_process_pool(pdf_path, page_count):
+            pdf_document.close()
+            spooled_path = None
+            try:
+                if isinstance(pdf_path, bytes):
+                    # Every task would otherwise pickle its own copy of the document; workers open one shared file
+                    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+                        f.write(pdf_path)
+                    pdf_path = spooled_path = f.name
+                yield from self._iter_parallel_pages(pdf_path, page_count)
+            except Exception as e:
+                raise Exception("Error extracting text from PDF")
+            finally:
+                if spooled_path and os.path.exists(spooled_path):
+                    os.remove(spooled_path)
+            return
 
+        try:
+            for page_num in range(page_count):
+                page = pdf_document.load_page(page_num)
+                normalized = self._normalize(page.get_text())
+                yield page_num + 1, normalized, self._collapse_whitespace(normalized)
+        except Exception as e:
+            raise Exception("Error extracting text from PDF")
+        finally:
             pdf_document.close()
 
-            # Clean up the extracted text
-            cleaned_text = self.clean_text(extracted_text)
-            return cleaned_text
+    def iter_text(self, pdf_path):
+        """Yields the cleaned document text page by page; the pieces concatenate to extract_text_from_pdf's result.
+
+        Each piece carries the single separating space the whole-document cleaner would have kept at the page
+        boundary, so consumers can start chunking before the last page is parsed.
+        """
+        started = False
+        pending_space = False
+        for _, normalized, cleaned_text in self._iter_normalized_pages(pdf_path):
+            if not cleaned_text:
+                # A blank page still separates the words around it if it held any whitespace
+                pending_space = pending_space or bool(normalized)
+                continue
+            if started and (pending_space or normalized[0].isspace()):
+                cleaned_text = " " + cleaned_text
+            yield cleaned_text
+            started = True
+            pending_space = normalized[-1].isspace()
+
+    def extract_text_from_pdf(self, pdf_path):
+        """Extracts and cleans text from a PDF file path, PDF bytes or a binary buffer."""
+        try:
+            return "".join(self.iter_text(pdf_path))
 
         except Exception as e:
             raise Exception("Error extracting text from PDF")
@@ -1,7 +1,21 @@
-from scipy.spatial.distance import cosine
 from app.services.vectorizer import Vectorizer
-from app.services.db_utils import DBUtils
+from app.services.db_utils import DBUtils, content_hash, document_chunk_id
+from app.services.async_db_utils import AsyncDBUtils
+from app.services.local_store import LocalStore, use_local_store
+from app.services.ingest_pipeline import IngestPipeline
+from app.services.similarity import normalize_rows, top_k
+from app.services.embedding_cache import session_cache
+from app.services.ann_index import ann_store, ann_enabled
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import asyncio
+import heapq
 import logging
+import os
+import numpy as np
+
+DEFAULT_SESSION_WORKERS = int(os.environ.get("SEARCH_SESSION_WORKERS", 8))
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -10,49 +24,414 @@ class SemanticSearch:
     def __init__(self):
         pass
 
-    def store_text(self, text: str, session_id: str, chunk_size: int):
+    def _use_local_store(self):
+        return use_local_store()
+
+    def _storage(self):
+        """Returns the configured storage backend: Cosmos DB by default, or memory-mapped local shards."""
+        if self._use_local_store():
+            return LocalStore()
+        return DBUtils()
+
+    def store_text(self, text: str, session_id: str, chunk_size: int, chunk_strategy: str = "words", chunk_overlap: int = 0):
         """Stores the text by chunking and embedding it."""
         try:
             vectorizer = Vectorizer()
-            chunks, embeddings = vectorizer.vectorize_chunks(text, chunk_size)
-
-            db = DBUtils()
-            success = db.store_chunk(session_id, chunks, embeddings)
+            chunks, embeddings = vectorizer.vectorize_chunks(text, chunk_size, chunk_strategy, chunk_overlap)
 
+            db = self._storage()
+            success = self._store_and_invalidate(db, session_id, chunks, embeddings)
             if not success:
                 return (False, 0)
+            self._sync_ann_index(db, session_id, chunks, embeddings, [])
             return (True, len(chunks))
         
         except Exception as e:
             logger.error(f"error occured:: {e}")
             raise e
 
+    def store_text_in_batches(self, text: str, session_id: str, chunk_size: int, chunk_strategy: str = "words",
+                              chunk_overlap: int = 0, batch_chunks: int = 256, on_progress=None):
+        """Stores the text like store_text, but embeds and writes batch_chunks chunks at a time.
+
+        on_progress(chunks_total, chunks_embedded, chunks_stored) is called after each step, so a caller can report
+        how far a long document has got. Returns (success, chunks stored).
+        """
+        try:
+            vectorizer = Vectorizer()
+            chunks = vectorizer.chunk(text, chunk_size, chunk_strategy, chunk_overlap)
+            total = len(chunks)
+            report = on_progress or (lambda total, embedded, stored: None)
+            report(total, 0, 0)
+
+            db = self._storage()
+            for start in range(0, total, batch_chunks):
+                batch = chunks[start:start + batch_chunks]
+                embeddings = vectorizer.encode_batch(batch)
+                report(total, start + len(batch), start)
+
+                success = self._store_and_invalidate(db, session_id, batch, embeddings, start_index=start)
+                if not success:
+                    return (False, start)
+                self._sync_ann_index(db, session_id, batch, embeddings, [])
+                report(total, start + len(batch), start + len(batch))
+
+            return (True, total)
+
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            raise e
+
+    def _discard_derived_state(self, session_id: str):
+        """Drops this worker's cached session and the ANN index after a write that may have only partly landed."""
+        session_cache.invalidate(session_id)
+        if ann_enabled:
+            ann_store.drop(session_id)
+
+    def _store_and_invalidate(self, db, session_id: str, chunks: list, embeddings, **kwargs):
+        """Stores chunks and invalidates the cached session whatever the outcome; a failed write also drops the index."""
+        success = False
+        try:
+            success = db.store_chunk(session_id, chunks, embeddings, **kwargs)
+            return success
+        finally:
+            session_cache.invalidate(session_id)
+            if not success:
+                self._discard_derived_state(session_id)
+
+    def _document_chunk_ids(self, session_id: str, document_id: str, chunks: list):
+        seen = Counter()
+        ids = []
+        for chunk in chunks:
+            ids.append(document_chunk_id(session_id, document_id, chunk, seen[chunk]))
+            seen[chunk] += 1
+        return ids
+
+    def _apply_session_changes(self, session_id: str, db, added_chunks: list, added_embeddings, removed_chunks: list):
+        """Brings this worker's session cache and ANN index up to date with stored and deleted chunks."""
+        if isinstance(db, LocalStore):
+            # Deleting compacts the local shards, which are cheap to map again, so the entry is just dropped
+            session_cache.invalidate(session_id)
+        else:
+            session_cache.update(session_id, added_chunks, normalize_rows(added_embeddings), removed_chunks)
+        self._sync_ann_index(db, session_id, added_chunks, added_embeddings, removed_chunks)
+
+    def _sync_ann_index(self, db, session_id: str, added_chunks: list, added_embeddings, removed_chunks: list):
+        """Applies stored and deleted chunks to the session's ANN index, if it has one, and records the session's
+        chunk count after the write as the index's watermark."""
+        if not ann_enabled or ann_store.get(session_id) is None:
+            return
+        watermark = db.count_chunks(session_id)
+        if removed_chunks:
+            ann_store.remove(session_id, removed_chunks, watermark)
+        if added_chunks:
+            ann_store.add(session_id, added_chunks, added_embeddings, watermark)
+
+    def _ann_index(self, session_id: str):
+        """Returns the session's ANN index while its watermark still matches the chunk count in storage.
+
+        The count is re-read at most every ANN_CHECK_SECONDS; a mismatch means another host wrote to the session,
+        so the index is dropped and None is returned, and the next load rebuilds it from a fresh read.
+        """
+        if not ann_enabled:
+            return None
+        index = ann_store.get(session_id)
+        if index is None or not ann_store.needs_check(session_id):
+            return index
+        return self._checked_ann_index(session_id, index, self._storage().count_chunks(session_id))
+
+    async def _ann_index_async(self, session_id: str):
+        """_ann_index for coroutines: the Cosmos DB count is awaited instead of blocking the event loop."""
+        if not ann_enabled:
+            return None
+        index = ann_store.get(session_id)
+        if index is None or not ann_store.needs_check(session_id):
+            return index
+        if self._use_local_store():
+            count = await asyncio.to_thread(LocalStore().count_chunks, session_id)
+        else:
+            count = await (await AsyncDBUtils.create()).count_chunks(session_id)
+        return self._checked_ann_index(session_id, index, count)
+
+    def _checked_ann_index(self, session_id: str, index, count: int):
+        if count == index.watermark:
+            ann_store.mark_checked(session_id)
+            return index
+        logger.info(f"ANN index for session {session_id} covers {index.watermark} chunks but storage holds {count}; rebuilding")
+        # The cached matrix may be just as stale, so the exact scan that follows reads storage again
+        self._discard_derived_state(session_id)
+        return None
+
+    def _build_ann_index(self, session_id: str, chunks: list, matrix):
+        if ann_enabled:
+            # Large sessions get an index so later queries skip the linear scan
+            ann_store.build(session_id, chunks, matrix)
+
+    def _write_document(self, db, session_id: str, document_id: str, chunks: list, ids: list, removed: list):
+        """Embeds and stores only the given new chunks, deletes the removed ones and updates the caches.
+
+        Returns the document's version, which is bumped only once every write has succeeded, so a failed edit
+        leaves it unchanged; new chunks are stamped with the version the edit is expected to produce.
+        """
+        version = db.get_document_version(session_id, document_id)
+        if not chunks and not removed:
+            return version
+        # A delete-only change never needs the model
+        embeddings = Vectorizer().encode_batch(chunks) if chunks else np.empty((0, 0), dtype=np.float32)
+        try:
+            if chunks and not db.store_chunk(session_id, chunks, embeddings, ids=ids, document_id=document_id,
+                                             document_version=version + 1):
+                raise Exception("Error storing text")
+            if removed:
+                db.delete_chunks(session_id, [item["id"] for item in removed])
+        except Exception:
+            # Storage may hold part of the change, which the cached rows and index cannot describe
+            self._discard_derived_state(session_id)
+            raise
+        self._apply_session_changes(session_id, db, chunks, embeddings, [item["chunk"] for item in removed])
+        return db.bump_document_version(session_id, document_id)
+
+    def append_text(self, text: str, session_id: str, document_id: str, chunk_size: int, chunk_strategy: str = "words",
+                    chunk_overlap: int = 0):
+        """Adds text to a document, embedding only chunks the document does not already contain.
+
+        Returns the document's version with the number of chunks added and skipped as duplicates; the version
+        only increases when a chunk is added.
+        """
+        try:
+            chunks = Vectorizer().chunk(text, chunk_size, chunk_strategy, chunk_overlap)
+            db = self._storage()
+            stored = db.get_document_chunks(session_id, document_id)
+
+            known = {item["content_hash"] for item in stored}
+            new_chunks = []
+            for chunk in dict.fromkeys(chunks):
+                if content_hash(chunk) not in known:
+                    new_chunks.append(chunk)
+
+            ids = [document_chunk_id(session_id, document_id, chunk) for chunk in new_chunks]
+            version = self._write_document(db, session_id, document_id, new_chunks, ids, [])
+            return {"document_id": document_id, "version": version, "chunks_added": len(new_chunks),
+                    "chunks_skipped": len(chunks) - len(new_chunks)}
+
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            raise e
+
+    def replace_document(self, text: str, session_id: str, document_id: str, chunk_size: int, chunk_strategy: str = "words",
+                         chunk_overlap: int = 0):
+        """Makes the document hold exactly the chunks of text, diffing by chunk hash so only changed chunks are
+        embedded, written or deleted. Returns the version with the chunks added, deleted and unchanged; the
+        version increases whenever a chunk is added or deleted, and stays put for an identical text."""
+        try:
+            chunks = Vectorizer().chunk(text, chunk_size, chunk_strategy, chunk_overlap)
+            db = self._storage()
+            stored = db.get_document_chunks(session_id, document_id)
+
+            ids = self._document_chunk_ids(session_id, document_id, chunks)
+            stored_ids = {item["id"] for item in stored}
+            new = [i for i, item_id in enumerate(ids) if item_id not in stored_ids]
+            wanted = set(ids)
+            removed = [item for item in stored if item["id"] not in wanted]
+
+            version = self._write_document(db, session_id, document_id, [chunks[i] for i in new], [ids[i] for i in new],
+                                           removed)
+            return {"document_id": document_id, "version": version, "chunks_added": len(new),
+                    "chunks_deleted": len(removed), "chunks_unchanged": len(chunks) - len(new)}
+
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            raise e
+
+    def delete_document(self, session_id: str, document_id: str):
+        """Deletes every chunk of one document. The version record is kept, so a document written again later
+        continues from the deleted one's version. Returns the version with the number of chunks deleted."""
+        try:
+            db = self._storage()
+            removed = db.get_document_chunks(session_id, document_id)
+            version = self._write_document(db, session_id, document_id, [], [], removed)
+            return {"document_id": document_id, "version": version, "chunks_deleted": len(removed)}
+
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            raise e
+
+    def delete_session(self, session_id: str):
+        """Deletes all of a session's chunks, with its cache entry and ANN index; returns how many were deleted."""
+        try:
+            deleted = self._storage().delete_session(session_id)
+            session_cache.invalidate(session_id)
+            if ann_enabled:
+                ann_store.drop(session_id)
+            return deleted
+
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            raise e
+
+    def ingest_pdf(self, source, session_id: str, chunk_size: int):
+        """Extracts, chunks, embeds and stores a PDF as one pipeline; returns (chunks stored, stage timings)."""
+        try:
+            db = self._storage()
+
+            def on_stored(chunks, embeddings):
+                self._sync_ann_index(db, session_id, chunks, embeddings, [])
+
+            # PyMuPDF is only needed for ingestion, so search workers never import it
+            from app.services.pdf_utils import PDFUtils
+
+            pipeline = IngestPipeline(PDFUtils(), Vectorizer(), db, on_stored=on_stored)
+            return pipeline.run(source, session_id, chunk_size)
+
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            raise e
+
+        finally:
+            # A failed run may still have stored some batches, so the cached session is stale either way
+            session_cache.invalidate(session_id)
+
+    def _load_session(self, session_id: str):
+        """Returns the session's chunks and normalized embedding matrix, from the cache when possible."""
+        cached = session_cache.get(session_id)
+        if cached is not None:
+            return cached
+
+        generation = session_cache.generation(session_id)
+        db = self._storage()
+        chunks, embeddings = db.get_chunks(session_id)
+        if len(chunks) == 0 or len(embeddings) == 0:
+            return None
+
+        # The local store already keeps unit-length rows, so its memory-mapped shard is scored without a copy
+        matrix = embeddings if isinstance(db, LocalStore) else normalize_rows(embeddings)
+        session_cache.put(session_id, chunks, matrix, generation)
+        # Indexes are only built from a fresh read, never from a cached matrix that may miss recent writes
+        self._build_ann_index(session_id, chunks, matrix)
+        return chunks, matrix
+
+    async def _load_session_async(self, session_id: str):
+        """_load_session for coroutines: Cosmos DB pages are awaited instead of blocking the event loop."""
+        cached = session_cache.get(session_id)
+        if cached is not None:
+            return cached
+
+        # Checked from the settings, since building the sync DBUtils would connect its client on the event loop
+        if self._use_local_store():
+            return await asyncio.to_thread(self._load_session, session_id)
+
+        generation = session_cache.generation(session_id)
+        db = await AsyncDBUtils.create()
+        chunks, embeddings = await db.get_chunks(session_id)
+        if len(chunks) == 0 or len(embeddings) == 0:
+            return None
+
+        matrix = normalize_rows(embeddings)
+        session_cache.put(session_id, chunks, matrix, generation)
+        if ann_enabled:
+            await asyncio.to_thread(self._build_ann_index, session_id, chunks, matrix)
+        return chunks, matrix
+
+    def _search_session(self, session_id: str, query_embedding, limit: int, base_similarity: float):
+        """Returns the session's best (chunk, score) pairs for a unit-length query, or None when it has no chunks."""
+        index = self._ann_index(session_id)
+        if index is not None:
+            return index.search(query_embedding, limit, base_similarity)
+
+        return self._score_session(session_id, self._load_session(session_id), query_embedding, limit, base_similarity)
+
+    def _score_session(self, session_id: str, session, query_embedding, limit: int, base_similarity: float):
+        if session is None:
+            return None
+        chunks, matrix = session
+
+        # One matrix-vector product scores every chunk at once
+        scores = matrix @ query_embedding
+
+        return [(chunks[i], score) for i, score in top_k(scores, limit, base_similarity)]
+
     def search_text(self, query: str, session_id: str, limit: int = 3, base_similarity: float = 0.0):
         """Searches for the most similar text chunks to the query."""
         try:
-            db = DBUtils()
-            chunks, embeddings = db.get_chunks(session_id)  
-            
-            if len(chunks) == 0 or len(embeddings) == 0:
+            query_embedding = normalize_rows(Vectorizer().vectorize_query(query))[0]
+            return self._search_session(session_id, query_embedding, limit, base_similarity)
+
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            raise e
+
+    async def search_text_async(self, query: str, session_id: str, limit: int = 3, base_similarity: float = 0.0):
+        """search_text for async entry points: the session fetch is awaited and the model runs on a worker thread,
+        so one worker can serve other searches while this one waits on Cosmos DB."""
+        try:
+            query_embedding = await asyncio.to_thread(lambda: normalize_rows(Vectorizer().vectorize_query(query))[0])
+            index = await self._ann_index_async(session_id)
+            if index is not None:
+                return index.search(query_embedding, limit, base_similarity)
+
+            session = await self._load_session_async(session_id)
+            return await asyncio.to_thread(self._score_session, session_id, session, query_embedding, limit, base_similarity)
+
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            raise e
+
+    def search_sessions(self, query: str, session_ids: list, limit: int = 3, base_similarity: float = 0.0,
+                        max_workers: int = DEFAULT_SESSION_WORKERS):
+        """Searches several sessions for the query and returns the best (chunk, score, session_id) hits overall.
+
+        Sessions are fetched and scored concurrently, one partition per task; their sorted hit lists are then
+        merged through a heap, stopping after `limit` results. Returns None when none of the sessions has chunks.
+        """
+        try:
+            session_ids = list(dict.fromkeys(session_ids))
+            if not session_ids:
                 return None
+            query_embedding = normalize_rows(Vectorizer().vectorize_query(query))[0]
 
-            similarity_scores = []
-            vectorizer = Vectorizer()
-            query_embedding = vectorizer.vectorize_text(query)  
-            
-            for i, embedding in enumerate(embeddings):
-                similarity = 1 - cosine(query_embedding, embedding)
-                if similarity >= base_similarity:
-                    similarity_scores.append((i, similarity))
+            def search_one(session_id):
+                return self._search_session(session_id, query_embedding, limit, base_similarity)
+
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(session_ids)))) as executor:
+                per_session = list(executor.map(search_one, session_ids))
+
+            if all(results is None for results in per_session):
+                return None
+
+            ranked = [[(chunk, score, session_id) for chunk, score in results]
+                      for session_id, results in zip(session_ids, per_session) if results]
+            return list(islice(heapq.merge(*ranked, key=lambda hit: -hit[1]), limit))
+
+        except Exception as e:
+            logger.error(f"error occured:: {e}")
+            raise e
+
+    def search_batch(self, queries: list, session_id: str):
+        """Searches one session for several (query, limit, base_similarity) requests at once.
+
+        The queries are embedded together, the session is loaded once and every chunk is scored against every
+        query in one matrix product. Returns one result list per query in request order, or None for an empty session.
+        """
+        try:
+            texts = [query for query, _, _ in queries]
+            index = self._ann_index(session_id)
+            if index is not None:
+                query_embeddings = Vectorizer().vectorize_queries(texts)
+                return [index.search(embedding, limit, base_similarity)
+                        for embedding, (_, limit, base_similarity) in zip(query_embeddings, queries)]
+
+            session = self._load_session(session_id)
+            if session is None:
+                return None
+            chunks, matrix = session
 
-            similarity_scores.sort(key=lambda x: x[1], reverse = True)
+            query_embeddings = normalize_rows(Vectorizer().vectorize_queries(texts))
 
-            results = []
-            for i in range(min(limit, len(similarity_scores))):
-                chunk_index, score = similarity_scores[i]
-                results.append((chunks[chunk_index], score))
+            # One (queries x chunks) product replaces a matrix-vector product per query
+            scores = query_embeddings @ matrix.T
 
-            return results
+            return [[(chunks[i], score) for i, score in top_k(row, limit, base_similarity)]
+                    for row, (_, limit, base_similarity) in zip(scores, queries)]
 
         except Exception as e:
             logger.error(f"error occured:: {e}")
@@ -0,0 +1,29 @@
+import numpy as np
+
+
+def normalize_rows(matrix):
+    """Returns a float32 copy of matrix with every row scaled to unit length (zero rows stay zero)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(scores, limit: int, base_similarity: float = 0.0):
+    """Returns (index, score) pairs of the best `limit` scores at or above base_similarity, best first."""
+    scores = np.asarray(scores)
+    candidates = np.flatnonzero(scores >= base_similarity)
+    if limit <= 0 or len(candidates) == 0:
+        return []
+
+    candidate_scores = scores[candidates]
+    if len(candidates) > limit:
+        # Partial selection is O(n); only the `limit` survivors get fully sorted
+        best = np.argpartition(-candidate_scores, limit - 1)[:limit]
+        candidates = candidates[best]
+        candidate_scores = candidate_scores[best]
+
+    order = np.argsort(-candidate_scores, kind="stable")
+    return [(int(candidates[i]), float(candidate_scores[i])) for i in order]
@@ -1,20 +1,205 @@
-from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer
-import torch
+from app.services.model_registry import model_registry, DEFAULT_BACKEND, TORCH_BACKEND
+from app.services.chunk_embedding_cache import embedding_cache, query_embedding_cache
+import logging
+import numpy as np
+import os
+
+DEFAULT_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 32))
+WORD_CHUNKING = "words"
+TOKEN_CHUNKING = "tokens"
+SENTENCE_ENDINGS = ".!?"
+# [CLS] and [SEP] take two positions of the model's sequence length
+SPECIAL_TOKEN_COUNT = 2
+QUERY_CACHE_LOG_INTERVAL = 100
+
+logger = logging.getLogger(__name__)
 
 class Vectorizer:
-    def __init__(self, model_name="all-MiniLM-L6-v2", device='cpu'):
-        self.model = SentenceTransformer(model_name, device = device)
+    def __init__(self, model_name="all-MiniLM-L6-v2", device='cpu', batch_size: int = DEFAULT_BATCH_SIZE, cache=embedding_cache,
+                 query_cache=query_embedding_cache, backend: str = DEFAULT_BACKEND):
+        self.model_name = model_name
+        self.backend = backend
+        # Cached embeddings are namespaced by backend, since quantized runtimes give slightly different vectors
+        self.cache_namespace = model_name if backend == TORCH_BACKEND else f"{model_name}:{backend}"
+        self.model = model_registry.get(model_name, device, backend)
+        self.batch_size = batch_size
+        self.cache = cache
+        self.query_cache = query_cache
 
     def vectorize_text(self, text: str):
         return self.model.encode(text)
+
+    def vectorize_query(self, query: str):
+        """Embeds a search query, reusing the embedding of an identical earlier query when cached."""
+        if self.query_cache is None or not self.query_cache.enabled:
+            return self.vectorize_text(query)
+
+        key = self._query_key(query)
+        cached = self.query_cache.get_many(self.cache_namespace, [key])
+        if cached:
+            embedding = cached[0]
+            logger.debug("Query embedding cache hit")
+        else:
+            embedding = np.asarray(self.vectorize_text(query), dtype=np.float32)
+            self.query_cache.put_many(self.cache_namespace, [key], [embedding])
+            logger.debug("Query embedding cache miss")
+
+        self._log_query_cache_stats()
+        return embedding
+
+    def vectorize_queries(self, queries: list):
+        """Embeds several search queries as one float32 matrix, encoding the uncached ones in a single batch."""
+        if self.query_cache is None or not self.query_cache.enabled or len(queries) == 0:
+            return self._encode_uncached(queries, max(self.batch_size, len(queries)))
+
+        keys = [self._query_key(query) for query in queries]
+        cached = self.query_cache.get_many(self.cache_namespace, keys)
+        misses = [i for i in range(len(queries)) if i not in cached]
+        if misses:
+            encoded = self._encode_uncached([queries[i] for i in misses], max(self.batch_size, len(misses)))
+            self.query_cache.put_many(self.cache_namespace, [keys[i] for i in misses], encoded)
+            cached.update(zip(misses, encoded))
+
+        self._log_query_cache_stats(len(queries))
+        return np.stack([cached[i] for i in range(len(queries))]).astype(np.float32, copy=False)
+
+    def _query_key(self, query: str):
+        # The cache key already ignores whitespace; casing is ignored too when the tokenizer lowercases anyway
+        tokenizer = getattr(self.model, "tokenizer", None)
+        return query.lower() if getattr(tokenizer, "do_lower_case", False) is True else query
+
+    def _log_query_cache_stats(self, new_lookups: int = 1):
+        lookups = self.query_cache.lookups()
+        # A batch can step over a multiple of the interval, so log whenever one was crossed
+        if lookups // QUERY_CACHE_LOG_INTERVAL != (lookups - new_lookups) // QUERY_CACHE_LOG_INTERVAL:
+            logger.info(f"Query embedding cache: {self.query_cache.hits} hits, {self.query_cache.misses} misses")
     
     def chunk_text(self, text: str, chunk_size : int):
         words = text.split()
         chunks = [' '.join(words[i:i+chunk_size]) for i in range(0, len(words), chunk_size)]
         return chunks
+
+    def chunk_stream(self, pieces, chunk_size: int):
+        """Yields the same chunks as chunk_text(''.join(pieces)) as soon as each one fills up."""
+        pending = []
+        carry = ""
+        for piece in pieces:
+            text = carry + piece
+            words = text.split()
+            # A piece that ends mid-word may continue in the next one
+            carry = words.pop() if words and not text[-1].isspace() else ""
+            pending.extend(words)
+            while len(pending) >= chunk_size:
+                yield ' '.join(pending[:chunk_size])
+                pending = pending[chunk_size:]
+        if carry:
+            pending.append(carry)
+        for i in range(0, len(pending), chunk_size):
+            yield ' '.join(pending[i:i+chunk_size])
+
+    def max_chunk_tokens(self):
+        """Largest number of text tokens the model embeds without truncating."""
+        max_seq_length = getattr(self.model, "max_seq_length", None) or 256
+        return max_seq_length - SPECIAL_TOKEN_COUNT
+
+    def chunk_text_by_tokens(self, text: str, max_tokens: int = None, overlap: int = 0, snap_to_sentence: bool = True):
+        """Packs the text into chunks of at most max_tokens model tokens, in one pass over one tokenization.
+
+        Consecutive chunks share `overlap` tokens. With snap_to_sentence, a chunk ends after the last
+        sentence-ending token in the second half of its window instead of mid-sentence. Chunks are
+        slices of the original text, located through the tokenizer's character offsets.
+        """
+        budget = min(max_tokens or self.max_chunk_tokens(), self.max_chunk_tokens())
+        overlap = max(0, min(overlap, budget - 1))
+        tokenizer = getattr(self.model, "tokenizer", None)
+        try:
+            encoded = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+            offsets = encoded["offset_mapping"]
+        except Exception:
+            # Slow tokenizers cannot report offsets; word chunks of the same size are the closest fallback
+            return self.chunk_text(text, budget)
+
+        token_count = len(offsets)
+        # last_sentence_end[i] is the index of the last sentence-ending token before position i, or -1
+        last_sentence_end = np.full(token_count + 1, -1, dtype=np.int64)
+        for i, (_, end) in enumerate(offsets):
+            ends_sentence = end > 0 and text[end - 1] in SENTENCE_ENDINGS
+            last_sentence_end[i + 1] = i if ends_sentence else last_sentence_end[i]
+
+        chunks = []
+        start = 0
+        while start < token_count:
+            end = min(start + budget, token_count)
+            if snap_to_sentence and end < token_count and last_sentence_end[end] >= start + budget // 2:
+                end = last_sentence_end[end] + 1
+            chunks.append(text[offsets[start][0]:offsets[end - 1][1]].strip())
+            if end == token_count:
+                break
+            start = max(end - overlap, start + 1)
+        return chunks
+
+    def _token_lengths(self, texts: list):
+        """Returns the token count of each text, falling back to word counts without a tokenizer."""
+        tokenizer = getattr(self.model, "tokenizer", None)
+        if tokenizer is not None:
+            try:
+                encoded = tokenizer(texts, add_special_tokens=False)
+                return [len(ids) for ids in encoded["input_ids"]]
+            except Exception:
+                pass
+        return [len(text.split()) for text in texts]
+
+    def encode_batch(self, texts: list, batch_size: int = None):
+        """Returns a float32 matrix of embeddings in the original order, encoding only texts not already cached."""
+        if self.cache is None or not self.cache.enabled or len(texts) == 0:
+            return self._encode_uncached(texts, batch_size)
+
+        cached = self.cache.get_many(self.cache_namespace, texts)
+        if len(cached) == len(texts):
+            return np.stack([cached[i] for i in range(len(texts))])
+
+        misses = [i for i in range(len(texts)) if i not in cached]
+        encoded = self._encode_uncached([texts[i] for i in misses], batch_size)
+        self.cache.put_many(self.cache_namespace, [texts[i] for i in misses], encoded)
+        if not cached:
+            return encoded
+
+        embeddings = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+        embeddings[misses] = encoded
+        for i, vector in cached.items():
+            embeddings[i] = vector
+        return embeddings
+
+    def _encode_uncached(self, texts: list, batch_size: int = None):
+        """Encodes texts in length-sorted batches and returns a float32 matrix in the original order."""
+        batch_size = batch_size or self.batch_size
+        if len(texts) == 0:
+            dimension = self.model.get_sentence_embedding_dimension() or 0
+            return np.empty((0, dimension), dtype=np.float32)
+
+        # Batching similar lengths together keeps padding inside each forward pass small
+        order = np.argsort(self._token_lengths(texts), kind="stable")
+        embeddings = None
+
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            batch = [texts[i] for i in indices]
+            encoded = self.model.encode(batch, batch_size=batch_size, convert_to_numpy=True)
+            if embeddings is None:
+                embeddings = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+            embeddings[indices] = encoded
+
+        return embeddings
     
-    def vectorize_chunks(self, text: str, chunk_size : int):
-        chunks = self.chunk_text(text, chunk_size)
-        embeddings = [self.vectorize_text(chunk) for chunk in chunks]
-        return chunks, embeddings
\ No newline at end of file
+    def chunk(self, text: str, chunk_size: int, chunk_strategy: str = WORD_CHUNKING, chunk_overlap: int = 0):
+        """Chunks the text into chunk_size words, or with the token strategy into chunks of up to
+        chunk_size model tokens (capped at the model limit)."""
+        if chunk_strategy == TOKEN_CHUNKING:
+            return self.chunk_text_by_tokens(text, chunk_size, chunk_overlap)
+        return self.chunk_text(text, chunk_size)
+
+    def vectorize_chunks(self, text: str, chunk_size : int, chunk_strategy: str = WORD_CHUNKING, chunk_overlap: int = 0):
+        """Chunks the text as chunk() does and embeds the chunks."""
+        chunks = self.chunk(text, chunk_size, chunk_strategy, chunk_overlap)
+        embeddings = self.encode_batch(chunks)
+        return chunks, embeddings
@@ -0,0 +1,50 @@
+"""Micro-benchmark of PDFUtils.clean_text against the original three-regex cleaner.
+
+Run from the repository root:
+
+    python -m benchmarks.clean_text_benchmark [megabytes]
+"""
+from app.services.pdf_utils import PDFUtils
+import random
+import re
+import sys
+import timeit
+
+
+def legacy_clean_text(text):
+    """The cleaner PDFUtils used before its regex passes were replaced by str.replace, an ASCII codec error handler
+    and str.split; kept as the reference output for the benchmark and the equivalence test."""
+    cleaned_text = text.replace("\n", " ")
+    cleaned_text = re.sub(r"[•\-\*\→]", "", cleaned_text)
+    cleaned_text = re.sub(r"[^\x00-\x7F]+", " ", cleaned_text)
+    cleaned_text = re.sub(r"\s+", " ", cleaned_text).strip()
+    return cleaned_text
+
+
+def sample_text(megabytes: float, seed: int = 0):
+    """Builds PDF-like text: words, line breaks, bullets, accented words and stray symbols."""
+    rng = random.Random(seed)
+    tokens = ["the", "contract", "termination", "clause", "pricing", "summary", "\n", "\n\n", "• ", "- ",
+              "* ", "→", "café", "naïve", "€100", "  ", "\t", "2024", "Section 4.2", "—"]
+    pieces, size = [], 0
+    while size < megabytes * 1024 * 1024:
+        token = rng.choice(tokens)
+        pieces.append(token + " ")
+        size += len(token) + 1
+    return "".join(pieces)
+
+
+def main(megabytes: float = 4.0, repeat: int = 5):
+    text = sample_text(megabytes)
+    pdf_utils = PDFUtils()
+    assert pdf_utils.clean_text(text) == legacy_clean_text(text), "clean_text output differs from the legacy cleaner"
+
+    legacy = min(timeit.repeat(lambda: legacy_clean_text(text), number=1, repeat=repeat))
+    current = min(timeit.repeat(lambda: pdf_utils.clean_text(text), number=1, repeat=repeat))
+    print(f"text size:      {len(text) / 1024 / 1024:.1f} MB")
+    print(f"legacy cleaner: {legacy * 1000:.1f} ms")
+    print(f"clean_text:     {current * 1000:.1f} ms ({legacy / current:.2f}x)")
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 4.0)
@@ -0,0 +1,38 @@
+"""Cold import time of each function entry point, measured in a fresh interpreter per module.
+
+Run from the repository root:
+
+    python -m benchmarks.import_time_benchmark
+"""
+import json
+import subprocess
+import sys
+
+ENTRY_POINTS = ["healthcheck_func", "pdf2text_func", "search_func", "text_func", "ingest_func"]
+HEAVY_MODULES = ["torch", "sentence_transformers", "sklearn", "scipy", "transformers"]
+
+_MEASURE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "heavy_modules": [name for name in {heavy} if name in sys.modules]}}))
+"""
+
+
+def measure_import(module: str):
+    """Returns (seconds, heavy modules loaded) for importing module in a new interpreter."""
+    code = _MEASURE.format(module=module, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return result["seconds"], result["heavy_modules"]
+
+
+def main():
+    for module in ENTRY_POINTS:
+        seconds, heavy_modules = measure_import(module)
+        print(f"{module:<18} {seconds * 1000:8.0f} ms   heavy imports: {', '.join(heavy_modules) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
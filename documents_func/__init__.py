@@ -0,0 +1,63 @@
+import azure.functions as func
+from app.models.models import DocumentInput
+from app.services.semantic_search import SemanticSearch
+from app.models.models import Response
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        session_id = req.route_params.get("session_id")
+        document_id = req.route_params.get("document_id")
+        method = req.method.upper()
+        logging.info(f'{method} document {document_id} in session {session_id}')
+
+        # Initialize the SemanticSearch service
+        semantic_search = SemanticSearch()
+
+        if method == "DELETE":
+            result = semantic_search.delete_document(session_id, document_id)
+            response_model = Response(
+                status="success",
+                message="Document deleted successfully",
+                data=result
+            )
+            return func.HttpResponse(response_model.to_json(), status_code=200, mimetype='application/json')
+
+        document_input = DocumentInput(**req.get_json())
+
+        # POST appends new chunks to the document; PUT replaces its content, rewriting only the chunks that changed
+        if method == "PUT":
+            result = semantic_search.replace_document(document_input.text, session_id, document_id, document_input.chunk_size,
+                                                      document_input.chunk_strategy, document_input.chunk_overlap)
+            message = "Document replaced successfully"
+        else:
+            result = semantic_search.append_text(document_input.text, session_id, document_id, document_input.chunk_size,
+                                                 document_input.chunk_strategy, document_input.chunk_overlap)
+            message = "Text appended successfully"
+
+        response_model = Response(
+            status="success",
+            message=message,
+            data=result
+        )
+        return func.HttpResponse(response_model.to_json(), status_code=200, mimetype='application/json')
+
+    except ValueError:
+        response_model = Response(
+            status="error",
+            message="Invalid input",
+            error="Invalid input"
+        )
+        return func.HttpResponse(response_model.to_json(), status_code=400, mimetype='application/json')
+
+    except Exception as e:
+        logging.error(f"Error updating document: {str(e)}")
+        response_model = Response(
+            status="error",
+            message="Document update failed",
+            error=str(e)
+        )
+        return func.HttpResponse(response_model.to_json(), status_code=500, mimetype='application/json')
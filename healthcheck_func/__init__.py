@@ -1,5 +1,6 @@
 import azure.functions as func
-from app.services.db_utils import DBUtils
+from app.services.async_db_utils import AsyncDBUtils
+from app.services.local_store import LocalStore, use_local_store
 from app.models.models import Response
 import json
 import logging
@@ -8,9 +9,14 @@ import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 
 
-def main(req: func.HttpRequest) -> func.HttpResponse:
-    logging.info('Checking cosmos db connection')
-    is_healthy, message = DBUtils().db_health_check()
+async def main(req: func.HttpRequest) -> func.HttpResponse:
+    if use_local_store():
+        logging.info('Checking local store directory')
+        is_healthy, message = LocalStore().db_health_check()
+    else:
+        logging.info('Checking cosmos db connection')
+        db = await AsyncDBUtils.create()
+        is_healthy, message = await db.db_health_check()
 
     response_model = Response(
         status="success" if is_healthy else "error",
@@ -0,0 +1,67 @@
+import azure.functions as func
+from app.models.models import IngestInput
+from app.services.pdf_utils import MAX_IN_MEMORY_BYTES, read_upload
+from app.services.semantic_search import SemanticSearch
+from app.models.models import Response
+import logging
+import os
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    pdf_path = None  # Declare pdf_path to ensure it's available in the finally block
+
+    try:
+        logging.info('ingesting pdf into session')
+
+        # Get the file and the session settings from the multipart form
+        uploaded_file = req.files['file']
+        ingest_input = IngestInput(**dict(req.form))
+
+        # Check if it's a valid PDF file
+        if uploaded_file.filename == '' or not uploaded_file.filename.endswith('.pdf'):
+            response_model = Response(
+                status="error",
+                message="Invalid file type",
+                error="Invalid file type. Only PDF is allowed."
+            )
+            return func.HttpResponse(response_model.to_json(), status_code=400, mimetype='application/json')
+
+        pdf_source, pdf_path = read_upload(uploaded_file, MAX_IN_MEMORY_BYTES)
+
+        # Extract, chunk, embed and store the document as one pipeline
+        chunks, timings = SemanticSearch().ingest_pdf(pdf_source, ingest_input.session_id, ingest_input.chunk_size)
+
+        response_model = Response(
+            status="success",
+            message="PDF ingested successfully",
+            data={"chunks_stored": chunks, "timings": timings}
+        )
+        return func.HttpResponse(response_model.to_json(), status_code=200, mimetype='application/json')
+
+    except ValueError:
+        response_model = Response(
+            status="error",
+            message="Invalid input",
+            error="Invalid input"
+        )
+        return func.HttpResponse(response_model.to_json(), status_code=400, mimetype='application/json')
+
+    except Exception as e:
+        logging.error(f"Error in pdf ingestion: {str(e)}")
+        response_model = Response(
+            status="error",
+            message="PDF ingestion failed",
+            error=str(e)
+        )
+        return func.HttpResponse(response_model.to_json(), status_code=500, mimetype='application/json')
+
+    finally:
+        # Remove the spooled PDF file after processing
+        if pdf_path and os.path.exists(pdf_path):
+            try:
+                os.remove(pdf_path)
+                logging.info(f"Temporary file {pdf_path} has been removed.")
+            except Exception as e:
+                logging.error(f"Error removing temporary file {pdf_path}: {str(e)}")
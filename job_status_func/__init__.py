@@ -0,0 +1,40 @@
+import azure.functions as func
+from app.services.ingest_jobs import ingest_queue, ingest_workers
+from app.models.models import Response
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+# Status polls land on instances that may never receive a submit, so their workers start on import too
+ingest_workers.start()
+
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        job_id = req.route_params.get("job_id")
+        logging.info(f'checking ingest job {job_id}')
+        job = ingest_queue.get(job_id) if job_id else None
+
+        if job is None:
+            response_model = Response(
+                status="error",
+                message="Job not found",
+                error="Job not found"
+            )
+            return func.HttpResponse(response_model.to_json(), status_code=404, mimetype='application/json')
+
+        response_model = Response(
+            status="success",
+            message="Job status returned successfully",
+            data=job
+        )
+        return func.HttpResponse(response_model.to_json(), status_code=200, mimetype='application/json')
+
+    except Exception as e:
+        logging.error(f"Error reading job status: {str(e)}")
+        response_model = Response(
+            status="error",
+            message="Job status failed",
+            error=str(e)
+        )
+        return func.HttpResponse(response_model.to_json(), status_code=500, mimetype='application/json')
@@ -1,5 +1,5 @@
 import azure.functions as func
-from app.services.pdf_utils import PDFUtils
+from app.services.pdf_utils import PDFUtils, MAX_IN_MEMORY_BYTES, read_upload
 from app.models.models import Response
 import json
 import logging
@@ -27,16 +27,11 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             return func.HttpResponse(response_model.to_json(), status_code=400, mimetype='application/json')
 
 
-        # Use a temporary directory (recommended for Azure Functions)
-        temp_dir = '/tmp' if os.name != 'nt' else os.getcwd()
-        
-        # Save the uploaded PDF file to the temporary location
-        pdf_path = os.path.join(temp_dir, uploaded_file.filename)
-        with open(pdf_path, 'wb') as f:
-            f.write(uploaded_file.read())
+        # Parse small uploads in memory so no file is written and concurrent uploads cannot collide
+        pdf_source, pdf_path = read_upload(uploaded_file, MAX_IN_MEMORY_BYTES)
 
         # Extract text from the PDF
-        extracted_text = PDFUtils().extract_text_from_pdf(pdf_path)
+        extracted_text = PDFUtils().extract_text_from_pdf(pdf_source)
 
         response_model = Response(
             status="success",
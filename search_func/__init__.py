@@ -1,6 +1,7 @@
 import azure.functions as func
+import asyncio
 import json
-from app.models.models import SearchQuery
+from app.models.models import BatchSearchQuery, MultiSessionSearchQuery, SearchQuery
 from app.services.semantic_search import SemanticSearch
 from app.models.models import Response
 import logging
@@ -8,18 +9,49 @@ import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 
 
-def main(req: func.HttpRequest) -> func.HttpResponse:
+async def search_batch(batch: BatchSearchQuery) -> func.HttpResponse:
+    """Answers several queries against one session with a single embedding pass and session fetch."""
+    results = await asyncio.to_thread(SemanticSearch().search_batch,
+        [(query.query, query.limit, query.base_similarity) for query in batch.queries], batch.session_id)
+
+    if results is None:
+        response_model = Response(
+            status="error",
+            message="No results found",
+            error="No results found"
+        )
+        return func.HttpResponse(response_model.to_json(), status_code=404, mimetype='application/json')
+
+    response_model = Response(
+        status="success",
+        message="Search results returned successfully",
+        data={"results": [
+            {"query": query.query, "limit": query.limit, "base_similarity": query.base_similarity, "top_results": top_results}
+            for query, top_results in zip(batch.queries, results)
+        ]}
+    )
+    return func.HttpResponse(response_model.to_json(), status_code=200, mimetype='application/json')
+
+
+async def main(req: func.HttpRequest) -> func.HttpResponse:
     try:
         logging.info('processing search query')
         # Parse request body
         req_body = req.get_json()
-        query = SearchQuery(**req_body)
+        if "queries" in req_body:
+            return await search_batch(BatchSearchQuery(**req_body))
 
         # Initialize the SemanticSearch service
         semantic_search = SemanticSearch()
 
-        # Perform the search based on the query
-        results = semantic_search.search_text(query.query, query.session_id, query.limit, query.base_similarity)
+        # Perform the search based on the query, across every listed session when session_ids is given
+        if "session_ids" in req_body:
+            query = MultiSessionSearchQuery(**req_body)
+            results = await asyncio.to_thread(semantic_search.search_sessions, query.query, query.session_ids, query.limit,
+                                              query.base_similarity)
+        else:
+            query = SearchQuery(**req_body)
+            results = await semantic_search.search_text_async(query.query, query.session_id, query.limit, query.base_similarity)
         
         if not results:
             response_model = Response(
@@ -0,0 +1,30 @@
+import azure.functions as func
+from app.services.semantic_search import SemanticSearch
+from app.models.models import Response
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        session_id = req.route_params.get("session_id")
+        logging.info(f'deleting session {session_id}')
+
+        deleted = SemanticSearch().delete_session(session_id)
+
+        response_model = Response(
+            status="success",
+            message="Session deleted successfully",
+            data={"session_id": session_id, "chunks_deleted": deleted}
+        )
+        return func.HttpResponse(response_model.to_json(), status_code=200, mimetype='application/json')
+
+    except Exception as e:
+        logging.error(f"Error deleting session: {str(e)}")
+        response_model = Response(
+            status="error",
+            message="Session deletion failed",
+            error=str(e)
+        )
+        return func.HttpResponse(response_model.to_json(), status_code=500, mimetype='application/json')
@@ -0,0 +1,190 @@
+import asyncio
+import re
+import threading
+import uuid
+from azure.cosmos.exceptions import (CosmosHttpResponseError, CosmosResourceNotFoundError, CosmosResourceExistsError,
+                                     CosmosAccessConditionFailedError, CosmosBatchOperationError)
+
+
+class FakePaged:
+    """Mimics ItemPaged: iterable, and pageable through by_page with integer continuation tokens."""
+
+    def __init__(self, items: list, page_size: int):
+        self.items = items
+        self.page_size = page_size or len(items) or 1
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def by_page(self, continuation_token=None):
+        start = int(continuation_token or 0)
+        for offset in range(start, len(self.items), self.page_size):
+            yield iter(self.items[offset:offset + self.page_size])
+
+
+class FakeContainer:
+    """In-memory stand-in for a Cosmos DB container partitioned on /session_id."""
+
+    def __init__(self, throttle_count: int = 0):
+        self.items = {}
+        self.throttle_count = throttle_count
+        self.batch_calls = 0
+        self.upsert_calls = 0
+        self.max_concurrent_calls = 0
+        self._active_calls = 0
+        self._lock = threading.Lock()
+
+    def _enter(self):
+        with self._lock:
+            if self.throttle_count > 0:
+                self.throttle_count -= 1
+                raise CosmosHttpResponseError(status_code=429, message="Request rate is large")
+            self._active_calls += 1
+            self.max_concurrent_calls = max(self.max_concurrent_calls, self._active_calls)
+
+    def _exit(self):
+        with self._lock:
+            self._active_calls -= 1
+
+    def upsert_item(self, item, **kwargs):
+        self._enter()
+        try:
+            return self._upsert(item)
+        finally:
+            self._exit()
+
+    def _upsert(self, item):
+        self.upsert_calls += 1
+        self.items[(item['session_id'], item['id'])] = dict(item, _etag=uuid.uuid4().hex)
+        return item
+
+    def read_item(self, item, partition_key, **kwargs):
+        stored = self.items.get((partition_key, item))
+        if stored is None:
+            raise CosmosResourceNotFoundError(status_code=404, message="Entity with the specified id does not exist")
+        return dict(stored)
+
+    def create_item(self, body, **kwargs):
+        if (body['session_id'], body['id']) in self.items:
+            raise CosmosResourceExistsError(status_code=409, message="Entity with the specified id already exists")
+        return self._upsert(body)
+
+    def replace_item(self, item, body, etag=None, match_condition=None, **kwargs):
+        stored = self.read_item(item, body['session_id'])
+        if etag is not None and stored['_etag'] != etag:
+            raise CosmosAccessConditionFailedError(status_code=412, message="Precondition failed")
+        return self._upsert(body)
+
+    def execute_item_batch(self, batch_operations, partition_key, **kwargs):
+        self._enter()
+        try:
+            return self._execute_batch(batch_operations, partition_key)
+        finally:
+            self._exit()
+
+    def _execute_batch(self, batch_operations, partition_key):
+        self.batch_calls += 1
+        if len(batch_operations) > 100:
+            raise CosmosHttpResponseError(status_code=400, message="Batch request has more operations than allowed")
+        for i, (operation, args, *_) in enumerate(batch_operations):
+            if operation == "delete" and (partition_key, args[0]) not in self.items:
+                # Like the service, a failed operation fails the whole batch before anything is applied
+                responses = [{"statusCode": 404 if j == i else 424} for j in range(len(batch_operations))]
+                raise CosmosBatchOperationError(error_index=i, headers={}, status_code=404,
+                                                message="Resource Not Found", operation_responses=responses)
+        results = []
+        for operation, args, *_ in batch_operations:
+            if operation == "upsert":
+                item = args[0]
+                assert item['session_id'] == partition_key
+                self.items[(partition_key, item['id'])] = dict(item, _etag=uuid.uuid4().hex)
+                results.append(item)
+            elif operation == "delete":
+                del self.items[(partition_key, args[0])]
+                results.append({})
+            else:
+                raise ValueError(f"Unsupported batch operation {operation}")
+        return results
+
+    def query_items(self, query, parameters=None, partition_key=None, max_item_count=None, **kwargs):
+        """Supports `SELECT <c.fields | * | VALUE COUNT(1)> FROM c WHERE c.session_id = @session_id [AND NOT IS_DEFINED(c.<field>)]
+        [AND c.document_id = @document_id]` against one partition."""
+        self.query_calls = getattr(self, 'query_calls', 0) + 1
+        values = {parameter['name']: parameter['value'] for parameter in parameters or []}
+        session_id = values.get('@session_id', partition_key)
+        projection = re.match(r"SELECT (.+?) FROM c", query).group(1).strip()
+        fields = None if projection in ("*", "VALUE COUNT(1)") else [field.strip()[2:] for field in projection.split(",")]
+        undefined = re.findall(r"NOT IS_DEFINED\(c\.(\w+)\)", query)
+
+        items = []
+        for item in self.session_items(session_id):
+            if '@document_id' in values and item.get('document_id') != values['@document_id']:
+                continue
+            if any(field in item for field in undefined):
+                continue
+            items.append(dict(item) if fields is None else {field: item[field] for field in fields if field in item})
+        if projection == "VALUE COUNT(1)":
+            return FakePaged([len(items)], max_item_count)
+        return FakePaged(items, max_item_count)
+
+    def read_all_items(self, max_item_count=None, **kwargs):
+        return list(self.items.values())[:max_item_count]
+
+    def session_items(self, session_id: str):
+        return [item for (partition, _), item in self.items.items() if partition == session_id]
+
+
+class FakeAsyncPaged:
+    """Mimics AsyncItemPaged: by_page returns an async iterator of async page iterators."""
+
+    def __init__(self, paged: FakePaged):
+        self.paged = paged
+
+    async def _page(self, items):
+        for item in items:
+            yield item
+
+    async def by_page(self, continuation_token=None):
+        for page in self.paged.by_page(continuation_token):
+            yield self._page(list(page))
+
+    def __aiter__(self):
+        return self._page(list(self.paged))
+
+
+class FakeAsyncContainer:
+    """Coroutine front for FakeContainer, yielding to the event loop inside each call so writes overlap."""
+
+    def __init__(self, container: FakeContainer):
+        self.container = container
+
+    async def _call(self, operation, *args):
+        self.container._enter()
+        try:
+            # Yield while holding the call slot, as a network round trip would, so concurrent calls overlap
+            await asyncio.sleep(0)
+            return operation(*args)
+        finally:
+            self.container._exit()
+
+    async def upsert_item(self, item, **kwargs):
+        return await self._call(self.container._upsert, item)
+
+    async def execute_item_batch(self, batch_operations, partition_key, **kwargs):
+        return await self._call(self.container._execute_batch, batch_operations, partition_key)
+
+    async def read_item(self, item, partition_key, **kwargs):
+        return await self._call(self.container.read_item, item, partition_key)
+
+    async def create_item(self, body, **kwargs):
+        return await self._call(self.container.create_item, body)
+
+    async def replace_item(self, item, body, etag=None, match_condition=None, **kwargs):
+        return await self._call(lambda: self.container.replace_item(item, body, etag, match_condition))
+
+    def query_items(self, *args, **kwargs):
+        return FakeAsyncPaged(self.container.query_items(*args, **kwargs))
+
+    async def read_all_items(self, max_item_count=None, **kwargs):
+        for item in self.container.read_all_items(max_item_count):
+            yield item
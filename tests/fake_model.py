@@ -0,0 +1,38 @@
+import re
+import numpy as np
+
+
+class FakeTokenizer:
+    """Fast-tokenizer stand-in that splits text into words and punctuation marks with character offsets."""
+
+    pattern = re.compile(r"\w+|[^\w\s]")
+
+    def _encode(self, text, return_offsets_mapping):
+        matches = list(self.pattern.finditer(text))
+        encoded = {"input_ids": list(range(len(matches)))}
+        if return_offsets_mapping:
+            encoded["offset_mapping"] = [match.span() for match in matches]
+        return encoded
+
+    def __call__(self, texts, add_special_tokens=True, return_offsets_mapping=False, **kwargs):
+        if isinstance(texts, str):
+            return self._encode(texts, return_offsets_mapping)
+        return {"input_ids": [self._encode(text, False)["input_ids"] for text in texts]}
+
+
+class FakeModel:
+    """Deterministic stand-in for SentenceTransformer that embeds a text as [word count, first char]."""
+
+    def __init__(self, max_seq_length=256):
+        self.tokenizer = FakeTokenizer()
+        self.max_seq_length = max_seq_length
+        self.batches = []
+
+    def get_sentence_embedding_dimension(self):
+        return 2
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True):
+        if isinstance(texts, str):
+            return np.array([len(texts.split()), ord(texts[0])], dtype=np.float32)
+        self.batches.append(list(texts))
+        return np.array([[len(text.split()), ord(text[0])] for text in texts], dtype=np.float32)
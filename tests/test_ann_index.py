@@ -0,0 +1,163 @@
+from app.services.ann_index import IVFIndex, ANNIndexStore
+from app.services.similarity import normalize_rows, top_k
+import multiprocessing
+import numpy as np
+
+rng = np.random.default_rng(42)
+cluster_centers = rng.normal(size=(20, 16))
+sample_embeddings = normalize_rows(cluster_centers[rng.integers(0, 20, 2000)] + rng.normal(scale=0.3, size=(2000, 16)))
+sample_chunks = [f"chunk {i}" for i in range(2000)]
+
+
+def brute_force(query, limit):
+    return [sample_chunks[i] for i, _ in top_k(sample_embeddings @ normalize_rows(query)[0], limit)]
+
+
+def test_full_probe_matches_brute_force():
+
+    # Arrange
+    index = IVFIndex.train(sample_embeddings, n_lists=16)
+    index.add(sample_chunks, sample_embeddings)
+    query = sample_embeddings[7]
+
+    # Act
+    results = index.search(query, limit=10, nprobe=16)
+
+    # Assert
+    assert [chunk for chunk, _ in results] == brute_force(query, 10)
+
+def test_partial_probe_recall():
+
+    # Arrange
+    index = IVFIndex.train(sample_embeddings, n_lists=32, nprobe=8)
+    index.add(sample_chunks, sample_embeddings)
+    queries = sample_embeddings[:50]
+
+    # Act
+    hits = 0
+    for query in queries:
+        found = {chunk for chunk, _ in index.search(query, limit=10)}
+        hits += len(found & set(brute_force(query, 10)))
+
+    # Assert
+    assert hits / (len(queries) * 10) >= 0.9
+
+def test_add_skips_indexed_chunks():
+
+    # Arrange
+    index = IVFIndex.train(sample_embeddings[:100], n_lists=4)
+    index.add(sample_chunks[:100], sample_embeddings[:100])
+
+    # Act
+    added = index.add(sample_chunks[50:150], sample_embeddings[50:150])
+
+    # Assert
+    assert added == 50
+    assert len(index) == 150
+
+def test_bytes_round_trip():
+
+    # Arrange
+    index = IVFIndex.train(sample_embeddings, n_lists=16, nprobe=4)
+    index.add(sample_chunks, sample_embeddings)
+    query = sample_embeddings[3]
+
+    # Act
+    restored = IVFIndex.from_bytes(index.to_bytes())
+
+    # Assert
+    assert len(restored) == len(index)
+    assert restored.nprobe == 4
+    assert restored.search(query, limit=5) == index.search(query, limit=5)
+
+def test_store_builds_persists_and_loads(tmp_path):
+
+    # Arrange
+    store = ANNIndexStore(str(tmp_path), min_chunks=1000, nprobe=4)
+
+    # Act
+    small = store.build("small", sample_chunks[:10], sample_embeddings[:10])
+    store.build("large", sample_chunks, sample_embeddings)
+    reloaded = ANNIndexStore(str(tmp_path), min_chunks=1000, nprobe=4).get("large")
+
+    # Assert
+    assert small is None
+    assert store.get("small") is None
+    assert len(reloaded) == 2000
+
+def test_store_records_and_persists_watermark(tmp_path):
+
+    # Arrange
+    store = ANNIndexStore(str(tmp_path), min_chunks=100, nprobe=4, check_seconds=60)
+    store.build("session", sample_chunks[:200], sample_embeddings[:200])
+    fresh = store.needs_check("session")
+
+    # Act
+    store.add("session", sample_chunks[:1], sample_embeddings[:1], watermark=201)
+    other_worker = ANNIndexStore(str(tmp_path), min_chunks=100, nprobe=4, check_seconds=60)
+    reloaded = other_worker.get("session")
+
+    # Assert
+    assert fresh is False
+    assert reloaded.watermark == 201
+    assert other_worker.needs_check("session") is True
+
+def test_remove_keeps_texts_with_remaining_copies():
+
+    # Arrange
+    index = IVFIndex.train(sample_embeddings[:100], n_lists=4)
+    index.add(sample_chunks[:100], sample_embeddings[:100])
+    index.add(sample_chunks[:1], sample_embeddings[:1])
+
+    # Act
+    dropped = index.remove(sample_chunks[:10])
+    restored = IVFIndex.from_bytes(index.to_bytes())
+    restored.remove(sample_chunks[:1])
+
+    # Assert
+    assert dropped == 9
+    assert len(index) == 91
+    assert sample_chunks[0] in index.chunks
+    assert index.search(sample_embeddings[5], limit=1, nprobe=4)[0][0] != sample_chunks[5]
+    assert len(restored) == 90
+
+def test_store_picks_up_changes_saved_by_another_worker(tmp_path):
+
+    # Arrange
+    worker = ANNIndexStore(str(tmp_path), min_chunks=100, nprobe=4)
+    other_worker = ANNIndexStore(str(tmp_path), min_chunks=100, nprobe=4)
+    worker.build("session", sample_chunks[:200], sample_embeddings[:200])
+    assert len(other_worker.get("session")) == 200
+
+    # Act
+    worker.add("session", sample_chunks[200:300], sample_embeddings[200:300])
+    after_add = len(other_worker.get("session"))
+    worker.drop("session")
+    after_drop = other_worker.get("session")
+
+    # Assert
+    assert after_add == 300
+    assert after_drop is None
+
+
+def _add_chunks_one_at_a_time(directory: str, start: int):
+    store = ANNIndexStore(directory, min_chunks=100, nprobe=4)
+    for i in range(start, start + 20):
+        store.add("session", sample_chunks[i:i + 1], sample_embeddings[i:i + 1])
+
+def test_concurrent_processes_do_not_lose_additions(tmp_path):
+
+    # Arrange
+    ANNIndexStore(str(tmp_path), min_chunks=100, nprobe=4).build("session", sample_chunks[:200], sample_embeddings[:200])
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_add_chunks_one_at_a_time, args=(str(tmp_path), start)) for start in (200, 300)]
+
+    # Act
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    index = ANNIndexStore(str(tmp_path), min_chunks=100, nprobe=4).get("session")
+
+    # Assert
+    assert set(index.chunks) == set(sample_chunks[:220]) | set(sample_chunks[300:320])
@@ -1,11 +1,17 @@
 import pytest
+import asyncio
 import json
+from pathlib import Path
 import azure.functions as func
 from unittest.mock import patch, MagicMock
 from search_func import main as search_main
 from text_func import main as text_main
 from healthcheck_func import main as healthcheck_main
 from pdf2text_func import main as pdf2text_main
+from ingest_func import main as ingest_main
+from job_status_func import main as job_status_main
+from documents_func import main as documents_main
+from session_func import main as session_main
 
 @pytest.fixture
 def mock_req():
@@ -74,12 +80,31 @@ def test_pdf2text_processing_error(mock_remove, mock_extract_text, mock_req):
     assert body["message"] == "PDF processing failed"
     assert body["error"] == "Failed to process PDF"
 
-# Test for file deletion error
+# Test for parsing the upload in memory without a temporary file
+@patch('app.services.pdf_utils.PDFUtils.extract_text_from_pdf', return_value=mock_extracted_text)
+@patch('os.remove')
+def test_pdf2text_in_memory(mock_remove, mock_extract_text, mock_req):
+    # Arrange
+    file_data = {'file': create_mock_pdf_file()}
+    mock_req.files = file_data
+
+    # Act
+    response = pdf2text_main(mock_req)
+
+    # Assert
+    assert response.status_code == 200
+    mock_extract_text.assert_called_once_with(mock_pdf_content)
+    mock_remove.assert_not_called()
+
+# Test for file deletion error when a large upload is spooled to disk
+@patch('pdf2text_func.MAX_IN_MEMORY_BYTES', 8)
 @patch('os.remove', side_effect=Exception("Failed to delete file"))
 @patch('app.services.pdf_utils.PDFUtils.extract_text_from_pdf', return_value=mock_extracted_text)
 def test_pdf2text_file_deletion_error(mock_extract_text, mock_remove, mock_req):
     # Arrange
-    file_data = {'file': create_mock_pdf_file()}
+    mock_file = create_mock_pdf_file()
+    mock_file.read.side_effect = [mock_pdf_content[:9], mock_pdf_content[9:], b""]
+    file_data = {'file': mock_file}
     mock_req.files = file_data
 
     # Act
@@ -92,6 +117,42 @@ def test_pdf2text_file_deletion_error(mock_extract_text, mock_remove, mock_req):
     assert body["message"] == "Text extracted successfully"
     assert body["data"]["extracted_text"] == mock_extracted_text
     mock_remove.assert_called_once()
+    spooled_path = Path(mock_extract_text.call_args[0][0])
+    assert spooled_path.read_bytes() == mock_pdf_content
+    spooled_path.unlink()
+
+# Test for ingesting a pdf successfully
+def test_ingest_success(mock_req):
+    # Arrange
+    mock_req.files = {'file': create_mock_pdf_file()}
+    mock_req.form = {"session_id": "1234", "chunk_size": "50"}
+    timings = {"extract": 0.1, "chunk": 0.01, "embed": 0.5, "store": 0.2, "total": 0.6}
+
+    # Act
+    with patch("app.services.semantic_search.SemanticSearch.ingest_pdf", return_value=(12, timings)) as mock_ingest:
+        response = ingest_main(mock_req)
+
+    # Assert
+    assert response.status_code == 200
+    body = json.loads(response.get_body().decode())
+    assert body["status"] == "success"
+    assert body["data"]["chunks_stored"] == 12
+    assert body["data"]["timings"] == timings
+    mock_ingest.assert_called_once_with(mock_pdf_content, "1234", 50)
+
+# Test for ingesting without a session id
+def test_ingest_invalid_input(mock_req):
+    # Arrange
+    mock_req.files = {'file': create_mock_pdf_file()}
+    mock_req.form = {}
+
+    # Act
+    response = ingest_main(mock_req)
+
+    # Assert
+    assert response.status_code == 400
+    body = json.loads(response.get_body().decode())
+    assert body["message"] == "Invalid input"
 
 # Test for adding text successfully
 def test_add_text_success(mock_req):
@@ -134,6 +195,131 @@ def test_add_text_failure(mock_req):
     assert body["status"] == "error"
     assert body["message"] == "Error storing text"
 
+# Test for queueing text for asynchronous ingestion
+def test_add_text_async(mock_req):
+    # Arrange
+    mock_req.get_json.return_value = {
+        "text": "This is a sample text to be chunked.",
+        "session_id": "1234",
+        "mode": "async"
+    }
+    mock_req.route_params = {"route": "text"}
+
+    # Act
+    with patch("text_func.ingest_workers.submit", return_value="job-1") as mock_submit:
+        response = text_main(mock_req)
+
+    # Assert
+    assert response.status_code == 202
+    body = json.loads(response.get_body().decode())
+    assert body["data"]["job_id"] == "job-1"
+    mock_submit.assert_called_once_with("1234", "This is a sample text to be chunked.", 100, "words", 0)
+
+# Test for polling an ingest job
+def test_job_status(mock_req):
+    # Arrange
+    mock_req.route_params = {"job_id": "job-1"}
+    job = {"id": "job-1", "status": "running", "chunks_total": 10, "chunks_embedded": 6, "chunks_stored": 3}
+
+    # Act
+    with patch("job_status_func.ingest_queue.get", return_value=job):
+        response = job_status_main(mock_req)
+
+    # Assert
+    assert response.status_code == 200
+    body = json.loads(response.get_body().decode())
+    assert body["data"]["chunks_stored"] == 3
+
+# Test that loading the job endpoints starts the ingest workers without waiting for a submit
+def test_job_endpoints_start_ingest_workers():
+    # Arrange
+    from app.services.ingest_jobs import ingest_workers
+
+    # Act
+    running = [thread.is_alive() for thread in ingest_workers._threads]
+
+    # Assert
+    assert running and all(running)
+
+# Test for polling an unknown ingest job
+def test_job_status_not_found(mock_req):
+    # Arrange
+    mock_req.route_params = {"job_id": "missing"}
+
+    # Act
+    with patch("job_status_func.ingest_queue.get", return_value=None):
+        response = job_status_main(mock_req)
+
+    # Assert
+    assert response.status_code == 404
+
+# Test for replacing a document's content
+def test_replace_document(mock_req):
+    # Arrange
+    mock_req.method = "PUT"
+    mock_req.route_params = {"session_id": "1234", "document_id": "doc"}
+    mock_req.get_json.return_value = {"text": "Updated document text.", "chunk_size": 50}
+    result = {"document_id": "doc", "version": 2, "chunks_added": 1, "chunks_deleted": 1, "chunks_unchanged": 3}
+
+    # Act
+    with patch("app.services.semantic_search.SemanticSearch.replace_document", return_value=result) as mock_replace:
+        response = documents_main(mock_req)
+
+    # Assert
+    assert response.status_code == 200
+    body = json.loads(response.get_body().decode())
+    assert body["data"]["version"] == 2
+    mock_replace.assert_called_once_with("Updated document text.", "1234", "doc", 50, "words", 0)
+
+# Test for appending to a document
+def test_append_document(mock_req):
+    # Arrange
+    mock_req.method = "POST"
+    mock_req.route_params = {"session_id": "1234", "document_id": "doc"}
+    mock_req.get_json.return_value = {"text": "A new paragraph."}
+
+    # Act
+    with patch("app.services.semantic_search.SemanticSearch.append_text",
+               return_value={"document_id": "doc", "version": 3, "chunks_added": 1, "chunks_skipped": 0}):
+        response = documents_main(mock_req)
+
+    # Assert
+    assert response.status_code == 200
+    body = json.loads(response.get_body().decode())
+    assert body["message"] == "Text appended successfully"
+
+# Test for deleting a document
+def test_delete_document(mock_req):
+    # Arrange
+    mock_req.method = "DELETE"
+    mock_req.route_params = {"session_id": "1234", "document_id": "doc"}
+
+    # Act
+    with patch("app.services.semantic_search.SemanticSearch.delete_document",
+               return_value={"document_id": "doc", "version": 4, "chunks_deleted": 7}) as mock_delete:
+        response = documents_main(mock_req)
+
+    # Assert
+    assert response.status_code == 200
+    body = json.loads(response.get_body().decode())
+    assert (body["data"]["version"], body["data"]["chunks_deleted"]) == (4, 7)
+    mock_delete.assert_called_once_with("1234", "doc")
+
+# Test for deleting a whole session
+def test_delete_session(mock_req):
+    # Arrange
+    mock_req.method = "DELETE"
+    mock_req.route_params = {"session_id": "1234"}
+
+    # Act
+    with patch("app.services.semantic_search.SemanticSearch.delete_session", return_value=42):
+        response = session_main(mock_req)
+
+    # Assert
+    assert response.status_code == 200
+    body = json.loads(response.get_body().decode())
+    assert body["data"]["chunks_deleted"] == 42
+
 # Test for successful search
 def test_search_text_success(mock_req):
     # Arrange
@@ -145,8 +331,8 @@ def test_search_text_success(mock_req):
     mock_req.route_params = {"route": "search"}
 
     # Act
-    with patch("app.services.semantic_search.SemanticSearch.search_text", return_value=["chunk1", "chunk2"]):
-        response = search_main(mock_req)
+    with patch("app.services.semantic_search.SemanticSearch.search_text_async", return_value=["chunk1", "chunk2"]):
+        response = asyncio.run(search_main(mock_req))
 
     # Assert
     assert response.status_code == 200
@@ -166,8 +352,8 @@ def test_search_text_no_results(mock_req):
     mock_req.route_params = {"route": "search"}
 
     # Act
-    with patch("app.services.semantic_search.SemanticSearch.search_text", return_value=None):
-        response = search_main(mock_req)
+    with patch("app.services.semantic_search.SemanticSearch.search_text_async", return_value=None):
+        response = asyncio.run(search_main(mock_req))
 
     # Assert
     assert response.status_code == 404
@@ -176,14 +362,57 @@ def test_search_text_no_results(mock_req):
     assert body["message"] == "No results found"
     assert body["error"] == "No results found"
 
+# Test for search across several sessions
+def test_search_sessions_success(mock_req):
+    # Arrange
+    mock_req.get_json.return_value = {
+        "query": "Sample query",
+        "session_ids": ["1234", "5678"],
+        "limit": 2
+    }
+    mock_req.route_params = {"route": "search"}
+
+    # Act
+    with patch("app.services.semantic_search.SemanticSearch.search_sessions",
+               return_value=[("chunk1", 0.9, "5678"), ("chunk2", 0.8, "1234")]) as mock_search:
+        response = asyncio.run(search_main(mock_req))
+
+    # Assert
+    assert response.status_code == 200
+    body = json.loads(response.get_body().decode())
+    mock_search.assert_called_once_with("Sample query", ["1234", "5678"], 2, 0.5)
+    assert [hit[2] for hit in body["data"]["top_results"]] == ["5678", "1234"]
+
+# Test for batch search keeping each query's limit
+def test_search_batch_success(mock_req):
+    # Arrange
+    mock_req.get_json.return_value = {
+        "session_id": "1234",
+        "queries": [{"query": "first", "limit": 1}, {"query": "second", "base_similarity": 0.2}]
+    }
+    mock_req.route_params = {"route": "search"}
+
+    # Act
+    with patch("app.services.semantic_search.SemanticSearch.search_batch",
+               return_value=[[["chunk1", 0.9]], [["chunk2", 0.4], ["chunk1", 0.3]]]) as mock_search:
+        response = asyncio.run(search_main(mock_req))
+
+    # Assert
+    assert response.status_code == 200
+    body = json.loads(response.get_body().decode())
+    mock_search.assert_called_once_with([("first", 1, 0.5), ("second", 10, 0.2)], "1234")
+    assert [result["query"] for result in body["data"]["results"]] == ["first", "second"]
+    assert body["data"]["results"][0]["limit"] == 1
+    assert len(body["data"]["results"][1]["top_results"]) == 2
+
 # Test for healthcheck route
 def test_healthcheck(mock_req):
     # Arrange
     mock_req.route_params = {"route": "healthcheck"}
 
     # Act
-    with patch("app.services.db_utils.DBUtils.db_health_check", return_value=(False, "Missing environment variables")):
-        response = healthcheck_main(mock_req)
+    with patch("app.services.async_db_utils.AsyncDBUtils.db_health_check", return_value=(False, "Missing environment variables")):
+        response = asyncio.run(healthcheck_main(mock_req))
 
     # Assert
     assert response.status_code == 200
@@ -191,3 +420,20 @@ def test_healthcheck(mock_req):
     assert body["status"] == "error"
     assert body["message"] == "DB Health Check Failed"
     assert body["error"] == "Missing environment variables"
+
+# Test for healthcheck route on the local storage backend
+def test_healthcheck_local_store(mock_req, tmp_path, monkeypatch):
+    # Arrange
+    mock_req.route_params = {"route": "healthcheck"}
+    monkeypatch.setenv("STORAGE_BACKEND", "local")
+    monkeypatch.setenv("LOCAL_STORE_DIR", str(tmp_path))
+
+    # Act
+    with patch("app.services.async_db_utils.AsyncDBUtils.create") as mock_create:
+        response = asyncio.run(healthcheck_main(mock_req))
+
+    # Assert
+    body = json.loads(response.get_body().decode())
+    assert body["status"] == "success"
+    assert body["data"]["is_healthy"] is True
+    mock_create.assert_not_called()
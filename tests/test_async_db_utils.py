@@ -0,0 +1,194 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.services.async_db_utils import AsyncDBUtils, AsyncCosmosClientProvider
+from app.services.db_utils import chunk_id
+from tests.fake_cosmos import FakeAsyncContainer, FakeContainer
+import asyncio
+import numpy as np
+import pytest
+
+sample_session_id = "test_session"
+sample_chunks = [f"This is chunk {i}" for i in range(7)]
+sample_embeddings = np.arange(21, dtype=np.float32).reshape(7, 3)
+
+
+def connect(container: FakeContainer, **settings):
+    async def create():
+        with patch('app.services.async_db_utils.async_cosmos_provider.get',
+                   AsyncMock(return_value=(MagicMock(), MagicMock(), FakeAsyncContainer(container)))):
+            db = await AsyncDBUtils.create()
+        for name, value in settings.items():
+            setattr(db, name, value)
+        return db
+    return create()
+
+
+@pytest.mark.parametrize("bulk, concurrency_setting", [(False, "write_concurrency"), (True, "bulk_concurrency")])
+def test_store_chunk_gathers_writes_under_semaphore(bulk, concurrency_setting):
+
+    # Arrange
+    container = FakeContainer()
+
+    async def store():
+        db = await connect(container, bulk_batch_size=2, **{concurrency_setting: 2})
+        return await db.store_chunk(sample_session_id, sample_chunks, sample_embeddings, bulk=bulk)
+
+    # Act
+    success = asyncio.run(store())
+
+    # Assert
+    assert success
+    assert container.max_concurrent_calls == 2
+    assert sorted(item['id'] for item in container.session_items(sample_session_id)) == \
+        sorted(chunk_id(sample_session_id, i, chunk) for i, chunk in enumerate(sample_chunks))
+
+
+def test_store_chunk_retries_throttled_writes():
+
+    # Arrange
+    container = FakeContainer(throttle_count=2)
+
+    async def store():
+        db = await connect(container, retry_backoff=0.001)
+        return await db.store_chunk(sample_session_id, sample_chunks[:3], sample_embeddings[:3])
+
+    # Act
+    success = asyncio.run(store())
+
+    # Assert
+    assert success
+    assert len(container.session_items(sample_session_id)) == 3
+
+
+def test_get_chunks_streams_pages():
+
+    # Arrange
+    container = FakeContainer()
+
+    async def round_trip():
+        db = await connect(container, page_size=3)
+        await db.store_chunk(sample_session_id, sample_chunks, sample_embeddings)
+        pages = [len(page) async for page in db.query_session_pages(sample_session_id)]
+        return pages, await db.get_chunks(sample_session_id)
+
+    # Act
+    pages, (chunks, embeddings) = asyncio.run(round_trip())
+
+    # Assert
+    assert pages == [3, 3, 1]
+    order = np.argsort([chunk for chunk in chunks])
+    assert [chunks[i] for i in order] == sample_chunks
+    assert np.allclose(embeddings[order], sample_embeddings)
+
+
+def test_get_chunks_empty_session():
+
+    # Arrange
+    container = FakeContainer()
+
+    async def read():
+        db = await connect(container)
+        return await db.get_chunks(sample_session_id)
+
+    # Act
+    chunks, embeddings = asyncio.run(read())
+
+    # Assert
+    assert chunks == []
+    assert embeddings.shape == (0, 0)
+
+
+@patch.dict('os.environ', {}, clear=True)
+def test_health_check_reports_missing_settings():
+
+    # Arrange
+    async def check():
+        db = await AsyncDBUtils.create()
+        return await db.db_health_check()
+
+    # Act
+    is_healthy, message = asyncio.run(check())
+
+    # Assert
+    assert not is_healthy
+    assert "COSMOS_URI" in message
+
+
+def test_document_chunks_and_session_delete():
+
+    # Arrange
+    container = FakeContainer()
+
+    async def round_trip():
+        db = await connect(container, bulk_batch_size=2)
+        await db.store_chunk(sample_session_id, sample_chunks[:3], sample_embeddings[:3], ids=["d1", "d2", "d3"],
+                             document_id="doc", document_version=1)
+        await db.store_chunk(sample_session_id, sample_chunks[3:], sample_embeddings[3:])
+        await db.delete_chunks(sample_session_id, ["d1", "gone"])
+        document = await db.get_document_chunks(sample_session_id, "doc")
+        return document, await db.delete_session(sample_session_id)
+
+    # Act
+    document, deleted = asyncio.run(round_trip())
+
+    # Assert
+    assert sorted(item['id'] for item in document) == ["d2", "d3"]
+    assert deleted == 6
+    assert container.session_items(sample_session_id) == []
+
+
+
+def test_document_version_record_is_not_a_chunk():
+
+    # Arrange
+    container = FakeContainer()
+
+    async def round_trip():
+        db = await connect(container)
+        await db.store_chunk(sample_session_id, sample_chunks[:2], sample_embeddings[:2], ids=["d1", "d2"],
+                             document_id="doc", document_version=1)
+        versions = [await db.bump_document_version(sample_session_id, "doc") for _ in range(2)]
+        versions.append(await db.get_document_version(sample_session_id, "doc"))
+        chunks, _ = await db.get_chunks(sample_session_id)
+        count = await db.count_chunks(sample_session_id)
+        return versions, chunks, count, await db.delete_session(sample_session_id)
+
+    # Act
+    versions, chunks, count, deleted = asyncio.run(round_trip())
+
+    # Assert
+    assert versions == [1, 2, 2]
+    assert chunks == sample_chunks[:2]
+    assert count == 2
+    assert deleted == 2
+    assert container.session_items(sample_session_id) == []
+
+
+def test_invalidated_client_is_closed_only_after_grace_period():
+
+    # Arrange
+    provider = AsyncCosmosClientProvider(close_grace_seconds=60)
+    clients = []
+
+    async def connect_client(config):
+        clients.append(AsyncMock())
+        return clients[-1], MagicMock(), MagicMock()
+
+    provider._connect = connect_client
+
+    async def round_trip():
+        await provider.get()
+        await provider.invalidate()
+        await provider.get()
+        closed_during_grace = clients[0].close.await_count
+        provider.close_grace_seconds = 0
+        await provider.get()
+        return closed_during_grace
+
+    # Act
+    closed_during_grace = asyncio.run(round_trip())
+
+    # Assert
+    assert len(clients) == 2
+    assert closed_during_grace == 0
+    assert clients[0].close.await_count == 1
+    clients[1].close.assert_not_awaited()
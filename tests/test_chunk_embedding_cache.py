@@ -0,0 +1,60 @@
+from unittest.mock import patch
+from app.services.chunk_embedding_cache import EmbeddingCache
+from app.services.vectorizer import Vectorizer
+from tests.fake_model import FakeModel
+import numpy as np
+
+
+def test_lru_eviction():
+
+    # Arrange
+    cache = EmbeddingCache(max_entries=2)
+    cache.put_many("model", ["a", "b"], np.eye(2))
+    cache.get_many("model", ["a"])
+
+    # Act
+    cache.put_many("model", ["c"], np.ones((1, 2)))
+    found = cache.get_many("model", ["a", "b", "c"])
+
+    # Assert
+    assert sorted(found) == [0, 2]
+
+def test_keys_include_model_and_normalize_whitespace():
+
+    # Arrange
+    cache = EmbeddingCache(max_entries=10)
+    cache.put_many("model-a", ["some  text\n"], np.ones((1, 2)))
+
+    # Act / Assert
+    assert list(cache.get_many("model-a", ["some text"])) == [0]
+    assert cache.get_many("model-b", ["some text"]) == {}
+
+def test_sqlite_layer_survives_restart(tmp_path):
+
+    # Arrange
+    path = str(tmp_path / "embeddings.sqlite")
+    EmbeddingCache(max_entries=0, sqlite_path=path).put_many("model", ["a", "b"], np.array([[1.0, 2.0], [3.0, 4.0]]))
+
+    # Act
+    found = EmbeddingCache(max_entries=10, sqlite_path=path).get_many("model", ["b", "x", "a"])
+
+    # Assert
+    assert sorted(found) == [0, 2]
+    assert np.array_equal(found[0], [3.0, 4.0])
+
+@patch('app.services.vectorizer.model_registry')
+def test_encode_batch_only_encodes_misses(mock_registry):
+
+    # Arrange
+    fake_model = FakeModel()
+    mock_registry.get.return_value = fake_model
+    vectorizer = Vectorizer(batch_size=8, cache=EmbeddingCache(max_entries=100))
+    first = vectorizer.encode_batch(["a b", "c", "d e f"])
+
+    # Act
+    second = vectorizer.encode_batch(["a b", "new chunk", "d e f", "c"])
+
+    # Assert
+    assert fake_model.batches == [["c", "a b", "d e f"], ["new chunk"]]
+    assert np.array_equal(second[[0, 2, 3]], first[[0, 2, 1]])
+    assert second[1].tolist() == [2, ord("n")]
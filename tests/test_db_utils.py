@@ -1,12 +1,25 @@
 from unittest import mock
 from unittest.mock import MagicMock, patch
-from app.services.db_utils import DBUtils
+from azure.cosmos import PartitionKey
+from azure.cosmos.exceptions import CosmosHttpResponseError
+from azure.core.exceptions import ServiceRequestError
+from app.services.db_utils import DBUtils, chunk_id, cosmos_provider
+from app.services.embedding_codec import encode_embedding
+from tests.fake_cosmos import FakeContainer
 import numpy as np
+import pytest
 
 sample_session_id = "test_session"
 sample_chunks = ["This is chunk 1", "This is chunk 2"]
 sample_embeddings = [np.array([0.1, 0.2, 0.3]), np.array([0.4, 0.5, 0.6])]
 
+
+@pytest.fixture(autouse=True)
+def reset_cosmos_provider():
+    cosmos_provider.invalidate()
+    yield
+    cosmos_provider.invalidate()
+
 @patch.dict('os.environ', {
     'COSMOS_URI': 'mock_uri',
     'COSMOS_KEY': 'mock_key',
@@ -46,7 +59,7 @@ def test_get_chunks(mock_cosmos_client):
         {'chunk': "This is chunk 1", 'embedding': [0.1, 0.2, 0.3]},
         {'chunk': "This is chunk 2", 'embedding': [0.4, 0.5, 0.6]}
     ]
-    mock_container.query_items.return_value = mock_query_results
+    mock_container.query_items.return_value.by_page.return_value = [iter(mock_query_results)]
     
     mock_cosmos_client.return_value.get_database_client.return_value = mock_db
     mock_db.get_container_client.return_value = mock_container
@@ -56,7 +69,286 @@ def test_get_chunks(mock_cosmos_client):
     chunks, embeddings = db_utils.get_chunks(sample_session_id)
 
     # Assert
-    expected_query = f'SELECT * FROM c WHERE c.session_id = "{sample_session_id}"'
-    mock_container.query_items.assert_called_once_with(query=expected_query, enable_cross_partition_query=True)
+    _, kwargs = mock_container.query_items.call_args
+    assert kwargs['query'].startswith("SELECT c.chunk, ")
+    assert kwargs['query'].endswith(" FROM c WHERE c.session_id = @session_id AND NOT IS_DEFINED(c.record_type)")
+    assert kwargs['parameters'] == [{"name": "@session_id", "value": sample_session_id}]
+    assert kwargs['partition_key'] == sample_session_id
+    assert 'enable_cross_partition_query' not in kwargs
+    assert chunks == ["This is chunk 1", "This is chunk 2"]
+    assert embeddings.dtype == np.float32
+    assert np.allclose(embeddings, [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]])
+
+
+@patch.dict('os.environ', {
+    'COSMOS_URI': 'mock_uri',
+    'COSMOS_KEY': 'mock_key',
+    'COSMOS_DATABASE': 'mock_db',
+    'COSMOS_CONTAINER': 'mock_container',
+    'COSMOS_BULK_CONCURRENCY': '2',
+    'COSMOS_RETRY_BACKOFF': '0'
+})
+@patch('app.services.db_utils.CosmosClient')
+def test_store_chunk_bulk(mock_cosmos_client):
+
+    # Arrange
+    container = FakeContainer(throttle_count=2)
+    mock_cosmos_client.return_value.get_database_client.return_value.get_container_client.return_value = container
+    chunks = [f"This is chunk {i}" for i in range(250)]
+    embeddings = np.random.rand(250, 3).astype(np.float32)
+
+    # Act
+    db_utils = DBUtils()
+    db_utils.store_chunk(sample_session_id, chunks, embeddings, bulk=True)
+    db_utils.store_chunk(sample_session_id, chunks, embeddings, bulk=True)
+
+    # Assert
+    stored = container.session_items(sample_session_id)
+    assert len(stored) == 250
+    assert container.batch_calls == 6
+    assert container.upsert_calls == 0
+    assert container.max_concurrent_calls <= 2
+    assert sorted(item['chunk_index'] for item in stored) == list(range(250))
+
+
+@patch.dict('os.environ', {
+    'COSMOS_URI': 'mock_uri',
+    'COSMOS_KEY': 'mock_key',
+    'COSMOS_DATABASE': 'mock_db',
+    'COSMOS_CONTAINER': 'mock_container',
+    'COSMOS_MAX_RETRIES': '1',
+    'COSMOS_RETRY_BACKOFF': '0'
+})
+@patch('app.services.db_utils.CosmosClient')
+def test_store_chunk_gives_up_after_retries(mock_cosmos_client):
+
+    # Arrange
+    container = FakeContainer(throttle_count=5)
+    mock_cosmos_client.return_value.get_database_client.return_value.get_container_client.return_value = container
+
+    # Act / Assert
+    db_utils = DBUtils()
+    with pytest.raises(CosmosHttpResponseError):
+        db_utils.store_chunk(sample_session_id, sample_chunks, sample_embeddings, bulk=True)
+
+
+def test_chunk_id_is_deterministic():
+
+    # Act / Assert
+    assert chunk_id(sample_session_id, 0, "This is chunk 1") == chunk_id(sample_session_id, 0, "This is chunk 1")
+    assert chunk_id(sample_session_id, 0, "This is chunk 1") != chunk_id(sample_session_id, 1, "This is chunk 1")
+    assert chunk_id(sample_session_id, 0, "This is chunk 1") != chunk_id(sample_session_id, 0, "This is chunk 2")
+
+
+@patch.dict('os.environ', {
+    'COSMOS_URI': 'mock_uri',
+    'COSMOS_KEY': 'mock_key',
+    'COSMOS_DATABASE': 'mock_db',
+    'COSMOS_CONTAINER': 'mock_container',
+    'EMBEDDING_STORAGE_ENCODING': 'float16'
+})
+@patch('app.services.db_utils.CosmosClient')
+def test_store_chunk_binary_encoding(mock_cosmos_client):
+
+    # Arrange
+    container = FakeContainer()
+    mock_cosmos_client.return_value.get_database_client.return_value.get_container_client.return_value = container
+
+    # Act
+    db_utils = DBUtils()
+    db_utils.store_chunk(sample_session_id, sample_chunks, sample_embeddings)
+
+    # Assert
+    stored = sorted(container.session_items(sample_session_id), key=lambda item: item['chunk_index'])
+    assert all(item['embedding_encoding'] == 'float16' and 'embedding' not in item for item in stored)
+
+
+@patch.dict('os.environ', {
+    'COSMOS_URI': 'mock_uri',
+    'COSMOS_KEY': 'mock_key',
+    'COSMOS_DATABASE': 'mock_db',
+    'COSMOS_CONTAINER': 'mock_container'
+})
+@patch('app.services.db_utils.CosmosClient')
+def test_get_chunks_mixed_encodings(mock_cosmos_client):
+
+    # Arrange
+    mock_container = MagicMock()
+    binary_item = {'chunk': "This is chunk 2"}
+    binary_item.update(encode_embedding(np.array([0.4, 0.5, 0.6]), 'float32'))
+    mock_container.query_items.return_value.by_page.return_value = [iter([
+        {'chunk': "This is chunk 1", 'embedding': [0.1, 0.2, 0.3]},
+        binary_item
+    ])]
+    mock_cosmos_client.return_value.get_database_client.return_value.get_container_client.return_value = mock_container
+
+    # Act
+    chunks, embeddings = DBUtils().get_chunks(sample_session_id)
+
+    # Assert
     assert chunks == ["This is chunk 1", "This is chunk 2"]
-    assert embeddings == [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]]
+    assert np.allclose(embeddings, [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]])
+
+
+@patch.dict('os.environ', {
+    'COSMOS_URI': 'mock_uri',
+    'COSMOS_KEY': 'mock_key',
+    'COSMOS_DATABASE': 'mock_db',
+    'COSMOS_CONTAINER': 'mock_container',
+    'COSMOS_QUERY_PAGE_SIZE': '16'
+})
+@patch('app.services.db_utils.CosmosClient')
+def test_get_chunks_pages_into_matrix(mock_cosmos_client):
+
+    # Arrange
+    container = FakeContainer()
+    mock_cosmos_client.return_value.get_database_client.return_value.get_container_client.return_value = container
+    chunks = [f"This is chunk {i}" for i in range(100)]
+    embeddings = np.random.rand(100, 3).astype(np.float32)
+    db_utils = DBUtils()
+    db_utils.store_chunk(sample_session_id, chunks, embeddings)
+    db_utils.store_chunk("other_session", sample_chunks, sample_embeddings)
+
+    # Act
+    stored_chunks, stored_embeddings = db_utils.get_chunks(sample_session_id)
+
+    # Assert
+    order = [chunks.index(chunk) for chunk in stored_chunks]
+    assert sorted(order) == list(range(100))
+    assert stored_embeddings.shape == (100, 3)
+    assert np.allclose(stored_embeddings, embeddings[order], atol=1e-6)
+
+
+@patch.dict('os.environ', {
+    'COSMOS_URI': 'mock_uri',
+    'COSMOS_KEY': 'mock_key',
+    'COSMOS_DATABASE': 'mock_db',
+    'COSMOS_CONTAINER': 'mock_container',
+    'COSMOS_BOOTSTRAP_CONTAINER': 'true'
+})
+@patch('app.services.db_utils.CosmosClient')
+def test_bootstrap_container_with_partition_key(mock_cosmos_client):
+
+    # Act
+    DBUtils()
+
+    # Assert
+    mock_db = mock_cosmos_client.return_value.get_database_client.return_value
+    _, kwargs = mock_db.create_container_if_not_exists.call_args
+    assert kwargs['id'] == 'mock_container'
+    assert kwargs['partition_key'] == PartitionKey(path="/session_id")
+
+
+@patch.dict('os.environ', {
+    'COSMOS_URI': 'mock_uri',
+    'COSMOS_KEY': 'mock_key',
+    'COSMOS_DATABASE': 'mock_db',
+    'COSMOS_CONTAINER': 'mock_container'
+})
+@patch('app.services.db_utils.CosmosClient')
+def test_client_shared_across_instances(mock_cosmos_client):
+
+    # Act
+    first = DBUtils()
+    second = DBUtils()
+
+    # Assert
+    mock_cosmos_client.assert_called_once()
+    assert first.container is second.container
+
+
+@patch.dict('os.environ', {
+    'COSMOS_URI': 'mock_uri',
+    'COSMOS_KEY': 'mock_key',
+    'COSMOS_DATABASE': 'mock_db',
+    'COSMOS_CONTAINER': 'mock_container'
+})
+@patch('app.services.db_utils.CosmosClient')
+def test_client_rebuilt_after_connection_error(mock_cosmos_client):
+
+    # Arrange
+    mock_container = MagicMock()
+    mock_container.read_all_items.side_effect = ServiceRequestError("Connection reset")
+    mock_cosmos_client.return_value.get_database_client.return_value.get_container_client.return_value = mock_container
+
+    # Act
+    is_healthy, _ = DBUtils().db_health_check()
+    DBUtils()
+
+    # Assert
+    assert not is_healthy
+    assert mock_cosmos_client.call_count == 2
+
+
+@patch.dict('os.environ', {
+    'COSMOS_URI': 'mock_uri',
+    'COSMOS_KEY': 'mock_key',
+    'COSMOS_DATABASE': 'mock_db',
+    'COSMOS_CONTAINER': 'mock_container'
+})
+@patch('app.services.db_utils.CosmosClient')
+def test_document_chunks_and_deletes(mock_cosmos_client):
+
+    # Arrange
+    container = FakeContainer()
+    mock_cosmos_client.return_value.get_database_client.return_value.get_container_client.return_value = container
+    db_utils = DBUtils()
+    db_utils.store_chunk(sample_session_id, sample_chunks, sample_embeddings)
+    db_utils.store_chunk(sample_session_id, ["doc chunk 1", "doc chunk 2"], sample_embeddings, ids=["d1", "d2"],
+                         document_id="doc", document_version=3)
+
+    # Act
+    document = db_utils.get_document_chunks(sample_session_id, "doc")
+    # "gone" was already deleted, e.g. by a concurrent edit, and must not fail the batch
+    db_utils.delete_chunks(sample_session_id, ["gone", "d1"])
+    remaining = db_utils.get_document_chunks(sample_session_id, "doc")
+    deleted = db_utils.delete_session(sample_session_id)
+
+    # Assert
+    assert sorted((item['id'], item['chunk'], item['document_version']) for item in document) == \
+        [("d1", "doc chunk 1", 3), ("d2", "doc chunk 2", 3)]
+    assert [item['id'] for item in remaining] == ["d2"]
+    assert deleted == 3
+    assert container.session_items(sample_session_id) == []
+
+
+@patch.dict('os.environ', {
+    'COSMOS_URI': 'mock_uri',
+    'COSMOS_KEY': 'mock_key',
+    'COSMOS_DATABASE': 'mock_db',
+    'COSMOS_CONTAINER': 'mock_container'
+})
+@patch('app.services.db_utils.CosmosClient')
+def test_document_version_record(mock_cosmos_client):
+
+    # Arrange
+    container = FakeContainer()
+    mock_cosmos_client.return_value.get_database_client.return_value.get_container_client.return_value = container
+    db_utils = DBUtils()
+    db_utils.store_chunk(sample_session_id, sample_chunks, sample_embeddings, ids=["d1", "d2"], document_id="doc",
+                         document_version=1)
+    replace_item = container.replace_item
+
+    def replace_after_concurrent_bump(item, body, etag=None, match_condition=None, **kwargs):
+        # Another worker writes the same version between this worker's read and its replace, changing the etag
+        container.replace_item = replace_item
+        replace_item(item, body)
+        return replace_item(item, body, etag, match_condition)
+
+    # Act
+    initial = db_utils.get_document_version(sample_session_id, "doc")
+    first = db_utils.bump_document_version(sample_session_id, "doc")
+    container.replace_item = replace_after_concurrent_bump
+    contended = db_utils.bump_document_version(sample_session_id, "doc")
+    chunks, _ = db_utils.get_chunks(sample_session_id)
+    count = db_utils.count_chunks(sample_session_id)
+    document = db_utils.get_document_chunks(sample_session_id, "doc")
+    deleted = db_utils.delete_session(sample_session_id)
+
+    # Assert
+    assert (initial, first, contended) == (0, 1, 3)
+    assert sorted(chunks) == sorted(sample_chunks)
+    assert count == 2
+    assert sorted(item['id'] for item in document) == ["d1", "d2"]
+    assert deleted == 2
+    assert container.session_items(sample_session_id) == []
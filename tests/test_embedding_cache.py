@@ -0,0 +1,112 @@
+from unittest.mock import patch
+from app.services.embedding_cache import SessionCache
+import numpy as np
+
+
+def make_matrix(rows):
+    return np.zeros((rows, 4), dtype=np.float32)
+
+
+def test_get_returns_cached_entry():
+
+    # Arrange
+    cache = SessionCache(max_bytes=10_000, ttl_seconds=60)
+    matrix = make_matrix(2)
+    cache.put("session", ["a", "b"], matrix)
+
+    # Act
+    chunks, cached_matrix = cache.get("session")
+
+    # Assert
+    assert chunks == ["a", "b"]
+    assert cached_matrix is matrix
+    assert cache.hits == 1
+
+def test_lru_eviction_by_memory():
+
+    # Arrange
+    cache = SessionCache(max_bytes=70, ttl_seconds=60)
+    cache.put("first", [], make_matrix(2))
+    cache.put("second", [], make_matrix(2))
+    cache.get("first")
+
+    # Act
+    cache.put("third", [], make_matrix(2))
+
+    # Assert
+    assert "first" in cache
+    assert "second" not in cache
+    assert "third" in cache
+    assert cache.current_bytes == 64
+
+def test_oversized_entry_not_cached():
+
+    # Arrange
+    cache = SessionCache(max_bytes=10, ttl_seconds=60)
+
+    # Act
+    cache.put("session", [], make_matrix(2))
+
+    # Assert
+    assert cache.get("session") is None
+    assert cache.current_bytes == 0
+
+@patch('app.services.embedding_cache.time.monotonic')
+def test_ttl_expiry(mock_monotonic):
+
+    # Arrange
+    cache = SessionCache(max_bytes=10_000, ttl_seconds=60)
+    mock_monotonic.return_value = 100.0
+    cache.put("session", [], make_matrix(2))
+
+    # Act
+    mock_monotonic.return_value = 161.0
+    result = cache.get("session")
+
+    # Assert
+    assert result is None
+    assert len(cache) == 0
+
+def test_invalidate():
+
+    # Arrange
+    cache = SessionCache(max_bytes=10_000, ttl_seconds=60)
+    cache.put("session", [], make_matrix(2))
+
+    # Act
+    cache.invalidate("session")
+
+    # Assert
+    assert cache.get("session") is None
+    assert cache.current_bytes == 0
+
+def test_update_applies_changes_without_refetch():
+
+    # Arrange
+    cache = SessionCache(max_bytes=10_000, ttl_seconds=60)
+    cache.put("session", ["a", "b", "a"], np.arange(12, dtype=np.float32).reshape(3, 4))
+
+    # Act
+    cache.update("session", ["c"], np.full((1, 4), 9, dtype=np.float32), remove_chunks=["a"])
+    cache.update("missing", ["c"], np.ones((1, 4), dtype=np.float32))
+    chunks, matrix = cache.get("session")
+
+    # Assert
+    assert chunks == ["b", "a", "c"]
+    assert matrix[:, 0].tolist() == [4, 8, 9]
+    assert "missing" not in cache
+
+def test_put_skips_snapshot_read_before_invalidate():
+
+    # Arrange
+    cache = SessionCache(max_bytes=10_000, ttl_seconds=60)
+    generation = cache.generation("session")
+
+    # Act: a write lands while a search is still loading the old rows
+    cache.invalidate("session")
+    cache.put("session", ["old"], make_matrix(1), generation)
+    cache.put("other", ["new"], make_matrix(1), cache.generation("other"))
+
+    # Assert
+    assert "session" not in cache
+    assert "other" in cache
@@ -0,0 +1,55 @@
+from app.services.embedding_codec import encode_embedding, decode_embedding
+import numpy as np
+import json
+import pytest
+
+sample_embedding = np.linspace(-0.8, 0.9, 384).astype(np.float32)
+
+
+def test_json_encoding_is_legacy_format():
+
+    # Act
+    fields = encode_embedding(sample_embedding)
+
+    # Assert
+    assert list(fields) == ['embedding']
+    assert decode_embedding(fields) == fields['embedding']
+
+@pytest.mark.parametrize("encoding, tolerance", [("float32", 0), ("float16", 1e-3), ("int8", 0.01)])
+def test_binary_round_trip(encoding, tolerance):
+
+    # Act
+    fields = json.loads(json.dumps(encode_embedding(sample_embedding, encoding)))
+    decoded = decode_embedding(fields)
+
+    # Assert
+    assert fields['embedding_encoding'] == encoding
+    assert 'embedding' not in fields
+    assert decoded.dtype == np.float32
+    assert decoded.shape == sample_embedding.shape
+    assert np.allclose(decoded, sample_embedding, atol=tolerance)
+
+def test_binary_encoding_is_smaller_than_json():
+
+    # Act
+    json_size = len(json.dumps(encode_embedding(sample_embedding.astype(np.float64))))
+    float16_size = len(json.dumps(encode_embedding(sample_embedding, "float16")))
+    int8_size = len(json.dumps(encode_embedding(sample_embedding, "int8")))
+
+    # Assert
+    assert float16_size * 4 < json_size
+    assert int8_size < float16_size
+
+def test_constant_vector_int8():
+
+    # Act
+    decoded = decode_embedding(encode_embedding(np.full(8, 0.25, dtype=np.float32), "int8"))
+
+    # Assert
+    assert np.allclose(decoded, 0.25)
+
+def test_unsupported_encoding():
+
+    # Act / Assert
+    with pytest.raises(ValueError):
+        encode_embedding(sample_embedding, "bfloat16")
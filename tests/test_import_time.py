@@ -0,0 +1,17 @@
+from benchmarks.import_time_benchmark import measure_import
+import os
+import pytest
+
+# Generous enough for a cold CI runner, far below the ~10s torch import it guards against
+IMPORT_TIME_BUDGET_SECONDS = float(os.environ.get("IMPORT_TIME_BUDGET_SECONDS", 3.0))
+
+
+@pytest.mark.parametrize("module", ["healthcheck_func", "pdf2text_func", "search_func", "text_func"])
+def test_entry_point_imports_stay_light(module):
+
+    # Act
+    seconds, heavy_modules = measure_import(module)
+
+    # Assert
+    assert heavy_modules == []
+    assert seconds < IMPORT_TIME_BUDGET_SECONDS
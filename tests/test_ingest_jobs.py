@@ -0,0 +1,117 @@
+from unittest.mock import patch
+from app.services.ingest_jobs import IngestJobQueue, IngestWorkerPool, COMPLETED, FAILED, QUEUED, RUNNING
+from app.services.local_store import LocalStore
+from tests.fake_model import FakeModel
+import time
+
+sample_session_id = "test_session"
+
+
+def wait_for(queue, job_id, timeout: float = 10.0):
+    deadline = time.time() + timeout
+    job = queue.get(job_id)
+    while job["status"] in (QUEUED, RUNNING) and time.time() < deadline:
+        time.sleep(0.01)
+        job = queue.get(job_id)
+    return job
+
+
+def test_claim_marks_oldest_jobs_running():
+
+    # Arrange
+    queue = IngestJobQueue()
+    first = queue.enqueue(sample_session_id, "first text", 10)
+    second = queue.enqueue(sample_session_id, "second text", 10)
+
+    # Act
+    claimed = queue.claim(1)
+
+    # Assert
+    assert [job["id"] for job in claimed] == [first]
+    assert claimed[0]["text"] == "first text"
+    assert queue.get(first)["status"] == RUNNING
+    assert queue.get(second)["status"] == QUEUED
+    assert queue.get("unknown") is None
+
+
+@patch.dict('os.environ', {"STORAGE_BACKEND": "local"})
+@patch('app.services.vectorizer.model_registry')
+def test_worker_pool_ingests_in_batches(mock_registry, tmp_path):
+
+    # Arrange
+    mock_registry.get.return_value = FakeModel()
+    queue = IngestJobQueue(str(tmp_path / "jobs.sqlite"))
+    pool = IngestWorkerPool(queue, workers=2, batch_chunks=3, poll_seconds=0.05)
+    text = " ".join(f"word{i}" for i in range(50))
+
+    # Act
+    with patch('app.services.semantic_search.LocalStore', lambda: LocalStore(str(tmp_path / "store"))):
+        job_id = pool.submit(sample_session_id, text, chunk_size=5)
+        job = wait_for(queue, job_id)
+    pool.stop()
+
+    # Assert
+    assert job["status"] == COMPLETED
+    assert (job["chunks_total"], job["chunks_embedded"], job["chunks_stored"]) == (10, 10, 10)
+    chunks, _ = LocalStore(str(tmp_path / "store")).get_chunks(sample_session_id)
+    assert list(chunks) == [" ".join(f"word{i}" for i in range(start, start + 5)) for start in range(0, 50, 5)]
+
+
+@patch('app.services.ingest_jobs.SemanticSearch')
+def test_failed_job_records_error(mock_semantic_search):
+
+    # Arrange
+    mock_semantic_search.return_value.store_text_in_batches.side_effect = Exception("Cosmos unavailable")
+    queue = IngestJobQueue()
+    pool = IngestWorkerPool(queue, workers=1, poll_seconds=0.05)
+
+    # Act
+    job_id = pool.submit(sample_session_id, "some text", 10)
+    job = wait_for(queue, job_id)
+    pool.stop()
+
+    # Assert
+    assert job["status"] == FAILED
+    assert job["error"] == "Cosmos unavailable"
+
+
+@patch('app.services.ingest_jobs.time')
+def test_claim_requeues_jobs_with_expired_lease(mock_time):
+
+    # Arrange
+    mock_time.time.return_value = 1000.0
+    queue = IngestJobQueue(lease_seconds=60, max_attempts=2)
+    job_id = queue.enqueue(sample_session_id, "some text", 10)
+    queue.claim(1)
+
+    # Act: the worker holding the job disappears without renewing its lease
+    mock_time.time.return_value = 1030.0
+    still_leased = queue.claim(1)
+    mock_time.time.return_value = 1100.0
+    reclaimed = queue.claim(1)
+    mock_time.time.return_value = 1200.0
+    given_up = queue.claim(1)
+
+    # Assert
+    assert still_leased == []
+    assert [job["id"] for job in reclaimed] == [job_id]
+    assert reclaimed[0]["text"] == "some text"
+    assert given_up == []
+    job = queue.get(job_id)
+    assert (job["status"], job["attempts"]) == (FAILED, 2)
+
+
+def test_finished_job_text_is_cleared():
+
+    # Arrange
+    queue = IngestJobQueue()
+    job_id = queue.enqueue(sample_session_id, "some text", 10)
+    queue.claim(1)
+
+    # Act
+    queue.update(job_id, status=COMPLETED)
+
+    # Assert
+    text = queue._connection.execute("SELECT text FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()[0]
+    assert text == ""
+    assert queue.get(job_id)["status"] == COMPLETED
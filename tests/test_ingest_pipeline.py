@@ -0,0 +1,55 @@
+from unittest.mock import MagicMock, patch
+from app.services.ingest_pipeline import IngestPipeline
+from app.services.local_store import LocalStore
+from app.services.pdf_utils import PDFUtils
+from app.services.vectorizer import Vectorizer
+from tests.fake_model import FakeModel
+import fitz
+import pytest
+
+sample_session_id = "test_session"
+
+
+def make_pdf(pages: int):
+    document = fitz.open()
+    for page_num in range(pages):
+        document.new_page().insert_text((72, 72), f"page {page_num} " + "word " * 30)
+    pdf_bytes = document.tobytes()
+    document.close()
+    return pdf_bytes
+
+
+@patch('app.services.vectorizer.model_registry')
+def test_pipeline_matches_sequential_ingest(mock_registry, tmp_path):
+
+    # Arrange
+    mock_registry.get.return_value = FakeModel()
+    pdf_bytes = make_pdf(5)
+    vectorizer = Vectorizer(batch_size=4)
+    store = LocalStore(str(tmp_path))
+    on_stored = MagicMock()
+
+    # Act
+    chunks_stored, timings = IngestPipeline(PDFUtils(), vectorizer, store, queue_size=1, on_stored=on_stored).run(pdf_bytes, sample_session_id, 10)
+    stored_chunks, stored_embeddings = store.get_chunks(sample_session_id)
+
+    # Assert
+    expected = vectorizer.chunk_text(PDFUtils().extract_text_from_pdf(pdf_bytes), 10)
+    assert chunks_stored == len(expected)
+    assert list(stored_chunks) == expected
+    assert stored_embeddings.shape == (len(expected), 2)
+    assert set(timings) == {"extract", "chunk", "embed", "store", "total"}
+    assert sum(len(call.args[0]) for call in on_stored.call_args_list) == len(expected)
+
+
+@patch('app.services.vectorizer.model_registry')
+def test_pipeline_propagates_stage_errors(mock_registry):
+
+    # Arrange
+    mock_registry.get.return_value = FakeModel()
+    db = MagicMock()
+    db.store_chunk.side_effect = Exception("Cosmos unavailable")
+
+    # Act / Assert
+    with pytest.raises(Exception, match="Cosmos unavailable"):
+        IngestPipeline(PDFUtils(), Vectorizer(batch_size=2), db, queue_size=1).run(make_pdf(20), sample_session_id, 5)
@@ -0,0 +1,166 @@
+from unittest.mock import patch
+from app.services.local_store import LocalStore
+from app.services.semantic_search import SemanticSearch
+from app.services.embedding_cache import session_cache
+import multiprocessing
+import threading
+import numpy as np
+
+sample_session_id = "test_session"
+sample_chunks = ["This is chunk 1", "This is chunk 2", "Ceci est le morceau 3 é"]
+sample_embeddings = np.array([[3.0, 4.0, 0.0], [0.0, 0.0, 2.0], [1.0, 1.0, 1.0]], dtype=np.float32)
+
+
+def test_store_and_get_chunks(tmp_path):
+
+    # Arrange
+    store = LocalStore(str(tmp_path))
+
+    # Act
+    store.store_chunk(sample_session_id, sample_chunks, sample_embeddings)
+    chunks, embeddings = store.get_chunks(sample_session_id)
+
+    # Assert
+    assert list(chunks) == sample_chunks
+    assert isinstance(embeddings, np.memmap)
+    assert np.allclose(embeddings[0], [0.6, 0.8, 0.0])
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0)
+
+def test_store_is_idempotent_and_appends(tmp_path):
+
+    # Arrange
+    store = LocalStore(str(tmp_path))
+    store.store_chunk(sample_session_id, sample_chunks, sample_embeddings)
+
+    # Act
+    store.store_chunk(sample_session_id, sample_chunks, sample_embeddings)
+    store.store_chunk(sample_session_id, sample_chunks + ["new chunk"], np.vstack([sample_embeddings, [[1.0, 0.0, 0.0]]]))
+    chunks, embeddings = store.get_chunks(sample_session_id)
+
+    # Assert
+    assert list(chunks) == sample_chunks + ["new chunk"]
+    assert embeddings.shape == (4, 3)
+    assert store.count_chunks(sample_session_id) == 4
+    assert store.count_chunks("unknown") == 0
+
+def test_get_chunks_unknown_session(tmp_path):
+
+    # Act
+    chunks, embeddings = LocalStore(str(tmp_path)).get_chunks("missing")
+
+    # Assert
+    assert len(chunks) == 0
+    assert len(embeddings) == 0
+
+@patch('app.services.semantic_search.Vectorizer')
+def test_search_text_with_local_backend(mock_vectorizer, tmp_path, monkeypatch):
+
+    # Arrange
+    monkeypatch.setenv("STORAGE_BACKEND", "local")
+    monkeypatch.setenv("LOCAL_STORE_DIR", str(tmp_path))
+    session_cache.clear()
+    mock_vectorizer.return_value.vectorize_chunks.return_value = (sample_chunks, sample_embeddings)
+    mock_vectorizer.return_value.vectorize_query.return_value = np.array([0.0, 0.0, 5.0], dtype=np.float32)
+    semantic_search = SemanticSearch()
+
+    # Act
+    semantic_search.store_text("ignored", sample_session_id, 100)
+    results = semantic_search.search_text("query", sample_session_id, limit=1)
+    session_cache.clear()
+
+    # Assert
+    assert results[0][0] == "This is chunk 2"
+    assert np.isclose(results[0][1], 1.0)
+
+def test_delete_chunks_compacts_shards(tmp_path):
+
+    # Arrange
+    store = LocalStore(str(tmp_path))
+    ids = ["a" * 64, "b" * 64, "c" * 64]
+    store.store_chunk(sample_session_id, sample_chunks, sample_embeddings, ids=ids, document_id="doc", document_version=1)
+
+    # Act
+    removed = store.delete_chunks(sample_session_id, ids[:1])
+    chunks, embeddings = store.get_chunks(sample_session_id)
+    document = store.get_document_chunks(sample_session_id, "doc")
+
+    # Assert
+    assert removed == 1
+    assert list(chunks) == sample_chunks[1:]
+    assert np.allclose(embeddings[0], [0.0, 0.0, 1.0])
+    assert [item["id"] for item in document] == ids[1:]
+    assert all(item["document_version"] == 1 for item in document)
+
+def test_delete_session(tmp_path):
+
+    # Arrange
+    store = LocalStore(str(tmp_path))
+    store.store_chunk(sample_session_id, sample_chunks, sample_embeddings)
+
+    # Act
+    deleted = store.delete_session(sample_session_id)
+    chunks, _ = store.get_chunks(sample_session_id)
+
+    # Assert
+    assert deleted == 3
+    assert len(chunks) == 0
+
+def _store_numbered_chunks(root: str, worker: int):
+    store = LocalStore(root)
+    for i in range(20):
+        store.store_chunk(sample_session_id, [f"worker {worker} chunk {i}"], sample_embeddings[:1], start_index=worker * 100 + i)
+
+def test_concurrent_processes_append_without_corruption(tmp_path):
+
+    # Arrange
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_store_numbered_chunks, args=(str(tmp_path), worker)) for worker in range(4)]
+
+    # Act
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    chunks, embeddings = LocalStore(str(tmp_path)).get_chunks(sample_session_id)
+
+    # Assert
+    assert sorted(chunks) == sorted(f"worker {w} chunk {i}" for w in range(4) for i in range(20))
+    assert embeddings.shape == (80, 3)
+
+def test_get_chunks_during_compaction_sees_consistent_shards(tmp_path):
+
+    # Arrange: each embedding's angle encodes its chunk's number, so a text paired with another row is detectable
+    store = LocalStore(str(tmp_path))
+    numbers = np.arange(1, 200)
+    texts = [f"chunk {n}" for n in numbers]
+    embeddings = np.stack([np.cos(numbers * 0.005), np.sin(numbers * 0.005), np.zeros(len(numbers))], axis=1)
+    ids = [f"{n:064d}" for n in numbers]
+    errors = []
+    stop = threading.Event()
+
+    def rewrite():
+        for _ in range(30):
+            store.store_chunk(sample_session_id, texts, embeddings, ids=ids)
+            store.delete_chunks(sample_session_id, ids[::2])
+            store.delete_chunks(sample_session_id, ids[1::2])
+        stop.set()
+
+    def read():
+        while not stop.is_set():
+            try:
+                chunks, matrix = store.get_chunks(sample_session_id)
+                decoded = np.rint(np.arctan2(matrix[:, 1], matrix[:, 0]) / 0.005).astype(int) if len(chunks) else []
+                assert list(chunks) == [f"chunk {n}" for n in decoded]
+            except Exception as e:
+                errors.append(e)
+                return
+
+    # Act
+    threads = [threading.Thread(target=rewrite)] + [threading.Thread(target=read) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Assert
+    assert errors == []
@@ -0,0 +1,82 @@
+from unittest.mock import MagicMock, patch
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from app.services.model_registry import ModelRegistry, warm_up_from_env
+
+
+@patch('sentence_transformers.SentenceTransformer')
+def test_get_loads_model_once(mock_sentence_transformer):
+    # Arrange
+    registry = ModelRegistry()
+
+    # Act
+    first = registry.get("all-MiniLM-L6-v2", "cpu")
+    second = registry.get("all-MiniLM-L6-v2", "cpu")
+
+    # Assert
+    assert first is second
+    mock_sentence_transformer.assert_called_once_with("all-MiniLM-L6-v2", device="cpu")
+
+
+@patch('sentence_transformers.SentenceTransformer')
+def test_get_keeps_models_separate(mock_sentence_transformer):
+    # Arrange
+    mock_sentence_transformer.side_effect = lambda name, device: MagicMock()
+    registry = ModelRegistry()
+
+    # Act
+    registry.get("model-a", "cpu")
+    registry.get("model-b", "cpu")
+    registry.get("model-a", "cuda")
+
+    # Assert
+    assert mock_sentence_transformer.call_count == 3
+    assert set(registry.loaded_models()) == {("model-a", "cpu", "torch"), ("model-b", "cpu", "torch"), ("model-a", "cuda", "torch")}
+
+
+@patch('sentence_transformers.SentenceTransformer')
+def test_get_is_thread_safe(mock_sentence_transformer):
+    # Arrange
+    registry = ModelRegistry()
+
+    # Act
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        models = list(executor.map(lambda _: registry.get("all-MiniLM-L6-v2", "cpu"), range(32)))
+
+    # Assert
+    assert all(model is models[0] for model in models)
+    mock_sentence_transformer.assert_called_once()
+
+
+@patch.dict('os.environ', {'PRELOAD_MODELS': 'model-a, model-b'})
+@patch('app.services.model_registry.model_registry')
+def test_warm_up_from_env(mock_registry):
+    # Act
+    warm_up_from_env()
+
+    # Assert
+    mock_registry.warm_up.assert_called_once_with(["model-a", "model-b"], "cpu", "torch")
+
+
+@patch('sentence_transformers.SentenceTransformer')
+def test_get_loads_onnx_backends(mock_sentence_transformer):
+    # Arrange
+    mock_sentence_transformer.side_effect = lambda *args, **kwargs: MagicMock()
+    registry = ModelRegistry()
+
+    # Act
+    torch_model = registry.get("all-MiniLM-L6-v2", "cpu")
+    onnx_model = registry.get("all-MiniLM-L6-v2", "cpu", "onnx")
+    registry.get("all-MiniLM-L6-v2", "cpu", "onnx-int8")
+
+    # Assert
+    assert torch_model is not onnx_model
+    calls = mock_sentence_transformer.call_args_list
+    assert calls[1].kwargs == {"device": "cpu", "backend": "onnx"}
+    assert calls[2].kwargs == {"device": "cpu", "backend": "onnx", "model_kwargs": {"file_name": "onnx/model_quint8_avx2.onnx"}}
+
+
+def test_get_rejects_unknown_backend():
+    # Act / Assert
+    with pytest.raises(ValueError):
+        ModelRegistry().get("all-MiniLM-L6-v2", "cpu", "tensorrt")
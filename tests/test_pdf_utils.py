@@ -1,6 +1,11 @@
 from unittest import mock
 from unittest.mock import MagicMock, patch
 from app.services.pdf_utils import PDFUtils
+from benchmarks.clean_text_benchmark import legacy_clean_text
+import fitz
+import io
+import os
+import random
 
 @patch('fitz.open')
 def test_extract_text_from_pdf_success(mock_open):
@@ -68,4 +73,104 @@ def test_extract_text_from_pdf_empty_text(mock_open):
     assert extracted_text == ""
     mock_open.assert_called_once_with(pdf_path)
     mock_doc.load_page.assert_called_once()
-    mock_page.get_text.assert_called_once()
\ No newline at end of file
+    mock_page.get_text.assert_called_once()
+
+@patch('fitz.open')
+def test_iter_text_matches_whole_document_cleaning(mock_open):
+    # Mock a document whose page boundaries fall inside words, between words and around blank pages
+    raw_pages = ["Intro •\n", "para-\ngraph ", "", " \n", "next", "word é", "é end\n", "tail"]
+    mock_doc = MagicMock()
+    mock_open.return_value = mock_doc
+    mock_doc.page_count = len(raw_pages)
+    mock_doc.load_page.side_effect = lambda page_num: MagicMock(get_text=MagicMock(return_value=raw_pages[page_num]))
+
+    pdf_utils = PDFUtils()
+
+    # Call the methods
+    pieces = list(pdf_utils.iter_text("path/to/pdf.pdf"))
+    pages = list(pdf_utils.iter_pages("path/to/pdf.pdf"))
+
+    # Assert the results
+    assert "".join(pieces) == pdf_utils.clean_text("".join(raw_pages))
+    assert pages[0] == (1, "Intro")
+    assert [page_number for page_number, _ in pages] == list(range(1, len(raw_pages) + 1))
+    mock_doc.close.assert_called()
+
+
+def test_parallel_extraction_matches_sequential(tmp_path):
+    # Build a real multi-page PDF, since each worker process reopens the file itself
+    document = fitz.open()
+    for page_num in range(12):
+        page = document.new_page()
+        page.insert_text((72, 72), f"Page {page_num} text\n- bullet item {page_num}")
+    pdf_path = str(tmp_path / "report.pdf")
+    document.save(pdf_path)
+    document.close()
+
+    # Call the method in both modes
+    sequential = PDFUtils(parallel_threshold=1000, max_workers=1).extract_text_from_pdf(pdf_path)
+    parallel_utils = PDFUtils(parallel_threshold=4, max_workers=3)
+    parallel = parallel_utils.extract_text_from_pdf(pdf_path)
+
+    # Assert the results
+    assert parallel_utils._use_process_pool(pdf_path, 12)
+    assert parallel == sequential
+    assert sequential.startswith("Page 0 text bullet item 0 Page 1 text")
+
+
+@patch('app.services.pdf_utils.ProcessPoolExecutor')
+def test_parallel_extraction_spools_bytes_once(mock_executor):
+    # Build a PDF in memory, large enough to use the process pool
+    document = fitz.open()
+    for page_num in range(6):
+        document.new_page().insert_text((72, 72), f"Page {page_num}")
+    pdf_bytes = document.tobytes()
+    document.close()
+    mock_executor.return_value.__enter__.return_value.map.side_effect = \
+        lambda func, sources, starts, stops, flags: [func(*args) for args in zip(sources, starts, stops, flags)]
+
+    # Call the method
+    text = PDFUtils(parallel_threshold=4, max_workers=2).extract_text_from_pdf(pdf_bytes)
+
+    # Assert the workers got one temporary path, removed afterwards, rather than the bytes
+    sources = mock_executor.return_value.__enter__.return_value.map.call_args[0][1]
+    assert text.startswith("Page 0 Page 1")
+    assert len(set(sources)) == 1 and isinstance(sources[0], str)
+    assert not os.path.exists(sources[0])
+
+
+def test_extract_text_from_bytes():
+    # Build a PDF in memory
+    document = fitz.open()
+    document.new_page().insert_text((72, 72), "In memory text")
+    pdf_bytes = document.tobytes()
+    document.close()
+
+    # Call the method with bytes and with a buffer
+    pdf_utils = PDFUtils()
+
+    # Assert the results
+    assert pdf_utils.extract_text_from_pdf(pdf_bytes) == "In memory text"
+    assert pdf_utils.extract_text_from_pdf(io.BytesIO(pdf_bytes)) == "In memory text"
+
+
+def test_clean_text_matches_legacy_cleaner():
+    # Build random text from the characters the cleaner treats specially
+    rng = random.Random(0)
+    alphabet = ["a", "b", " ", "\n", "\t", "\r", "\x0b", "\x1c", "•", "-", "*", "→", "é", "€", " ", " ", "x y"]
+    samples = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40))) for _ in range(2000)]
+
+    pdf_utils = PDFUtils()
+
+    # Assert the results
+    for sample in samples:
+        assert pdf_utils.clean_text(sample) == legacy_clean_text(sample)
+
+
+def test_clean_text_preserve_unicode():
+    # Call the method with accented text
+    cleaned_text = PDFUtils(preserve_unicode=True).clean_text("• Café naïve\n→ résumé - €100 *")
+
+    # Assert the results
+    assert cleaned_text == "Café naïve résumé €100"
+    assert PDFUtils().clean_text("• Café naïve\n→ résumé") == "Caf na ve r sum"
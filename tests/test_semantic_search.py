@@ -0,0 +1,376 @@
+from unittest.mock import AsyncMock, patch
+from scipy.spatial.distance import cosine
+from app.services.semantic_search import SemanticSearch
+from app.services.embedding_cache import session_cache
+import asyncio
+import numpy as np
+import pytest
+
+sample_session_id = "test_session"
+sample_chunks = ["chunk 1", "chunk 2", "chunk 3", "chunk 4"]
+sample_embeddings = [[0.1, 0.2, 0.3], [0.9, 0.1, 0.0], [0.4, 0.5, 0.6], [-0.3, 0.2, -0.1]]
+sample_query_embedding = np.array([0.5, 0.4, 0.3], dtype=np.float32)
+
+
+@pytest.fixture(autouse=True)
+def clear_session_cache():
+    session_cache.clear()
+    yield
+    session_cache.clear()
+
+
+@patch('app.services.semantic_search.Vectorizer')
+@patch('app.services.semantic_search.DBUtils')
+def test_search_text_matches_cosine(mock_db_utils, mock_vectorizer):
+
+    # Arrange
+    mock_db_utils.return_value.get_chunks.return_value = (sample_chunks, sample_embeddings)
+    mock_vectorizer.return_value.vectorize_query.return_value = sample_query_embedding
+
+    # Act
+    results = SemanticSearch().search_text("query", sample_session_id, limit=2, base_similarity=0.5)
+
+    # Assert
+    expected = sorted(
+        [(chunk, 1 - cosine(sample_query_embedding, embedding)) for chunk, embedding in zip(sample_chunks, sample_embeddings)],
+        key=lambda x: x[1], reverse=True)[:2]
+    assert [chunk for chunk, _ in results] == [chunk for chunk, _ in expected]
+    assert np.allclose([score for _, score in results], [score for _, score in expected], atol=1e-5)
+
+
+@patch('app.services.semantic_search.Vectorizer')
+@patch('app.services.semantic_search.DBUtils')
+def test_search_text_no_chunks(mock_db_utils, mock_vectorizer):
+
+    # Arrange
+    mock_db_utils.return_value.get_chunks.return_value = ([], [])
+
+    # Act
+    results = SemanticSearch().search_text("query", sample_session_id)
+
+    # Assert
+    assert results is None
+
+
+@patch('app.services.semantic_search.Vectorizer')
+@patch('app.services.semantic_search.DBUtils')
+def test_search_text_uses_session_cache(mock_db_utils, mock_vectorizer):
+
+    # Arrange
+    mock_db_utils.return_value.get_chunks.return_value = (sample_chunks, sample_embeddings)
+    mock_vectorizer.return_value.vectorize_query.return_value = sample_query_embedding
+    mock_vectorizer.return_value.vectorize_chunks.return_value = (["new text"], np.ones((1, 3), dtype=np.float32))
+    semantic_search = SemanticSearch()
+
+    # Act
+    first = semantic_search.search_text("query", sample_session_id)
+    second = semantic_search.search_text("query", sample_session_id)
+    semantic_search.store_text("new text", sample_session_id, 100)
+    semantic_search.search_text("query", sample_session_id)
+
+    # Assert
+    assert first == second
+    assert mock_db_utils.return_value.get_chunks.call_count == 2
+
+
+@patch('app.services.semantic_search.ann_enabled', True)
+@patch('app.services.semantic_search.ann_store')
+@patch('app.services.semantic_search.Vectorizer')
+@patch('app.services.semantic_search.DBUtils')
+def test_search_text_uses_ann_index(mock_db_utils, mock_vectorizer, mock_ann_store):
+
+    # Arrange
+    mock_vectorizer.return_value.vectorize_query.return_value = sample_query_embedding
+    mock_ann_store.get.return_value.search.return_value = [("chunk 3", 0.9)]
+    mock_ann_store.get.return_value.watermark = 5000
+    mock_db_utils.return_value.count_chunks.return_value = 5000
+
+    # Act
+    results = SemanticSearch().search_text("query", sample_session_id, limit=1)
+
+    # Assert
+    assert results == [("chunk 3", 0.9)]
+    mock_db_utils.return_value.get_chunks.assert_not_called()
+    mock_ann_store.mark_checked.assert_called_once_with(sample_session_id)
+
+
+@patch('app.services.semantic_search.ann_enabled', True)
+@patch('app.services.semantic_search.ann_store')
+@patch('app.services.semantic_search.Vectorizer')
+@patch('app.services.semantic_search.DBUtils')
+def test_search_text_rebuilds_ann_index_behind_storage(mock_db_utils, mock_vectorizer, mock_ann_store):
+
+    # Arrange
+    mock_vectorizer.return_value.vectorize_query.return_value = sample_query_embedding
+    mock_ann_store.get.return_value.watermark = 3
+    mock_db_utils.return_value.count_chunks.return_value = len(sample_chunks)
+    mock_db_utils.return_value.get_chunks.return_value = (sample_chunks, sample_embeddings)
+
+    # Act
+    results = SemanticSearch().search_text("query", sample_session_id, limit=4, base_similarity=-1)
+
+    # Assert
+    assert sorted(chunk for chunk, _ in results) == sorted(sample_chunks)
+    mock_ann_store.get.return_value.search.assert_not_called()
+    mock_ann_store.drop.assert_called_with(sample_session_id)
+    assert mock_ann_store.build.call_args[0][:2] == (sample_session_id, sample_chunks)
+
+
+@patch('app.services.semantic_search.Vectorizer')
+@patch('app.services.semantic_search.DBUtils')
+def test_search_batch_matches_single_queries(mock_db_utils, mock_vectorizer):
+
+    # Arrange
+    second_query_embedding = np.array([-0.2, 0.1, -0.3], dtype=np.float32)
+    mock_db_utils.return_value.get_chunks.return_value = (sample_chunks, sample_embeddings)
+    mock_vectorizer.return_value.vectorize_queries.return_value = np.stack([sample_query_embedding, second_query_embedding])
+    mock_vectorizer.return_value.vectorize_query.side_effect = [sample_query_embedding, second_query_embedding]
+    semantic_search = SemanticSearch()
+
+    # Act
+    results = semantic_search.search_batch([("first", 2, 0.5), ("second", 3, 0.0)], sample_session_id)
+    expected = [semantic_search.search_text("first", sample_session_id, 2, 0.5),
+                semantic_search.search_text("second", sample_session_id, 3, 0.0)]
+
+    # Assert
+    assert [[chunk for chunk, _ in rows] for rows in results] == [[chunk for chunk, _ in rows] for rows in expected]
+    assert np.allclose([score for rows in results for _, score in rows], [score for rows in expected for _, score in rows])
+    mock_vectorizer.return_value.vectorize_queries.assert_called_once_with(["first", "second"])
+    assert mock_db_utils.return_value.get_chunks.call_count == 1
+
+
+@patch('app.services.semantic_search.Vectorizer')
+@patch('app.services.semantic_search.DBUtils')
+def test_search_sessions_merges_global_top_k(mock_db_utils, mock_vectorizer):
+
+    # Arrange
+    sessions = {
+        "contracts": (sample_chunks[:2], sample_embeddings[:2]),
+        "invoices": (sample_chunks[2:], sample_embeddings[2:]),
+        "empty": ([], []),
+    }
+    mock_db_utils.return_value.get_chunks.side_effect = lambda session_id: sessions[session_id]
+    mock_vectorizer.return_value.vectorize_query.return_value = sample_query_embedding
+
+    # Act
+    results = SemanticSearch().search_sessions("query", ["contracts", "invoices", "empty", "contracts"], limit=3)
+
+    # Assert
+    owners = {chunk: session_id for session_id, (chunks, _) in sessions.items() for chunk in chunks}
+    expected = sorted(
+        [(chunk, 1 - cosine(sample_query_embedding, embedding)) for chunk, embedding in zip(sample_chunks, sample_embeddings)],
+        key=lambda x: x[1], reverse=True)[:3]
+    assert [chunk for chunk, _, _ in results] == [chunk for chunk, _ in expected]
+    assert np.allclose([score for _, score, _ in results], [score for _, score in expected], atol=1e-5)
+    assert all(session_id == owners[chunk] for chunk, _, session_id in results)
+    assert mock_db_utils.return_value.get_chunks.call_count == 3
+
+
+@patch('app.services.semantic_search.Vectorizer')
+@patch('app.services.semantic_search.DBUtils')
+def test_search_sessions_all_empty(mock_db_utils, mock_vectorizer):
+
+    # Arrange
+    mock_db_utils.return_value.get_chunks.return_value = ([], [])
+    mock_vectorizer.return_value.vectorize_query.return_value = sample_query_embedding
+
+    # Act
+    results = SemanticSearch().search_sessions("query", ["first", "second"])
+
+    # Assert
+    assert results is None
+
+
+@patch('app.services.semantic_search.AsyncDBUtils')
+@patch('app.services.semantic_search.Vectorizer')
+@patch('app.services.semantic_search.DBUtils')
+def test_search_text_async_matches_search_text(mock_db_utils, mock_vectorizer, mock_async_db_utils):
+
+    # Arrange
+    mock_db_utils.return_value.get_chunks.return_value = (sample_chunks, sample_embeddings)
+    mock_async_db_utils.create = AsyncMock(return_value=mock_async_db_utils.return_value)
+    mock_async_db_utils.return_value.get_chunks = AsyncMock(return_value=(sample_chunks, np.array(sample_embeddings)))
+    mock_vectorizer.return_value.vectorize_query.return_value = sample_query_embedding
+    semantic_search = SemanticSearch()
+
+    # Act
+    results = asyncio.run(semantic_search.search_text_async("query", sample_session_id, limit=2, base_similarity=0.5))
+    sync_client_built = mock_db_utils.called
+    session_cache.clear()
+    expected = semantic_search.search_text("query", sample_session_id, limit=2, base_similarity=0.5)
+
+    # Assert
+    assert [chunk for chunk, _ in results] == [chunk for chunk, _ in expected]
+    assert np.allclose([score for _, score in results], [score for _, score in expected])
+    mock_async_db_utils.return_value.get_chunks.assert_awaited_once_with(sample_session_id)
+    assert not sync_client_built
+
+
+
+def fake_embed(chunks):
+    return np.array([[len(chunk), 1.0, ord(chunk[-1])] for chunk in chunks], dtype=np.float32).reshape(-1, 3)
+
+
+@patch('app.services.semantic_search.Vectorizer')
+def test_document_versions_embed_only_changed_chunks(mock_vectorizer, tmp_path, monkeypatch):
+
+    # Arrange
+    monkeypatch.setenv("STORAGE_BACKEND", "local")
+    monkeypatch.setenv("LOCAL_STORE_DIR", str(tmp_path))
+    mock_vectorizer.return_value.chunk.side_effect = lambda text, *args: text.split("|")
+    mock_vectorizer.return_value.encode_batch.side_effect = fake_embed
+    semantic_search = SemanticSearch()
+
+    # Act
+    first = semantic_search.replace_document("p1|p2|p3", sample_session_id, "doc", 100)
+    second = semantic_search.replace_document("p1|p2 edited|p3|p4", sample_session_id, "doc", 100)
+    encoded_by_replace = mock_vectorizer.return_value.encode_batch.call_args.args[0]
+    appended = semantic_search.append_text("p4|p5", sample_session_id, "doc", 100)
+    chunks, _ = semantic_search._storage().get_chunks(sample_session_id)
+    deleted = semantic_search.delete_document(sample_session_id, "doc")
+
+    # Assert
+    assert (first["version"], first["chunks_added"]) == (1, 3)
+    assert (second["version"], second["chunks_added"], second["chunks_deleted"], second["chunks_unchanged"]) == (2, 2, 1, 2)
+    assert encoded_by_replace == ["p2 edited", "p4"]
+    assert (appended["version"], appended["chunks_added"], appended["chunks_skipped"]) == (3, 1, 1)
+    assert sorted(chunks) == ["p1", "p2 edited", "p3", "p4", "p5"]
+    assert (deleted["version"], deleted["chunks_deleted"]) == (4, 5)
+    assert len(semantic_search._storage().get_chunks(sample_session_id)[0]) == 0
+
+
+@patch('app.services.semantic_search.Vectorizer')
+def test_document_versions_persist_across_delete_only_and_no_op_edits(mock_vectorizer, tmp_path, monkeypatch):
+
+    # Arrange
+    monkeypatch.setenv("STORAGE_BACKEND", "local")
+    monkeypatch.setenv("LOCAL_STORE_DIR", str(tmp_path))
+    mock_vectorizer.return_value.chunk.side_effect = lambda text, *args: text.split("|")
+    mock_vectorizer.return_value.encode_batch.side_effect = fake_embed
+    semantic_search = SemanticSearch()
+
+    # Act
+    versions = [semantic_search.replace_document(text, sample_session_id, "doc", 100)["version"]
+                for text in ["p1|p2", "p1", "p1", "p1"]]
+    duplicate_append = semantic_search.append_text("p1", sample_session_id, "doc", 100)
+    deleted = semantic_search.delete_document(sample_session_id, "doc")
+    recreated = semantic_search.replace_document("p1", sample_session_id, "doc", 100)
+    next_edit = semantic_search.append_text("p2", sample_session_id, "doc", 100)
+
+    # Assert: delete-only edits bump the version, no-op edits report the stored one
+    assert versions == [1, 2, 2, 2]
+    assert duplicate_append["version"] == 2
+    assert deleted["version"] == 3
+    assert (recreated["version"], next_edit["version"]) == (4, 5)
+
+
+@patch('app.services.semantic_search.Vectorizer')
+def test_failed_document_write_keeps_version(mock_vectorizer, tmp_path, monkeypatch):
+
+    # Arrange
+    monkeypatch.setenv("STORAGE_BACKEND", "local")
+    monkeypatch.setenv("LOCAL_STORE_DIR", str(tmp_path))
+    mock_vectorizer.return_value.chunk.side_effect = lambda text, *args: text.split("|")
+    mock_vectorizer.return_value.encode_batch.side_effect = fake_embed
+    semantic_search = SemanticSearch()
+    semantic_search.replace_document("p1", sample_session_id, "doc", 100)
+
+    # Act
+    with patch('app.services.local_store.LocalStore.store_chunk', side_effect=OSError("disk full")):
+        with pytest.raises(OSError):
+            semantic_search.append_text("p2", sample_session_id, "doc", 100)
+    retried = semantic_search.append_text("p2", sample_session_id, "doc", 100)
+
+    # Assert
+    assert retried["version"] == 2
+
+
+@patch('app.services.semantic_search.Vectorizer')
+@patch('app.services.semantic_search.DBUtils')
+def test_replace_document_updates_session_cache(mock_db_utils, mock_vectorizer):
+
+    # Arrange
+    mock_db_utils.return_value.get_chunks.return_value = (sample_chunks, sample_embeddings)
+    mock_db_utils.return_value.get_document_chunks.return_value = [
+        {"id": "old", "content_hash": "hash", "chunk": "chunk 2", "document_version": 1}]
+    mock_db_utils.return_value.bump_document_version.return_value = 2
+    mock_vectorizer.return_value.chunk.return_value = ["chunk 5"]
+    mock_vectorizer.return_value.encode_batch.return_value = np.array([[0.5, 0.4, 0.3]], dtype=np.float32)
+    mock_vectorizer.return_value.vectorize_query.return_value = sample_query_embedding
+    semantic_search = SemanticSearch()
+    semantic_search.search_text("query", sample_session_id, limit=10, base_similarity=-1.0)
+
+    # Act
+    result = semantic_search.replace_document("chunk 5", sample_session_id, "doc", 100)
+    results = semantic_search.search_text("query", sample_session_id, limit=10, base_similarity=-1.0)
+
+    # Assert
+    assert result["version"] == 2
+    mock_db_utils.return_value.delete_chunks.assert_called_once_with(sample_session_id, ["old"])
+    assert mock_db_utils.return_value.get_chunks.call_count == 1
+    assert results[0][0] == "chunk 5"
+    assert sorted(chunk for chunk, _ in results) == ["chunk 1", "chunk 3", "chunk 4", "chunk 5"]
+
+@patch('app.services.semantic_search.IngestPipeline')
+@patch('app.services.semantic_search.Vectorizer')
+@patch('app.services.semantic_search.DBUtils')
+def test_ingest_pdf_failure_invalidates_session_cache(mock_db_utils, mock_vectorizer, mock_pipeline):
+
+    # Arrange
+    session_cache.put(sample_session_id, sample_chunks, np.asarray(sample_embeddings, dtype=np.float32))
+    mock_pipeline.return_value.run.side_effect = Exception("embedding failed after some batches were stored")
+
+    # Act
+    with pytest.raises(Exception):
+        SemanticSearch().ingest_pdf(b"%PDF", sample_session_id, 100)
+
+    # Assert
+    assert sample_session_id not in session_cache
+
+@patch('app.services.semantic_search.ann_store')
+@patch('app.services.semantic_search.ann_enabled', True)
+@patch('app.services.semantic_search.Vectorizer')
+@patch('app.services.semantic_search.DBUtils')
+def test_replace_document_delete_failure_drops_caches(mock_db_utils, mock_vectorizer, mock_ann_store):
+
+    # Arrange
+    session_cache.put(sample_session_id, sample_chunks, np.asarray(sample_embeddings, dtype=np.float32))
+    mock_db_utils.return_value.get_document_chunks.return_value = [
+        {"id": "old", "content_hash": "hash", "chunk": "chunk 2", "document_version": 1}]
+    mock_db_utils.return_value.delete_chunks.side_effect = Exception("Cosmos unavailable")
+    mock_vectorizer.return_value.chunk.return_value = ["chunk 5"]
+    mock_vectorizer.return_value.encode_batch.return_value = np.array([[0.5, 0.4, 0.3]], dtype=np.float32)
+
+    # Act
+    with pytest.raises(Exception):
+        SemanticSearch().replace_document("chunk 5", sample_session_id, "doc", 100)
+
+    # Assert
+    assert sample_session_id not in session_cache
+    mock_ann_store.drop.assert_called_once_with(sample_session_id)
+    mock_ann_store.add.assert_not_called()
+    mock_db_utils.return_value.bump_document_version.assert_not_called()
+
+@patch('app.services.semantic_search.ann_store')
+@patch('app.services.semantic_search.ann_enabled', True)
+@patch('app.services.semantic_search.Vectorizer')
+@patch('app.services.semantic_search.DBUtils')
+def test_store_text_failure_invalidates_cache_and_drops_index(mock_db_utils, mock_vectorizer, mock_ann_store):
+
+    # Arrange
+    session_cache.put(sample_session_id, sample_chunks, np.asarray(sample_embeddings, dtype=np.float32))
+    mock_vectorizer.return_value.vectorize_chunks.return_value = (["chunk 5"], np.array([[0.5, 0.4, 0.3]]))
+    mock_db_utils.return_value.store_chunk.side_effect = [False, Exception("Cosmos unavailable")]
+    semantic_search = SemanticSearch()
+
+    # Act
+    result = semantic_search.store_text("chunk 5", sample_session_id, 100)
+    session_cache.put(sample_session_id, sample_chunks, np.asarray(sample_embeddings, dtype=np.float32))
+    with pytest.raises(Exception):
+        semantic_search.store_text("chunk 5", sample_session_id, 100)
+
+    # Assert
+    assert result == (False, 0)
+    assert sample_session_id not in session_cache
+    assert mock_ann_store.drop.call_count == 2
+    mock_ann_store.add.assert_not_called()
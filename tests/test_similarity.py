@@ -0,0 +1,38 @@
+import numpy as np
+from app.services.similarity import normalize_rows, top_k
+
+
+def test_normalize_rows():
+
+    # Arrange
+    matrix = [[3.0, 4.0], [0.0, 0.0]]
+
+    # Act
+    normalized = normalize_rows(matrix)
+
+    # Assert
+    assert normalized.dtype == np.float32
+    assert np.allclose(normalized, [[0.6, 0.8], [0.0, 0.0]])
+
+def test_top_k_orders_and_filters():
+
+    # Arrange
+    scores = np.array([0.2, 0.9, 0.4, 0.7, 0.95, 0.1])
+
+    # Act
+    results = top_k(scores, limit=3, base_similarity=0.3)
+
+    # Assert
+    assert [index for index, _ in results] == [4, 1, 3]
+    assert all(isinstance(score, float) for _, score in results)
+
+def test_top_k_fewer_candidates_than_limit():
+
+    # Arrange
+    scores = np.array([0.2, 0.9, 0.4])
+
+    # Act
+    results = top_k(scores, limit=10, base_similarity=0.3)
+
+    # Assert
+    assert [index for index, _ in results] == [1, 2]
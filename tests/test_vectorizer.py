@@ -1,5 +1,19 @@
 from app.services.vectorizer import Vectorizer
-from numpy import ndarray
+from unittest.mock import patch
+from numpy import ndarray, float32
+import numpy as np
+from app.services.chunk_embedding_cache import EmbeddingCache, embedding_cache, query_embedding_cache
+from tests.fake_model import FakeModel
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def clear_embedding_cache():
+    embedding_cache.clear()
+    query_embedding_cache.clear()
+    yield
+    embedding_cache.clear()
+    query_embedding_cache.clear()
 
 
 def test_chunk_text():
@@ -35,7 +49,152 @@ def test_vectorize_chunks():
     chunks, embeddings = Vectorizer().vectorize_chunks(text, chunk_size = 5)
 
     # Assert
-    assert isinstance(embeddings, list)
+    assert isinstance(embeddings, ndarray)
+    assert embeddings.dtype == float32
+    assert embeddings.shape[0] == len(chunks)
     assert isinstance(chunks, list)
     assert len(embeddings) > 0 
-    assert len(chunks) > 0
\ No newline at end of file
+    assert len(chunks) > 0
+
+@patch('app.services.vectorizer.model_registry')
+def test_encode_batch_restores_order(mock_registry):
+
+    # Arrange
+    fake_model = FakeModel()
+    mock_registry.get.return_value = fake_model
+    texts = ["a b c d", "b", "c d", "d e f"]
+
+    # Act
+    embeddings = Vectorizer(batch_size=2).encode_batch(texts)
+
+    # Assert
+    assert embeddings.dtype == float32
+    assert embeddings.flags["C_CONTIGUOUS"]
+    assert embeddings[:, 0].tolist() == [4, 1, 2, 3]
+    assert embeddings[:, 1].tolist() == [ord("a"), ord("b"), ord("c"), ord("d")]
+    assert fake_model.batches == [["b", "c d"], ["d e f", "a b c d"]]
+
+@patch('app.services.vectorizer.model_registry')
+def test_encode_batch_empty(mock_registry):
+
+    # Arrange
+    mock_registry.get.return_value = FakeModel()
+
+    # Act
+    embeddings = Vectorizer().encode_batch([])
+
+    # Assert
+    assert embeddings.shape == (0, 2)
+
+@patch('app.services.vectorizer.model_registry')
+def test_chunk_stream_matches_chunk_text(mock_registry):
+
+    # Arrange
+    mock_registry.get.return_value = FakeModel()
+    pieces = ["one two thr", "ee four ", "five", " six seven eight nine ten eleven"]
+    vectorizer = Vectorizer()
+
+    # Act
+    chunks = list(vectorizer.chunk_stream(pieces, chunk_size=3))
+
+    # Assert
+    assert chunks == vectorizer.chunk_text("".join(pieces), chunk_size=3)
+
+@patch('app.services.vectorizer.model_registry')
+def test_chunk_text_by_tokens_respects_budget_and_sentences(mock_registry):
+
+    # Arrange
+    mock_registry.get.return_value = FakeModel(max_seq_length=12)
+    text = "One two three. Four five six seven. Eight nine ten eleven twelve thirteen fourteen fifteen sixteen"
+
+    # Act
+    chunks = Vectorizer().chunk_text_by_tokens(text)
+
+    # Assert
+    assert chunks == ["One two three. Four five six seven.", "Eight nine ten eleven twelve thirteen fourteen fifteen sixteen"]
+
+@patch('app.services.vectorizer.model_registry')
+def test_chunk_text_by_tokens_overlap(mock_registry):
+
+    # Arrange
+    fake_model = FakeModel(max_seq_length=6)
+    mock_registry.get.return_value = fake_model
+    text = " ".join(f"w{i}" for i in range(10))
+
+    # Act
+    chunks = Vectorizer().chunk_text_by_tokens(text, overlap=1, snap_to_sentence=False)
+
+    # Assert
+    assert chunks == ["w0 w1 w2 w3", "w3 w4 w5 w6", "w6 w7 w8 w9"]
+    assert all(len(fake_model.tokenizer(chunk)["input_ids"]) <= 4 for chunk in chunks)
+
+@patch('app.services.vectorizer.model_registry')
+def test_vectorize_chunks_token_strategy(mock_registry):
+
+    # Arrange
+    mock_registry.get.return_value = FakeModel(max_seq_length=12)
+    text = "word " * 25
+
+    # Act
+    chunks, embeddings = Vectorizer().vectorize_chunks(text, chunk_size=100, chunk_strategy="tokens")
+
+    # Assert
+    assert [len(chunk.split()) for chunk in chunks] == [10, 10, 5]
+    assert embeddings.shape == (3, 2)
+
+@patch('app.services.vectorizer.model_registry')
+def test_vectorize_query_uses_query_cache(mock_registry):
+
+    # Arrange
+    fake_model = FakeModel()
+    fake_model.tokenizer.do_lower_case = True
+    mock_registry.get.return_value = fake_model
+    query_cache = EmbeddingCache(max_entries=10)
+    vectorizer = Vectorizer(query_cache=query_cache)
+
+    # Act
+    with patch.object(fake_model, 'encode', wraps=fake_model.encode) as mock_encode:
+        first = vectorizer.vectorize_query("Termination clause")
+        second = vectorizer.vectorize_query("termination   clause ")
+        vectorizer.vectorize_query("pricing")
+
+    # Assert
+    assert np.array_equal(first, second)
+    assert mock_encode.call_count == 2
+    assert (query_cache.hits, query_cache.misses) == (1, 2)
+
+@patch('app.services.vectorizer.model_registry')
+def test_vectorize_queries_encodes_misses_in_one_batch(mock_registry):
+
+    # Arrange
+    fake_model = FakeModel()
+    mock_registry.get.return_value = fake_model
+    vectorizer = Vectorizer(query_cache=EmbeddingCache(max_entries=10))
+    cached = vectorizer.vectorize_query("pricing")
+
+    # Act
+    with patch.object(fake_model, 'encode', wraps=fake_model.encode) as mock_encode:
+        embeddings = vectorizer.vectorize_queries(["termination clause", "pricing", "renewal terms"])
+
+    # Assert
+    assert embeddings.shape[0] == 3
+    assert np.array_equal(embeddings[1], cached)
+    mock_encode.assert_called_once()
+    assert mock_encode.call_args.args[0] == ["termination clause", "renewal terms"]
+
+@pytest.mark.parametrize("backend, tolerance", [("onnx", 1e-4), ("onnx-int8", 0.05)])
+def test_onnx_backend_matches_torch(backend, tolerance):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("optimum")
+
+    # Arrange
+    texts = ["This is a test sentence.", "Termination clause of the contract", "pricing summary " * 20]
+
+    # Act
+    expected = Vectorizer(cache=None).encode_batch(texts)
+    actual = Vectorizer(cache=None, backend=backend).encode_batch(texts)
+
+    # Assert
+    cosine = np.sum(expected * actual, axis=1) / (np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1))
+    assert actual.shape == expected.shape
+    assert np.all(cosine >= 1 - tolerance)
@@ -2,11 +2,15 @@ import azure.functions as func
 import json
 from app.models.models import TextInput
 from app.services.semantic_search import SemanticSearch
+from app.services.ingest_jobs import ingest_workers
 from app.models.models import Response
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 
+# Started on import, not on the first submit, so jobs left queued or with an expired lease are picked up by every instance
+ingest_workers.start()
+
 def main(req: func.HttpRequest) -> func.HttpResponse:
     try:
         logging.info('processing and storing text embeddings')
@@ -14,11 +18,23 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         req_body = req.get_json()
         text_input = TextInput(**req_body)
 
+        if text_input.mode == "async":
+            # Background workers do the chunking, embedding and writes; poll /text/jobs/{job_id} for progress
+            job_id = ingest_workers.submit(text_input.session_id, text_input.text, text_input.chunk_size,
+                                           text_input.chunk_strategy, text_input.chunk_overlap)
+            response_model = Response(
+                status="success",
+                message="Text queued for ingestion",
+                data={"job_id": job_id}
+            )
+            return func.HttpResponse(response_model.to_json(), status_code=202, mimetype='application/json')
+
         # Initialize the SemanticSearch service
         semantic_search = SemanticSearch()
 
         # Store the text, chunk it, and vectorize
-        success, chunks = semantic_search.store_text(text_input.text, text_input.session_id, text_input.chunk_size)
+        success, chunks = semantic_search.store_text(text_input.text, text_input.session_id, text_input.chunk_size,
+                                                     text_input.chunk_strategy, text_input.chunk_overlap)
         
         if not success:
             response_model = Response(